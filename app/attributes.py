@@ -0,0 +1,226 @@
+"""Typed listing attributes for range filters on ``/market``.
+
+``quantity`` is parsed into ``quantity_value`` and ``quantity_unit`` on the
+listing ("50k MT monthly" -> 50000, "MT"), converted to one unit per kind
+of measure: mass to MT, volume to L. Well-known ``details`` keys are parsed
+into numbers and stored one row per value in ``listing_attributes``, which
+is indexed on ``(name, value)`` so that a filter such as ``gsm>=150`` can be
+an index range scan rather than a pass over every ``details`` document
+(``narrow``).
+
+Both are derived when a listing is written (``quantity_columns`` and
+``record``); ``backfill`` re-derives them for existing listings, e.g. after
+the parsers change (``python -m app.bootstrap attributes``).
+"""
+import operator
+import os
+import re
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, bindparam, delete, exists, func, insert, literal_column, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from .cache import TTLCache
+from .db import is_sqlite
+from .models import Listing, ListingAttribute
+
+# Unit as written, lowercased -> (normalized unit, factor to it).
+UNITS = {
+    **dict.fromkeys(("mt", "mts", "t", "ton", "tons", "tonne", "tonnes"), ("MT", 1.0)),
+    **dict.fromkeys(("kg", "kgs"), ("MT", 0.001)),
+    **dict.fromkeys(("l", "ltr", "litre", "litres", "liter", "liters"), ("L", 1.0)),
+    **dict.fromkeys(("kl", "m3", "cbm"), ("L", 1000.0)),
+    **dict.fromkeys(("pcs", "pc", "pieces", "units"), ("pcs", 1.0)),
+    **dict.fromkeys(("m2", "sqm"), ("m2", 1.0)),
+    **dict.fromkeys(("bag", "bags"), ("bags", 1.0)),
+    **dict.fromkeys(("drum", "drums"), ("drums", 1.0)),
+    **dict.fromkeys(("fcl", "container", "containers"), ("FCL", 1.0)),
+}
+MULTIPLIERS = {"k": 1e3, "mln": 1e6, "million": 1e6}
+THICKNESS_UNITS = {"mm": 1.0, "cm": 10.0, "m": 1000.0}
+
+# A number, an optional multiplier ("k" only when not the start of a unit
+# such as "kg") and the word after it.
+_QUANTITY_RE = re.compile(r"(\d[\d.,]*)\s*(k(?![a-z])|mln\b|million\b)?\s*([a-z][a-z0-9]*)?", re.I)
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+# A filter matching fewer rows than this is answered from its own index.
+SEEK_ROWS = 2000
+# How long a filter's match-count estimate is reused before it is re-probed.
+ESTIMATE_TTL = float(os.getenv("ATTRIBUTE_ESTIMATE_TTL", "300"))
+_estimates = TTLCache(4096, ESTIMATE_TTL)
+
+OPS = {">=": operator.ge, "<=": operator.le, ">": operator.gt, "<": operator.lt, "=": operator.eq}
+_FILTER_RE = re.compile(r"^\s*(\w+)\s*(>=|<=|>|<|=)\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+def _number(text: str) -> float:
+    # "1,000" and "1,000,000" group thousands; any other comma is a decimal point.
+    if re.fullmatch(r"\d{1,3}(,\d{3})+(\.\d+)?", text):
+        return float(text.replace(",", ""))
+    return float(text.replace(",", ".").rstrip("."))
+
+
+def parse_quantity(text: str) -> tuple[Optional[float], Optional[str]]:
+    """``(value, unit)`` of a free-text quantity; the unit is ``None`` if not recognised."""
+    m = _QUANTITY_RE.search(text or "")
+    if not m:
+        return None, None
+    try:
+        value = _number(m.group(1)) * MULTIPLIERS.get((m.group(2) or "").lower(), 1.0)
+    except ValueError:
+        return None, None
+    unit, factor = UNITS.get((m.group(3) or "").lower(), (None, 1.0))
+    return value * factor, unit
+
+
+def quantity_columns(text: str) -> dict:
+    value, unit = parse_quantity(text)
+    return {"quantity_value": value, "quantity_unit": unit}
+
+
+def _first(raw) -> Optional[float]:
+    m = _NUMBER_RE.search(str(raw))
+    return float(m.group()) if m else None
+
+
+def _thickness(raw) -> Optional[float]:
+    m = re.search(r"(\d+(?:\.\d+)?)\s*(mm|cm|m)?\b", str(raw).lower())
+    return float(m.group(1)) * THICKNESS_UNITS[m.group(2) or "mm"] if m else None
+
+
+def _npk(raw) -> dict[str, float]:
+    parts = _NUMBER_RE.findall(str(raw))
+    if len(parts) != 3:
+        return {}
+    return {f"npk_{n}": float(v) for n, v in zip("npk", parts)}
+
+
+# ``details`` key -> parser returning ``{attribute: value}``.
+PARSERS = {
+    "protein": lambda raw: {"protein": _first(raw)},  # %
+    "moisture": lambda raw: {"moisture": _first(raw)},  # %
+    "gsm": lambda raw: {"gsm": _first(raw)},  # g/m2
+    "thickness": lambda raw: {"thickness": _thickness(raw)},  # mm
+    "npk": _npk,  # N, P and K in %
+}
+NAMES = ("protein", "moisture", "gsm", "thickness", "npk_n", "npk_p", "npk_k")
+
+
+def parse_details(details: Optional[dict]) -> dict[str, float]:
+    values = {}
+    for key, raw in (details or {}).items():
+        parser = PARSERS.get(str(key).lower())
+        if parser is not None and raw is not None and not isinstance(raw, (dict, list, bool)):
+            values.update((n, v) for n, v in parser(raw).items() if v is not None)
+    return values
+
+
+def record(db, listings: Iterable):
+    """Store the attributes of new listings (entities or rows) in the caller's
+    transaction; works with a ``Session`` or a ``Connection``."""
+    rows = [
+        {"listing_id": l.id, "name": name, "value": value}
+        for l in listings
+        for name, value in parse_details(l.details).items()
+    ]
+    if rows:
+        db.execute(insert(ListingAttribute), rows)
+
+
+def backfill(conn: Connection, batch_size: int = 5000) -> int:
+    """Re-derive quantity columns and attributes of every listing; returns how many."""
+    listings = Listing.__table__
+    set_quantity = (
+        update(listings)
+        .where(listings.c.id == bindparam("_id"))
+        .values(quantity_value=bindparam("_value"), quantity_unit=bindparam("_unit"))
+    )
+    last, done = 0, 0
+    while True:
+        rows = conn.execute(
+            select(Listing.id, Listing.quantity, Listing.details)
+            .where(Listing.id > last)
+            .order_by(Listing.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return done
+        params = []
+        for r in rows:
+            value, unit = parse_quantity(r.quantity)
+            params.append({"_id": r.id, "_value": value, "_unit": unit})
+        conn.execute(set_quantity, params)
+        conn.execute(delete(ListingAttribute).where(ListingAttribute.listing_id.between(rows[0].id, rows[-1].id)))
+        record(conn, rows)
+        last, done = rows[-1].id, done + len(rows)
+
+
+def parse_filter(expr: str) -> tuple[str, str, float]:
+    """``"gsm>=150"`` -> ``("gsm", ">=", 150.0)``; ``ValueError`` if malformed or unknown."""
+    m = _FILTER_RE.match(expr)
+    if not m:
+        raise ValueError(f"Invalid attribute filter {expr!r}; expected e.g. gsm>=150")
+    name, op, value = m.group(1).lower(), m.group(2), float(m.group(3))
+    if name not in NAMES:
+        raise ValueError(f"Unknown attribute {name!r}; one of {', '.join(NAMES)}")
+    return name, op, value
+
+
+def parse_unit(unit: Optional[str], min_qty=None, max_qty=None) -> tuple[Optional[str], Optional[float], Optional[float]]:
+    """``unit`` as ``parse_quantity`` stores it, with the bounds converted to
+    it: ``("kg", 500, None)`` -> ``("MT", 0.5, None)``. ``ValueError`` for an
+    unknown unit, or for bounds without one since amounts in different units
+    don't compare."""
+    if not unit:
+        if min_qty is not None or max_qty is not None:
+            raise ValueError("min_qty and max_qty need a unit")
+        return None, None, None
+    if unit.strip().lower() not in UNITS:
+        raise ValueError(f"Unknown unit {unit!r}; e.g. {', '.join(sorted({u for u, _ in UNITS.values()}))}")
+    unit, factor = UNITS[unit.strip().lower()]
+    return unit, *(None if q is None else q * factor for q in (min_qty, max_qty))
+
+
+async def _few(db: AsyncSession, key: tuple, matching) -> bool:
+    """Whether ``matching`` has fewer than ``SEEK_ROWS`` rows; cached per process."""
+    few = _estimates.get(key)
+    if few is None:
+        bounded = matching.limit(SEEK_ROWS).subquery()
+        few = await db.scalar(select(func.count()).select_from(bounded)) < SEEK_ROWS
+        _estimates.set(key, few)
+    return few
+
+
+async def narrow(db: AsyncSession, query, unit=None, min_qty=None, max_qty=None, attrs=()):
+    """Apply quantity and attribute filters (``parse_filter`` results) to a
+    query over published listings; ``ValueError`` as ``parse_unit``.
+
+    A filter with few matches (see ``_few``) drives the query from its
+    index; one with many is checked row by row as the feed index is walked
+    newest first, which fills a page long before all the matches could be
+    sorted. SQLite cannot estimate range selectivity itself, so a broad
+    quantity range is marked ``likelihood(..., 0.9)`` for its planner.
+    """
+    unit, min_qty, max_qty = parse_unit(unit, min_qty, max_qty)
+    if unit:
+        ranges = []
+        if min_qty is not None:
+            ranges.append(Listing.quantity_value >= min_qty)
+        if max_qty is not None:
+            ranges.append(Listing.quantity_value <= max_qty)
+        matching = select(Listing.id).where(Listing.status == "published", Listing.quantity_unit == unit, *ranges)
+        if is_sqlite and ranges and not await _few(db, ("quantity", unit, min_qty, max_qty), matching):
+            # SQLite wants the probability as a literal, not a parameter.
+            ranges = [func.likelihood(r, literal_column("0.9")) for r in ranges]
+        query = query.filter(Listing.quantity_unit == unit, *ranges)
+    for name, op, bound in attrs:
+        attr = aliased(ListingAttribute)
+        conds = (attr.name == name, OPS[op](attr.value, bound))
+        if await _few(db, ("attr", name, op, bound), select(attr.listing_id).where(*conds)):
+            query = query.join(attr, and_(attr.listing_id == Listing.id, *conds))
+        else:
+            query = query.filter(exists().where(attr.listing_id == Listing.id, *conds))
+    return query
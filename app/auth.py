@@ -1,19 +1,41 @@
+import asyncio
+import hashlib
+import logging
 import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from .db import get_db
+from .cache import TTLCache
+from .db import AsyncSessionLocal, get_db
 from .models import User, RevokedToken
 
+logger = logging.getLogger(__name__)
+
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+REVOCATION_REFRESH_SECONDS = int(os.getenv("REVOCATION_REFRESH_SECONDS", "30"))
+REVOCATION_MAX_SKEW_SECONDS = int(os.getenv("REVOCATION_MAX_SKEW_SECONDS", "120"))
+REVOCATION_SWEEP_SECONDS = int(os.getenv("REVOCATION_SWEEP_SECONDS", "600"))
+REVOCATION_SWEEP_BATCH = int(os.getenv("REVOCATION_SWEEP_BATCH", "5000"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_DEPTH = int(os.getenv("HASH_QUEUE_DEPTH", "16"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 def hash_password(password: str) -> str:
@@ -22,24 +44,197 @@ def hash_password(password: str) -> str:
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
+# bcrypt gets its own small pool so a login storm cannot occupy the threadpool
+# that sync routes run in. Work beyond the workers plus HASH_QUEUE_DEPTH
+# waiting jobs is refused straight away instead of piling up.
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_DEPTH)
+_hashing = 0  # jobs holding a slot; only touched from the event loop
+
+def hashing_in_flight() -> int:
+    return _hashing
+
+async def _run_hashing(fn, *args):
+    global _hashing
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    _hashing += 1
+    try:
+        return await asyncio.wrap_future(_hash_pool.submit(fn, *args))
+    finally:
+        _hashing -= 1
+        _hash_slots.release()
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hashing(pwd_context.hash, password)
+
+async def verify_password_async(plain: str, hashed: str) -> tuple[bool, Optional[str]]:
+    """``(ok, new_hash)``; ``new_hash`` is set when ``hashed`` uses outdated settings
+    such as a different ``BCRYPT_ROUNDS``."""
+    return await _run_hashing(pwd_context.verify_and_update, plain, hashed)
+
 def create_access_token(sub: str, expires_delta: Optional[timedelta] = None) -> str:
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode = {"sub": sub, "exp": expire}
+    # The jti keeps two tokens issued to one user in the same second distinct,
+    # so revoking one does not revoke the other.
+    to_encode = {"sub": sub, "exp": expire, "jti": secrets.token_urlsafe(12)}
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
 
-def authenticate(db: Session, email: str, password: str):
-    user = get_user_by_email(db, email)
-    if user and verify_password(password, user.hashed_password):
+async def authenticate(db: AsyncSession, email: str, password: str):
+    user = await get_user_by_email(db, email)
+    if user and (await verify_password_async(password, user.hashed_password))[0]:
         return user
     return None
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+@dataclass(frozen=True)
+class Principal:
+    """Read-only snapshot of the authenticated user, safe to cache across requests.
+
+    Routes that need to modify the user load the ``User`` row by ``id``.
+    """
+    id: int
+    email: str
+    is_admin: bool
+    subscription_status: str
+    stripe_customer_id: Optional[str]
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(user.id, user.email, bool(user.is_admin), user.subscription_status, user.stripe_customer_id)
+
+
+def token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+# Revocations of tokens without an ``exp`` claim are kept for good.
+NEVER = datetime(9999, 12, 31, tzinfo=timezone.utc)
+
+
+def token_expiry(token: str) -> Optional[datetime]:
+    """When ``token`` stops being accepted anyway; ``None`` if it is not a JWT.
+    The signature is not checked."""
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return None
+    return datetime.fromtimestamp(exp, timezone.utc) if exp is not None else NEVER
+
+
+def _epoch(dt: datetime) -> float:
+    # SQLite hands back naive datetimes; everything is stored in UTC.
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+
+class RevocationSet:
+    """Hashes of revoked, unexpired tokens, mirrored from ``revoked_tokens``.
+
+    Loaded in full once, then topped up at most every
+    ``REVOCATION_REFRESH_SECONDS`` so that logouts from other workers are
+    picked up. ``revoked_at`` is the writer's clock at insert time, so a row
+    can commit after a later one was already read, or carry a slow host's
+    clock. Each refresh therefore re-reads ``max_skew`` seconds before the
+    newest ``revoked_at`` seen; rows read twice simply overwrite themselves.
+    Membership checks never query. Entries past their token's expiry are
+    dropped by ``prune``.
+    """
+
+    def __init__(self, refresh_seconds: float, max_skew: float = REVOCATION_MAX_SKEW_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.max_skew = timedelta(seconds=max_skew)
+        self._keys: dict[bytes, float] = {}
+        self._since: Optional[datetime] = None
+        self._next_refresh = 0.0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def load(self, db: Session):
+        """Sync so it can run at startup or via ``AsyncSession.run_sync``."""
+        self._next_refresh = time.monotonic() + self.refresh_seconds
+        query = select(RevokedToken.token_hash, RevokedToken.expires_at, RevokedToken.revoked_at)
+        if self._since is not None:
+            query = query.where(RevokedToken.revoked_at >= self._since - self.max_skew)
+        else:
+            query = query.where(RevokedToken.expires_at > datetime.now(timezone.utc))
+        for key, expires_at, revoked_at in db.execute(query):
+            self._keys[key] = _epoch(expires_at)
+            if self._since is None or revoked_at > self._since:
+                self._since = revoked_at
+
+    def add(self, key: bytes, expires_at: datetime):
+        self._keys[key] = _epoch(expires_at)
+
+    def prune(self) -> int:
+        now = time.time()
+        expired = [key for key, exp in self._keys.items() if exp <= now]
+        for key in expired:
+            del self._keys[key]
+        return len(expired)
+
+    async def contains(self, db: AsyncSession, key: bytes) -> bool:
+        if time.monotonic() >= self._next_refresh:
+            await db.run_sync(self.load)
+        return key in self._keys
+
+
+principals = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+revocations = RevocationSet(REVOCATION_REFRESH_SECONDS)
+
+
+async def sweep_revocations(db: AsyncSession, batch_size: int = REVOCATION_SWEEP_BATCH) -> int:
+    """Delete revocations of expired tokens ``batch_size`` rows per
+    transaction, so the sweep never holds the write lock for long."""
+    deleted = 0
+    while True:
+        expired = (
+            select(RevokedToken.token_hash)
+            .where(RevokedToken.expires_at <= datetime.now(timezone.utc))
+            .limit(batch_size)
+        )
+        result = await db.execute(delete(RevokedToken).where(RevokedToken.token_hash.in_(expired)))
+        await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+        await asyncio.sleep(0)
+
+
+async def revocation_sweeper():
+    """Background task: sweep every ``REVOCATION_SWEEP_SECONDS``. Several
+    workers sweeping at once is harmless."""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                deleted = await sweep_revocations(db)
+            pruned = revocations.prune()
+            if deleted or pruned:
+                logger.info("Swept %d expired revocations (%d from memory)", deleted, pruned)
+        except Exception:
+            logger.exception("Revocation sweep failed")
+        await asyncio.sleep(REVOCATION_SWEEP_SECONDS)
+
+
+def invalidate_user(email: str):
+    """Forget cached principals for ``email`` after the user row changes."""
+    principals.discard_where(lambda p: p.email == email)
+
+
+async def get_current_user(db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)) -> Principal:
     cred_exc = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
-    if db.query(RevokedToken).filter(RevokedToken.token == token).first():
+    key = token_key(token)
+    if await revocations.contains(db, key):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+    principal = principals.get(key)
+    if principal is not None:
+        return principal
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
         email: str = payload.get("sub")
@@ -47,17 +242,20 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
             raise cred_exc
     except JWTError:
         raise cred_exc
-    user = get_user_by_email(db, email)
+    user = await get_user_by_email(db, email)
     if not user:
         raise cred_exc
-    return user
+    principal = Principal.from_user(user)
+    # Never serve a cached principal past the token's own expiry.
+    principals.set(key, principal, ttl=payload["exp"] - time.time() if "exp" in payload else None)
+    return principal
 
-def admin_required(user: User = Depends(get_current_user)) -> User:
+async def admin_required(user: Principal = Depends(get_current_user)) -> Principal:
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin only")
     return user
 
-def subscription_required(user: User = Depends(get_current_user)) -> User:
+async def subscription_required(user: Principal = Depends(get_current_user)) -> Principal:
     if user.subscription_status != "active":
         raise HTTPException(status_code=402, detail="Subscription required")
     return user
@@ -0,0 +1,201 @@
+"""Stripe integration: outbound API client, price catalog and webhooks.
+
+Stripe is the source of truth and webhooks keep local state in step with it:
+``subscription_status`` on users and the ``prices`` catalog that ``/pricing``
+serves. The catalog is also re-read from Stripe when it is empty or older
+than ``PRICE_SYNC_SECONDS``, which covers missed webhooks.
+
+Outbound calls use the SDK's async client on a pooled ``httpx`` connection
+with ``STRIPE_TIMEOUT``; ``STRIPE_API_BASE`` points it at a stand-in such as
+``bench/stripe_stub.py``.
+"""
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import metrics
+from .cache import TTLCache
+from .models import Price, User
+
+STRIPE_API_KEY = os.getenv("STRIPE_API_KEY", "")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "")
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", "10"))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
+PRICING_CACHE_TTL = float(os.getenv("PRICING_CACHE_TTL", "60"))
+PRICE_SYNC_SECONDS = float(os.getenv("PRICE_SYNC_SECONDS", "3600"))
+# First wait after a failed sync; doubles with each failure up to PRICE_SYNC_SECONDS.
+PRICE_SYNC_RETRY_SECONDS = float(os.getenv("PRICE_SYNC_RETRY_SECONDS", "30"))
+
+ACTIVE_STATUSES = {"active", "trialing"}
+
+pricing_cache = TTLCache(1, PRICING_CACHE_TTL)
+_client = None
+_synced_at: Optional[float] = None
+_sync_failures = 0
+_retry_at = 0.0
+
+
+class NotConfigured(Exception):
+    pass
+
+
+def client():
+    """The shared ``StripeClient``; the SDK is imported on first use since it
+    adds most of a second to worker startup."""
+    global _client
+    if not STRIPE_API_KEY:
+        raise NotConfigured()
+    if _client is None:
+        import stripe
+
+        _client = stripe.StripeClient(
+            STRIPE_API_KEY,
+            http_client=stripe.HTTPXClient(timeout=STRIPE_TIMEOUT),
+            max_network_retries=STRIPE_MAX_RETRIES,
+            base_addresses={"api": STRIPE_API_BASE} if STRIPE_API_BASE else {},
+        )
+    return _client
+
+
+async def call(operation: str, method, params: dict):
+    with metrics.timed(metrics.stripe_latency, operation):
+        return await method(params)
+
+
+def _price_values(price) -> dict:
+    product = price.get("product")
+    values = {
+        "currency": price.get("currency") or "",
+        "unit_amount": price.get("unit_amount"),
+        "active": bool(price.get("active", True)),
+        "updated_at": datetime.now(timezone.utc),
+    }
+    if isinstance(product, str):
+        values["product_id"] = product
+    elif product:
+        values["product_id"] = product.get("id") or ""
+        values["name"] = product.get("name") or ""
+    if not values.get("name") and price.get("nickname"):
+        values["name"] = price["nickname"]
+    return values
+
+
+async def upsert_price(db: AsyncSession, price):
+    row = await db.get(Price, price["id"])
+    values = _price_values(price)
+    if row is None:
+        db.add(Price(id=price["id"], **values))
+    else:
+        for key, value in values.items():
+            setattr(row, key, value)
+
+
+async def sync_prices(db: AsyncSession):
+    """Replace the local catalog with Stripe's list of prices."""
+    global _synced_at, _sync_failures
+    stripe = client()
+    seen, params = set(), {"limit": 100, "expand": ["data.product"]}
+    while True:
+        page = await call("price.list", stripe.prices.list_async, params)
+        for price in page.data:
+            await upsert_price(db, price)
+            seen.add(price["id"])
+        if not page.has_more:
+            break
+        params = {**params, "starting_after": page.data[-1]["id"]}
+    await db.execute(update(Price).where(Price.id.not_in(seen)).values(active=False))
+    await db.commit()
+    _synced_at = time.monotonic()
+    _sync_failures = 0
+    pricing_cache.clear()
+
+
+def _sync_failed():
+    """Hold off the next sync, for longer after each failure in a row."""
+    global _sync_failures, _retry_at
+    _sync_failures += 1
+    _retry_at = time.monotonic() + min(PRICE_SYNC_RETRY_SECONDS * 2 ** (_sync_failures - 1), PRICE_SYNC_SECONDS)
+
+
+async def plans(db: AsyncSession) -> list[dict]:
+    """Active plans, cheapest first, from the cache or the local catalog."""
+    cached = pricing_cache.get("plans")
+    if cached is not None:
+        return cached
+    now = time.monotonic()
+    stale = _synced_at is None or now - _synced_at > PRICE_SYNC_SECONDS
+    if stale and STRIPE_API_KEY and now >= _retry_at:
+        try:
+            await sync_prices(db)
+        except Exception:
+            # Serve the last known catalog while Stripe is unreachable.
+            await db.rollback()
+            _sync_failed()
+    rows = (
+        await db.execute(select(Price).where(Price.active.is_(True)).order_by(Price.unit_amount, Price.id))
+    ).scalars()
+    result = [{"id": p.id, "name": p.name, "currency": p.currency, "amount": p.unit_amount} for p in rows]
+    pricing_cache.set("plans", result)
+    return result
+
+
+def verify_event(payload: bytes, signature: str) -> dict:
+    """The event in a webhook body, if ``signature`` matches; raises ``ValueError`` otherwise."""
+    if not STRIPE_WEBHOOK_SECRET:
+        raise NotConfigured()
+    import stripe
+
+    try:
+        stripe.WebhookSignature.verify_header(payload.decode("utf-8"), signature, STRIPE_WEBHOOK_SECRET)
+    except stripe.SignatureVerificationError as e:
+        raise ValueError(str(e))
+    return json.loads(payload)
+
+
+async def handle_event(db: AsyncSession, event: dict) -> Optional[str]:
+    """Apply one event without committing; returns the email of a user whose
+    cached principal must be dropped. Handlers are idempotent since Stripe
+    retries deliveries, and subscription events older than the last one
+    applied are ignored since Stripe does not deliver them in order."""
+    kind, obj = event["type"], event["data"]["object"]
+    if kind.startswith("customer.subscription."):
+        user = await _user_for_customer(db, obj.get("customer"))
+        if user is None:
+            return None
+        created, last = event.get("created") or 0, user.subscription_event_at or 0
+        if created < last:
+            return None
+        status = obj.get("status") if kind != "customer.subscription.deleted" else "canceled"
+        if created and created == last and STRIPE_API_KEY:
+            # Same second as the last event applied: ask Stripe which is current.
+            sub = await call("subscription.retrieve", client().subscriptions.retrieve_async, obj["id"])
+            status = sub.get("status")
+        user.subscription_status = "active" if status in ACTIVE_STATUSES else "inactive"
+        user.subscription_event_at = created or user.subscription_event_at
+        return user.email
+    elif kind == "checkout.session.completed":
+        ref, customer = obj.get("client_reference_id"), obj.get("customer")
+        if ref and str(ref).isdigit() and customer:
+            user = await db.get(User, int(ref))
+            if user is not None and user.stripe_customer_id != customer:
+                user.stripe_customer_id = customer
+                return user.email
+    elif kind in ("price.created", "price.updated"):
+        await upsert_price(db, obj)
+    elif kind == "price.deleted":
+        await db.execute(update(Price).where(Price.id == obj["id"]).values(active=False))
+    elif kind in ("product.created", "product.updated"):
+        await db.execute(update(Price).where(Price.product_id == obj["id"]).values(name=obj.get("name") or ""))
+    return None
+
+
+async def _user_for_customer(db: AsyncSession, customer: Optional[str]) -> Optional[User]:
+    if not customer:
+        return None
+    return (await db.execute(select(User).where(User.stripe_customer_id == customer))).scalar_one_or_none()
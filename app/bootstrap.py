@@ -0,0 +1,53 @@
+"""One-off setup, run once per deploy rather than in every worker.
+
+    python -m app.bootstrap            # migrate, then seed when SEED_SAMPLE=1
+    python -m app.bootstrap migrate    # apply pending migrations only
+    python -m app.bootstrap seed       # sample data only (idempotent)
+    python -m app.bootstrap status     # list pending migrations
+    python -m app.bootstrap facets     # recount the /market/facets rollup
+    python -m app.bootstrap attributes # re-parse quantities and specs of all listings
+"""
+import argparse
+import os
+
+from . import attributes, facets, migrations, search
+from .db import engine
+
+
+def migrate():
+    for version in migrations.upgrade(engine):
+        print(f"Applied migration {version}")
+    # Creates and backfills the search index storage if it is missing.
+    search.init(engine)
+
+
+def seed():
+    from .seed import run
+
+    run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", default="all", choices=["all", "migrate", "seed", "status", "facets", "attributes"])
+    args = parser.parse_args(argv)
+    if args.command == "status":
+        todo = migrations.pending(engine)
+        print("\n".join(todo) if todo else "Up to date")
+        return
+    if args.command == "facets":
+        with engine.begin() as conn:
+            facets.rebuild(conn)
+        return
+    if args.command == "attributes":
+        with engine.begin() as conn:
+            print(f"Parsed {attributes.backfill(conn)} listings")
+        return
+    if args.command in ("all", "migrate"):
+        migrate()
+    if args.command == "seed" or (args.command == "all" and os.getenv("SEED_SAMPLE", "1") == "1"):
+        seed()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Streaming parsers for bulk listing uploads.
+
+Both formats are read one line at a time as the body arrives and yield
+``(line_number, ListingIn | error_message)`` so a bad row, including one
+that is not UTF-8, costs one entry in the error report instead of the whole
+upload.
+
+* NDJSON: one ``ListingIn`` JSON object per line.
+* CSV: a header row naming ``ListingIn`` fields, then one listing per line;
+  ``details`` holds a JSON object. Quoted fields may not span lines.
+"""
+import csv
+import json
+from typing import AsyncIterator, Union
+
+from pydantic import ValidationError
+
+from .schemas import ListingIn
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines")
+CSV_TYPES = ("text/csv", "application/csv")
+
+
+def _decode(line: bytes) -> Union[str, UnicodeDecodeError]:
+    try:
+        return line.rstrip(b"\r").decode("utf-8")
+    except UnicodeDecodeError as e:
+        return e
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Union[str, UnicodeDecodeError]]:
+    """Lines of the body; a line that is not UTF-8 comes through as the error."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield _decode(line)
+    if pending:
+        yield _decode(pending)
+
+
+def _invalid_text(e: UnicodeDecodeError) -> str:
+    return f"invalid UTF-8 at byte {e.start}"
+
+
+def _error(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in e.errors())
+
+
+def validate(data) -> Union[ListingIn, str]:
+    try:
+        row = ListingIn.model_validate(data)
+    except ValidationError as e:
+        return _error(e)
+    if row.type not in ("RFQ", "OFFER"):
+        return "type: must be RFQ or OFFER"
+    return row
+
+
+async def parse_ndjson(lines: AsyncIterator[Union[str, UnicodeDecodeError]]) -> AsyncIterator[tuple[int, Union[ListingIn, str]]]:
+    n = 0
+    async for line in lines:
+        n += 1
+        if isinstance(line, UnicodeDecodeError):
+            yield n, _invalid_text(line)
+            continue
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield n, f"invalid JSON: {e}"
+            continue
+        yield n, validate(data)
+
+
+async def parse_csv(lines: AsyncIterator[Union[str, UnicodeDecodeError]]) -> AsyncIterator[tuple[int, Union[ListingIn, str]]]:
+    header = None
+    n = 0
+    async for line in lines:
+        n += 1
+        if isinstance(line, UnicodeDecodeError):
+            yield n, _invalid_text(line)
+            continue
+        if not line.strip():
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if len(values) != len(header):
+            yield n, f"expected {len(header)} columns, got {len(values)}"
+            continue
+        data = {k: v for k, v in zip(header, values) if v != ""}
+        if "details" in data:
+            try:
+                data["details"] = json.loads(data["details"])
+            except ValueError as e:
+                yield n, f"details: invalid JSON: {e}"
+                continue
+        yield n, validate(data)
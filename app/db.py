@@ -1,17 +1,122 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import re
+from sqlalchemy import Delete, Insert, TextClause, Update, create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./falcontrade.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
 
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+# Opt-in SQLite production profile: WAL, relaxed fsync, bigger caches, and
+# one writer connection with a separate pool of read-only connections.
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "0") == "1"
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # negative = KiB
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+def async_url(url: str) -> str:
+    """The async-driver spelling of a sync ``DATABASE_URL``."""
+    for prefix, driver in (
+        ("sqlite://", "sqlite+aiosqlite://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+    ):
+        if url.startswith(prefix):
+            return driver + url[len(prefix):]
+    return url
+
+is_sqlite = DATABASE_URL.startswith("sqlite")
+sqlite_tuned = SQLITE_TUNING and is_sqlite and ":memory:" not in DATABASE_URL
+connect_args = {"check_same_thread": False} if is_sqlite else {}
+
+def sqlite_pragmas(read_only: bool = False):
+    """``connect`` listener applying the tuning profile to each new connection."""
+    def on_connect(dbapi_conn, record):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cur.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cur.execute("PRAGMA query_only=ON")
+        cur.close()
+    return on_connect
+
+# The sync engine serves startup, seeding and scripts; requests use the async one.
 engine = create_engine(DATABASE_URL, connect_args=connect_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+pool_args = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+if is_sqlite:
+    if ":memory:" in DATABASE_URL:
+        pool_args = {}
+    else:
+        # aiosqlite defaults to NullPool for files; pool so the settings apply.
+        pool_args["poolclass"] = AsyncAdaptedQueuePool
+
+if sqlite_tuned:
+    # Writers queue for the single connection instead of fighting over the
+    # file lock; readers never block them under WAL.
+    async_engine = create_async_engine(
+        async_url(DATABASE_URL), connect_args=connect_args, **{**pool_args, "pool_size": 1, "max_overflow": 0}
+    )
+    async_read_engine = create_async_engine(async_url(DATABASE_URL), connect_args=connect_args, **pool_args)
+    event.listen(engine, "connect", sqlite_pragmas())
+    event.listen(async_engine.sync_engine, "connect", sqlite_pragmas())
+    event.listen(async_read_engine.sync_engine, "connect", sqlite_pragmas(read_only=True))
+else:
+    async_engine = create_async_engine(async_url(DATABASE_URL), connect_args=connect_args, **pool_args)
+    async_read_engine = async_engine
+
+_READ_SQL = re.compile(r"\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+def _is_write(clause) -> bool:
+    if isinstance(clause, (Insert, Update, Delete)):
+        return True
+    return isinstance(clause, TextClause) and not _READ_SQL.match(clause.text)
+
+class RoutingSession(Session):
+    """Reads go to the read-only pool until the transaction first writes; from
+    then on everything uses the writer so the session sees its own changes."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("writing") or self._flushing or _is_write(clause):
+            self.info["writing"] = True
+            return async_engine.sync_engine
+        return async_read_engine.sync_engine
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_routing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("writing", None)
+
+if sqlite_tuned:
+    AsyncSessionLocal = async_sessionmaker(sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False)
+else:
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+def upsert(model):
+    """``INSERT`` for ``model`` supporting ``on_conflict_do_update`` on this database."""
+    if is_sqlite:
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(model)
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,105 @@
+"""Facet counts for ``/market`` from the ``listing_facets`` rollup.
+
+``listing_facets`` holds the number of published listings for each
+combination of type, category, country and incoterm that occurs, so counts
+come from a table of at most a few thousand rows instead of a GROUP BY
+over every listing. ``record`` adds listings as they are published in the
+same transaction; ``rebuild`` recomputes the table from ``listings``.
+"""
+from collections import Counter
+from typing import Awaitable, Callable, Iterable, Optional
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .db import upsert
+from .models import Listing, ListingFacet
+
+DIMENSIONS = ("type", "category", "country", "incoterm")
+DEFAULT_CATEGORIES = ["fertilizer", "grain", "oils", "textiles", "panels", "poultry", "fruits", "metals"]
+
+
+def _key(l) -> tuple[str, str, str, str]:
+    type_ = l.type.value if hasattr(l.type, "value") else l.type
+    return (type_, l.category or "", l.country or "", l.incoterm or "")
+
+
+def _upsert():
+    stmt = upsert(ListingFacet)
+    return stmt.on_conflict_do_update(
+        index_elements=list(DIMENSIONS), set_={"count": ListingFacet.count + stmt.excluded.count}
+    )
+
+
+def record(db: Session, listings: Iterable, delta: int = 1):
+    """Count ``listings`` (entities or rows) as published, or with ``delta=-1`` as withdrawn."""
+    counts = Counter(_key(l) for l in listings)
+    if counts:
+        db.execute(_upsert(), [dict(zip(DIMENSIONS, key), count=n * delta) for key, n in counts.items()])
+
+
+def rebuild(conn: Connection):
+    """Recompute the rollup from ``listings``."""
+    conn.execute(delete(ListingFacet))
+    dims = [func.coalesce(getattr(Listing, d), "") for d in DIMENSIONS]
+    conn.execute(
+        insert(ListingFacet).from_select(
+            [*DIMENSIONS, "count"],
+            select(*dims, func.count()).where(Listing.status == "published").group_by(*dims),
+        )
+    )
+
+
+def _where(source, filters: dict):
+    return [source.c[d] == v for d, v in filters.items() if v]
+
+
+async def counts(
+    db: AsyncSession,
+    filters: dict,
+    matches: Optional[Callable[[dict], Awaitable]] = None,
+) -> dict:
+    """``{"total": n, "type": {value: n}, ...}`` for published listings.
+
+    Each dimension ignores its own entry in ``filters``. ``matches`` maps a
+    filter dict to a listing query (or ``None`` for no rows) to count
+    instead of the rollup, for filters the rollup cannot answer.
+    """
+    if filters.get("type") not in (None, "", "RFQ", "OFFER"):
+        filters = {**filters, "type": None}
+    result = {}
+    for dim in (None, *DIMENSIONS):
+        scoped = {d: v for d, v in filters.items() if d != dim}
+        if matches is None:
+            source = ListingFacet.__table__
+            weight, where = source.c.count, _where(source, scoped)
+        else:
+            query = await matches(scoped)
+            if query is None:
+                result[dim or "total"] = {} if dim else 0
+                continue
+            source = query.subquery()
+            weight, where = literal(1), []
+        if dim is None:
+            total = select(func.coalesce(func.sum(weight), 0)).select_from(source).where(*where)
+            result["total"] = int(await db.scalar(total))
+            continue
+        col = source.c[dim]
+        rows = await db.execute(
+            select(col, func.sum(weight)).select_from(source).where(*where)
+            .group_by(col).order_by(func.sum(weight).desc())
+        )
+        result[dim] = {(v.value if hasattr(v, "value") else v): int(n) for v, n in rows if n}
+    return result
+
+
+async def categories(db: AsyncSession) -> list[str]:
+    """Categories with published listings, most listed first."""
+    total = func.sum(ListingFacet.count)
+    rows = await db.execute(
+        select(ListingFacet.category).where(ListingFacet.category != "").group_by(ListingFacet.category)
+        .having(total > 0).order_by(total.desc(), ListingFacet.category)
+    )
+    return list(rows.scalars())
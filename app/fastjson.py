@@ -0,0 +1,30 @@
+"""Opt-in fast path for serializing responses (``FAST_JSON=1``).
+
+With it on, hot routes build their output models with ``model_construct``
+(the rows come from our own database, so re-validating them is wasted work)
+and return bytes from a cached ``TypeAdapter`` instead of letting FastAPI
+validate against ``response_model`` and encode the result again. The
+``response_model`` declarations stay, so the OpenAPI schema is unchanged.
+Other routes use ``ORJSONResponse``.
+"""
+import os
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import TypeAdapter
+
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1"
+
+_adapters: dict[Any, TypeAdapter] = {}
+
+
+def default_response_class() -> type[JSONResponse]:
+    return ORJSONResponse if FAST_JSON else JSONResponse
+
+
+def render(content: Any, type_: Any, headers: Optional[dict] = None) -> Response:
+    """``content`` serialized as ``type_`` (e.g. ``List[ListingOut]``) without validation."""
+    adapter = _adapters.get(type_)
+    if adapter is None:
+        adapter = _adapters[type_] = TypeAdapter(type_)
+    return Response(adapter.dump_json(content), media_type="application/json", headers=headers)
@@ -0,0 +1,105 @@
+"""Response cache for the public read endpoints.
+
+Complete ``200`` responses to ``GET`` requests on ``CACHED_PATHS`` are kept,
+keyed by path and normalized query string, for ``HTTP_CACHE_TTL`` seconds or
+until ``invalidate()`` is called after a write that changes public data. Each
+carries a strong ETag (hash of the body); a matching ``If-None-Match`` is
+answered ``304`` from the cache without reaching the route or the database.
+
+The cache is per process, so with several workers another worker's write
+shows up here within the TTL at the latest.
+"""
+import hashlib
+import os
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .cache import TTLCache
+
+HTTP_CACHE_TTL = float(os.getenv("HTTP_CACHE_TTL", "30"))  # 0 disables the cache
+HTTP_CACHE_SIZE = int(os.getenv("HTTP_CACHE_SIZE", "2048"))
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "10"))
+
+CACHED_PATHS = r"^/(market|market/facets|listings/\d+|categories)$"
+
+responses = TTLCache(HTTP_CACHE_SIZE, HTTP_CACHE_TTL)
+_generation = 0
+
+
+def invalidate():
+    """Drop every cached response; call after committing a change to public data."""
+    global _generation
+    _generation += 1
+    responses.clear()
+
+
+def cache_key(scope: Scope) -> str:
+    params = sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+    return f"{scope['path']}?{urlencode(params)}"
+
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    tags = [t.strip() for t in if_none_match.split(b",")]
+    return b"*" in tags or etag in tags or b"W/" + etag in tags
+
+
+class ResponseCacheMiddleware:
+    def __init__(self, app: ASGIApp, path_pattern: str = CACHED_PATHS):
+        self.app = app
+        self.path_re = re.compile(path_pattern)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET" or not self.path_re.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        key = cache_key(scope)
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+        cached = responses.get(key)
+        if cached is not None:
+            await self._send(send, *cached, if_none_match, b"HIT")
+            return
+
+        generation = _generation
+        start: Message = {}
+        body: list[bytes] = []
+
+        async def capture(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+            if start["status"] != 200:
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(body)})
+                return
+            content = b"".join(body)
+            etag = b'"' + hashlib.sha256(content).hexdigest().encode() + b'"'
+            headers = [
+                *start["headers"],
+                (b"etag", etag),
+                (b"cache-control", f"public, max-age={HTTP_CACHE_MAX_AGE}".encode()),
+            ]
+            # A write that landed while this was rendering may not be in it.
+            if generation == _generation:
+                responses.set(key, (etag, headers, content))
+            await self._send(send, etag, headers, content, if_none_match, b"MISS")
+
+        await self.app(scope, receive, capture)
+
+    @staticmethod
+    async def _send(send: Send, etag, headers, content, if_none_match, status: bytes) -> None:
+        if if_none_match and etag_matches(if_none_match, etag):
+            headers = [(k, v) for k, v in headers if k in (b"etag", b"cache-control")]
+            await send({"type": "http.response.start", "status": 304, "headers": [*headers, (b"x-cache", status)]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": 200, "headers": [*headers, (b"x-cache", status)]})
+        await send({"type": "http.response.body", "body": content})
@@ -1,13 +1,70 @@
+import asyncio
+import logging
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .db import Base, engine
+from .db import SessionLocal, async_engine, async_read_engine, engine
+from . import bootstrap, fastjson, httpcache, matching, metrics, migrations, search
+from .httpcache import ResponseCacheMiddleware
+from .middleware import MaxBodySizeMiddleware
+from .ratelimit import RateLimitMiddleware
+from .auth import REVOCATION_SWEEP_SECONDS, hashing_in_flight, principals, revocation_sweeper, revocations
 from .routes import auth as auth_routes
 from .routes import misc as misc_routes
 from .routes import listings as listings_routes
 from .routes import subscription as subscription_routes
 
-app = FastAPI(title="FalconTrade API", version="v1.0")
+logger = logging.getLogger(__name__)
+
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+SEED_SAMPLE = os.getenv("SEED_SAMPLE", "1") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema changes and sample data belong to `python -m app.bootstrap`, run
+    # once per deploy; these defaults keep a bare `uvicorn app.main:app` working.
+    if AUTO_MIGRATE:
+        bootstrap.migrate()
+    else:
+        todo = migrations.pending(engine)
+        if todo:
+            logger.warning("Pending migrations %s; run `python -m app.bootstrap migrate`", ", ".join(todo))
+        search.init(engine)
+    if SEED_SAMPLE:
+        try:
+            bootstrap.seed()
+        except Exception as e:
+            print("Seed error:", e)
+    with SessionLocal() as db:
+        revocations.load(db)
+    sweeper = asyncio.create_task(revocation_sweeper()) if REVOCATION_SWEEP_SECONDS > 0 else None
+    matcher = asyncio.create_task(matching.listener())
+    yield
+    if sweeper is not None:
+        sweeper.cancel()
+    matcher.cancel()
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+app = FastAPI(
+    title="FalconTrade API",
+    version="v1.0",
+    default_response_class=fastjson.default_response_class(),
+    lifespan=lifespan,
+)
+
+# Starlette wraps each added middleware around the previous ones, so CORS
+# goes last to also decorate the early 413/429 responses.
+app.add_middleware(ResponseCacheMiddleware)
+# Allow for multipart framing on top of the file size limit.
+app.add_middleware(
+    MaxBodySizeMiddleware,
+    path_pattern=r"^/listings/\d+/attachments$",
+    max_bytes=listings_routes.MAX_ATTACHMENT_BYTES + 64 * 1024,
+)
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 origins = os.getenv("CORS_ORIGINS", "http://localhost:3000,https://falcontrade.org,https://www.falcontrade.org,https://falcontrade-frontend.vercel.app,https://falcontrade.vercel.app").split(",")
 app.add_middleware(
@@ -16,16 +73,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-Base.metadata.create_all(bind=engine)
-
-if os.getenv("SEED_SAMPLE", "1") == "1":
-    try:
-        from .seed import run as seed_run
-        seed_run()
-    except Exception as e:
-        print("Seed error:", e)
+engines = {"write": async_engine}
+if async_read_engine is not async_engine:
+    engines["read"] = async_read_engine
+for name, e in engines.items():
+    metrics.instrument_engine(e, name)
+metrics.register_runtime_gauges(
+    engines, {"responses": httpcache.responses, "principals": principals}, hashing_in_flight
+)
 
 app.include_router(misc_routes.router)
 app.include_router(auth_routes.router)
@@ -0,0 +1,253 @@
+"""Pairing RFQs with OFFERs.
+
+Each worker keeps an index of published listings in memory, bucketed by
+``(type, category)``. Within a bucket every feature of a listing - a title
+token, a ``details`` key, its incoterm or its country - has a postings array
+of listing ids. A listing's candidates are the counterpart listings in its
+category sharing a feature with it; each shared feature adds its weight
+times its IDF in the bucket, so rare terms count for more than common ones.
+
+The best ``MATCH_TOP_K`` of each listing are kept in an LRU. Publishing a
+listing scores it once against the index, which also gives its score for
+every counterpart it could rank for, so it is pushed into the cached lists
+of those counterparts instead of anything being rescanned; a large batch
+is indexed as is and the cached lists are dropped. Published listings are
+announced on the ``published`` pub/sub channel, so the index of every
+worker picks them up.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import os
+from array import array
+from bisect import insort
+from collections import OrderedDict, defaultdict
+from operator import itemgetter
+from types import SimpleNamespace
+from typing import Iterable, Optional
+
+import anyio
+from sqlalchemy import select
+
+from . import pubsub, search
+from .db import engine
+from .models import Listing
+
+logger = logging.getLogger(__name__)
+
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "20"))
+MATCH_CACHE_SIZE = int(os.getenv("MATCH_CACHE_SIZE", "50000"))
+MATCH_PRELOAD = os.getenv("MATCH_PRELOAD", "1") == "1"
+# In a bucket this large, a feature found in more than MAX_FEATURE_SHARE of
+# it says little about fit and is not worth walking its postings.
+LARGE_BUCKET = 1000
+MAX_FEATURE_SHARE = 0.5
+# Batches of published listings larger than this are indexed without scoring
+# each one; the cached lists they might now rank in are dropped instead.
+MATCH_RESCORE_MAX = int(os.getenv("MATCH_RESCORE_MAX", "50"))
+# Listings per announced event.
+ANNOUNCE_BATCH = 1000
+
+COUNTERPART = {"RFQ": "OFFER", "OFFER": "RFQ"}
+# Feature prefix -> weight: title token, details key, incoterm, country.
+WEIGHTS = {"t": 3.0, "d": 1.0, "i": 2.0, "c": 1.5}
+PUBLISHED_CHANNEL = "published"
+
+# What ``features`` needs from a listing; also the shape of announced events.
+COLUMNS = (Listing.id, Listing.type, Listing.category, Listing.title, Listing.details, Listing.incoterm, Listing.country)
+
+
+def features(l) -> tuple[str, str, set[str]]:
+    """``(type, category, features)`` of a ``Listing``, row or announced event."""
+    kind = l.type.value if hasattr(l.type, "value") else l.type
+    feats = {f"t:{tok}" for tok in search.tokenize(l.title or "") if not tok.isdigit()}
+    feats.update(f"d:{str(k).lower()}" for k in (l.details or {}))
+    if l.incoterm:
+        feats.add(f"i:{l.incoterm.upper()}")
+    if l.country:
+        feats.add(f"c:{l.country.lower()}")
+    return kind, (l.category or "").lower(), feats
+
+
+class MatchIndex:
+    """Postings of published listings per ``(type, category)`` bucket."""
+
+    def __init__(self):
+        self.buckets: dict[tuple[str, str], dict[str, array]] = {}
+        self.sizes: dict[tuple[str, str], int] = defaultdict(int)
+        # One byte per listing id: whether it is indexed.
+        self._seen = bytearray()
+
+    def __len__(self):
+        return sum(self.sizes.values())
+
+    def __contains__(self, lid: int):
+        return lid < len(self._seen) and self._seen[lid] == 1
+
+    def add(self, lid: int, kind: str, category: str, feats: Iterable[str]) -> bool:
+        """Index a listing; ``False`` if it already was. Listings are never unpublished."""
+        if lid in self:
+            return False
+        if lid >= len(self._seen):
+            self._seen.extend(bytes(max(lid + 1 - len(self._seen), len(self._seen))))
+        self._seen[lid] = 1
+        key = (kind, category)
+        bucket = self.buckets.setdefault(key, {})
+        for f in feats:
+            postings = bucket.get(f)
+            if postings is None:
+                bucket[f] = array("i", (lid,))
+            else:
+                postings.append(lid)
+        self.sizes[key] += 1
+        return True
+
+    def score(self, kind: str, category: str, feats: Iterable[str]) -> dict[int, float]:
+        """Score of every counterpart sharing a feature with the given listing."""
+        key = (COUNTERPART[kind], category)
+        bucket, n = self.buckets.get(key), self.sizes[key]
+        scores: dict[int, float] = defaultdict(float)
+        if not bucket:
+            return scores
+        for f in feats:
+            postings = bucket.get(f)
+            if not postings or (n >= LARGE_BUCKET and len(postings) > n * MAX_FEATURE_SHARE):
+                continue
+            weight = WEIGHTS[f[0]] * math.log(1 + n / len(postings))
+            for lid in postings:
+                scores[lid] += weight
+        return scores
+
+
+class MatchLists:
+    """LRU of ranked ``[(score, listing_id), ...]`` lists, best first, per listing."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[int, list[tuple[float, int]]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, lid: int) -> Optional[list[tuple[float, int]]]:
+        ranked = self._data.get(lid)
+        if ranked is not None:
+            self._data.move_to_end(lid)
+        return ranked
+
+    def set(self, lid: int, scores: dict[int, float]) -> list[tuple[float, int]]:
+        ranked = [(s, i) for i, s in heapq.nlargest(MATCH_TOP_K, scores.items(), key=itemgetter(1))]
+        self._data[lid] = ranked
+        self._data.move_to_end(lid)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return ranked
+
+    def offer(self, lid: int, scores: dict[int, float]):
+        """Push ``lid`` into each cached list it now ranks in, given its score against that listing."""
+        for other in self._data.keys() & scores.keys():
+            ranked, score = self._data[other], scores[other]
+            if len(ranked) < MATCH_TOP_K or score > ranked[-1][0]:
+                insort(ranked, (score, lid), key=lambda e: -e[0])
+                del ranked[MATCH_TOP_K:]
+
+    def clear(self):
+        self._data.clear()
+
+
+index: Optional[MatchIndex] = None
+lists = MatchLists(MATCH_CACHE_SIZE)
+_loading = asyncio.Lock()
+# Listings announced while the index loads, applied once it has.
+_pending: list = []
+
+
+def load(bind=engine, batch_size: int = 5000) -> MatchIndex:
+    idx = MatchIndex()
+    with bind.connect() as conn:
+        rows = conn.execution_options(yield_per=batch_size).execute(
+            select(*COLUMNS).where(Listing.status == "published")
+        )
+        for r in rows:
+            idx.add(r.id, *features(r))
+    return idx
+
+
+async def ensure() -> MatchIndex:
+    """The index, loading it in a thread on first use."""
+    global index
+    if index is None:
+        async with _loading:
+            if index is None:
+                idx = await anyio.to_thread.run_sync(load)
+                index = idx
+                published(_pending)
+                _pending.clear()
+    return index
+
+
+def reset():
+    global index
+    index = None
+    lists.clear()
+
+
+def published(listings: Iterable):
+    """Add newly published listings to the index and to the cached lists they now rank in."""
+    listings = list(listings)
+    if index is None:
+        if _loading.locked():
+            _pending.extend(listings)
+        return
+    if len(listings) > MATCH_RESCORE_MAX:
+        for l in listings:
+            index.add(l.id, *features(l))
+        lists.clear()
+        return
+    for l in listings:
+        kind, category, feats = features(l)
+        if not index.add(l.id, kind, category, feats):
+            continue
+        scores = index.score(kind, category, feats)
+        lists.set(l.id, scores)
+        lists.offer(l.id, scores)
+
+
+async def announce(listings: list):
+    """Apply ``published`` here and tell the other workers."""
+    published(listings)
+    rows = [{c.key: getattr(l, c.key) for c in COLUMNS} for l in listings]
+    for row in rows:
+        row["type"] = getattr(row["type"], "value", row["type"])
+    for i in range(0, len(rows), ANNOUNCE_BATCH):
+        await pubsub.broker.publish(PUBLISHED_CHANNEL, {"listings": rows[i:i + ANNOUNCE_BATCH]})
+
+
+async def matches(l) -> list[tuple[float, int]]:
+    """The ranked counterparts of a listing, from the LRU or scored now."""
+    ranked = lists.get(l.id)
+    if ranked is None:
+        idx = await ensure()
+        ranked = lists.set(l.id, idx.score(*features(l)))
+    return ranked
+
+
+async def listener():
+    """Background task: load the index, then keep it in step with listings
+    published by any worker. A lagging subscription drops the index so that
+    it reloads."""
+    while True:
+        try:
+            async with pubsub.broker.subscribe(PUBLISHED_CHANNEL) as sub:
+                if MATCH_PRELOAD:
+                    await ensure()
+                while True:
+                    event = await sub.get()
+                    published(SimpleNamespace(**row) for row in event["listings"])
+        except pubsub.Lagged:
+            logger.warning("Missed published listings; reloading the match index")
+            reset()
+        except Exception:
+            logger.exception("Match index listener failed")
+            await asyncio.sleep(1)
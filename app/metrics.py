@@ -0,0 +1,227 @@
+"""Request, database and pool metrics in the Prometheus text format.
+
+A dependency-free subset of the Prometheus client: counters and histograms
+are plain dicts keyed by label values, updated from the event-loop thread,
+and gauges are callbacks read at scrape time. ``MetricsMiddleware`` times
+each request by route template; ``instrument_engine`` hooks SQLAlchemy so
+every query is timed and attributed to the request that ran it.
+``METRICS_ENABLED=0`` turns all of it off.
+"""
+import bisect
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for key, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        entry = self.values.get(label_values)
+        if entry is None:
+            entry = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        for key, entry in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), entry):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {entry[-1]}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {cumulative}"
+
+
+class Gauge:
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], collect: Callable[[], Iterable[tuple]]):
+        """``collect`` returns ``(label_values, value)`` pairs when scraped."""
+        self.name, self.help, self.labels, self.collect = name, help, labels, collect
+
+    def samples(self) -> Iterable[str]:
+        for key, value in self.collect():
+            yield f"{self.name}{_labels(self.labels, key)} {value}"
+
+
+registry: list = []
+
+
+def register(metric):
+    registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+http_requests = register(Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")))
+http_latency = register(Histogram("http_request_duration_seconds", "Time to complete a request.", ("method", "route")))
+http_queries = register(
+    Histogram("http_request_db_queries", "Database queries run per request.", ("method", "route"), COUNT_BUCKETS)
+)
+db_latency = register(Histogram("db_query_duration_seconds", "Time per database query.", ("engine",), QUERY_BUCKETS))
+stripe_latency = register(Histogram("stripe_request_duration_seconds", "Time per Stripe API call.", ("operation", "outcome")))
+
+# [queries, seconds] for the request being handled, shared with DB hooks.
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db", default=None)
+
+
+_hooks: dict = {}
+
+
+def instrument_engine(engine, name: str):
+    """Time every query on ``engine`` (sync or async) and count it against the current request."""
+    if not METRICS_ENABLED:
+        return
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    def start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def end(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_latency.observe(elapsed, name)
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+    _hooks[sync_engine] = (("before_cursor_execute", start), ("after_cursor_execute", end))
+    for identifier, fn in _hooks[sync_engine]:
+        event.listen(sync_engine, identifier, fn)
+
+
+def uninstrument_engine(engine):
+    sync_engine = getattr(engine, "sync_engine", engine)
+    for identifier, fn in _hooks.pop(sync_engine, ()):
+        event.remove(sync_engine, identifier, fn)
+
+
+@contextmanager
+def timed(histogram: Histogram, *label_values):
+    """Observe the block's duration, with an extra ``outcome`` label of ok/error."""
+    t0 = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        histogram.observe(time.perf_counter() - t0, *label_values, outcome)
+
+
+def _pool_stats(engines: dict):
+    for name, engine in engines.items():
+        pool = getattr(engine, "sync_engine", engine).pool
+        if hasattr(pool, "checkedout"):
+            yield (name, "checked_out"), pool.checkedout()
+            yield (name, "idle"), pool.checkedin()
+            yield (name, "overflow"), max(pool.overflow(), 0)
+            yield (name, "size"), pool.size()
+
+
+def _threadpool_stats():
+    import anyio.to_thread
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    yield ("busy",), limiter.borrowed_tokens
+    yield ("limit",), limiter.total_tokens
+    yield ("waiting",), limiter.statistics().tasks_waiting
+
+
+def _cache_stats(caches: dict):
+    for name, cache in caches.items():
+        stats = cache.stats()
+        for key in ("hits", "misses", "size"):
+            yield (name, key), stats[key]
+
+
+def register_runtime_gauges(engines: dict, caches: dict, hashing_in_flight: Callable[[], int]):
+    """Pool, threadpool, password-hashing and cache gauges, read at scrape time."""
+    register(Gauge("db_pool_connections", "Connection pool state per engine.", ("engine", "state"), lambda: _pool_stats(engines)))
+    register(Gauge("threadpool_tokens", "Request threadpool usage.", ("state",), _threadpool_stats))
+    register(Gauge("password_hashing_in_flight", "bcrypt jobs running or queued.", (), lambda: [((), hashing_in_flight())]))
+    register(Gauge("cache_stats", "In-process cache hits, misses and size.", ("cache", "stat"), lambda: _cache_stats(caches)))
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _request_db.reset(token)
+            route = scope.get("route")
+            # Answered before routing (cache hits, 429s) or no route matched.
+            path = route.path if route is not None else "unrouted"
+            method = scope["method"]
+            http_requests.inc(method, path, status)
+            http_latency.observe(elapsed, method, path)
+            http_queries.observe(stats[0], method, path)
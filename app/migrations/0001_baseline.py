@@ -0,0 +1,18 @@
+"""Tables and indexes as of the first versioned release.
+
+Databases created before migrations existed already have the tables, so
+everything is created only if missing. Tables reshaped by later
+migrations keep their old form here until those run.
+"""
+from . import has_column
+from ..db import Base
+from .. import models  # noqa: F401  (registers the tables)
+
+
+def upgrade(conn):
+    Base.metadata.create_all(conn)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            # Columns added by later migrations get their indexes there.
+            if all(has_column(conn, table.name, c.name) for c in index.columns):
+                index.create(conn, checkfirst=True)
@@ -0,0 +1,9 @@
+"""Local Stripe price catalog and a lookup index for webhook customers."""
+from ..models import Price, User
+
+
+def upgrade(conn):
+    Price.__table__.create(conn, checkfirst=True)
+    for index in User.__table__.indexes:
+        if index.name == "ix_users_stripe_customer_id":
+            index.create(conn, checkfirst=True)
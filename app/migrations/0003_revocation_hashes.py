@@ -0,0 +1,42 @@
+"""Store revocations by token hash and expiry instead of the full JWT.
+
+Existing rows are converted in batches; those whose token has already
+expired are dropped since they no longer protect anything.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, String, column, insert, select, table, text
+
+from . import has_column
+from ..auth import token_expiry, token_key
+from ..models import RevokedToken
+
+BATCH = 5000
+
+
+def upgrade(conn):
+    if not has_column(conn, "revoked_tokens", "token"):
+        return
+    conn.execute(text("ALTER TABLE revoked_tokens RENAME TO revoked_tokens_old"))
+    # Indexes keep their names across the rename; free them for the new table.
+    for index in RevokedToken.__table__.indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER INDEX revoked_tokens_pkey RENAME TO revoked_tokens_old_pkey"))
+    RevokedToken.__table__.create(conn)
+    old = table("revoked_tokens_old", column("token", String), column("revoked_at", DateTime(timezone=True)))
+    now = datetime.now(timezone.utc)
+    rows = conn.execution_options(stream_results=True).execute(select(old.c.token, old.c.revoked_at))
+    for batch in rows.partitions(BATCH):
+        values = {}
+        for token, revoked_at in batch:
+            expires_at = token_expiry(token)
+            if expires_at is not None and expires_at > now:
+                values[token_key(token)] = {
+                    "token_hash": token_key(token),
+                    "expires_at": expires_at,
+                    "revoked_at": revoked_at or now,
+                }
+        if values:
+            conn.execute(insert(RevokedToken), list(values.values()))
+    conn.execute(text("DROP TABLE revoked_tokens_old"))
@@ -0,0 +1,8 @@
+"""Rollup of published listing counts for /market/facets."""
+from ..facets import rebuild
+from ..models import ListingFacet
+
+
+def upgrade(conn):
+    ListingFacet.__table__.create(conn, checkfirst=True)
+    rebuild(conn)
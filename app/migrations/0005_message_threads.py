@@ -0,0 +1,16 @@
+"""Thread-ordered message index and per-user unread counters.
+
+``(listing_id, created_at, id)`` replaces the single-column listing index.
+Existing messages count as read.
+"""
+from sqlalchemy import text
+
+from ..models import Message, UnreadCount
+
+
+def upgrade(conn):
+    for index in Message.__table__.indexes:
+        if index.name == "ix_messages_thread":
+            index.create(conn, checkfirst=True)
+    conn.execute(text("DROP INDEX IF EXISTS ix_messages_listing_id"))
+    UnreadCount.__table__.create(conn, checkfirst=True)
@@ -0,0 +1,19 @@
+"""Parsed quantity columns on listings and the ``listing_attributes`` table,
+backfilled from existing listings."""
+from sqlalchemy import text
+
+from . import has_column
+from ..attributes import backfill
+from ..models import Listing, ListingAttribute
+
+
+def upgrade(conn):
+    for name in ("quantity_value", "quantity_unit"):
+        if not has_column(conn, "listings", name):
+            column = Listing.__table__.c[name]
+            conn.execute(text(f"ALTER TABLE listings ADD COLUMN {name} {column.type.compile(conn.dialect)}"))
+    for index in Listing.__table__.indexes:
+        if index.name == "ix_listings_quantity":
+            index.create(conn, checkfirst=True)
+    ListingAttribute.__table__.create(conn, checkfirst=True)
+    backfill(conn)
@@ -0,0 +1,6 @@
+"""Audit trail of admin moderation (``moderation_events``)."""
+from ..models import ModerationEvent
+
+
+def upgrade(conn):
+    ModerationEvent.__table__.create(conn, checkfirst=True)
@@ -0,0 +1,9 @@
+"""``users.subscription_event_at``, so late subscription webhooks are ignored."""
+from sqlalchemy import text
+
+from . import has_column
+
+
+def upgrade(conn):
+    if not has_column(conn, "users", "subscription_event_at"):
+        conn.execute(text("ALTER TABLE users ADD COLUMN subscription_event_at INTEGER"))
@@ -0,0 +1,57 @@
+"""Versioned schema migrations.
+
+Each module ``NNNN_description.py`` in this package defines
+``upgrade(conn)``, run inside its own transaction. Applied versions are
+recorded in ``schema_migrations``. A fresh database gets the current models
+from ``0001_baseline``, so later migrations must check before they change
+something (``has_column`` and friends).
+
+    python -m app.bootstrap migrate
+"""
+import importlib
+import pkgutil
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select
+from sqlalchemy.engine import Connection, Engine
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _meta,
+    Column("version", String(64), primary_key=True),
+    Column("applied_at", DateTime(timezone=True)),
+)
+
+
+def available() -> list[str]:
+    return sorted(m.name for m in pkgutil.iter_modules(__path__) if m.name[:4].isdigit())
+
+
+def applied(conn: Connection) -> set[str]:
+    if not inspect(conn).has_table("schema_migrations"):
+        return set()
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending(engine: Engine) -> list[str]:
+    with engine.connect() as conn:
+        done = applied(conn)
+    return [v for v in available() if v not in done]
+
+
+def upgrade(engine: Engine) -> list[str]:
+    """Apply pending migrations in order; returns the versions applied."""
+    _meta.create_all(engine)
+    ran = []
+    for version in pending(engine):
+        module = importlib.import_module(f"{__name__}.{version}")
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(version=version, applied_at=datetime.now(timezone.utc)))
+        ran.append(version)
+    return ran
+
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, Boolean, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Integer, String, Boolean, DateTime, Float, ForeignKey, Text, Enum, Index, LargeBinary
 from sqlalchemy.types import JSON
 from datetime import datetime, timezone
 from .db import Base
@@ -16,8 +16,10 @@ class User(Base):
     hashed_password: Mapped[str] = mapped_column(String(255), nullable=False)
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    stripe_customer_id: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    stripe_customer_id: Mapped[str | None] = mapped_column(String(100), nullable=True, index=True)
     subscription_status: Mapped[str] = mapped_column(String(20), default="inactive")
+    # ``created`` (Unix seconds) of the last subscription webhook applied.
+    subscription_event_at: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     listings: Mapped[list["Listing"]] = relationship("Listing", back_populates="owner")
     messages: Mapped[list["Message"]] = relationship("Message", back_populates="sender")
@@ -30,6 +32,9 @@ class Listing(Base):
     title: Mapped[str] = mapped_column(String(200), index=True)
     details: Mapped[dict] = mapped_column(JSON, default=dict)
     quantity: Mapped[str] = mapped_column(String(50), default="")
+    # Parsed from ``quantity`` by ``app.attributes``.
+    quantity_value: Mapped[float | None] = mapped_column(Float, nullable=True)
+    quantity_unit: Mapped[str | None] = mapped_column(String(10), nullable=True)
     incoterm: Mapped[str] = mapped_column(String(20), default="")
     country: Mapped[str] = mapped_column(String(80), default="")
     city: Mapped[str] = mapped_column(String(80), default="")
@@ -39,6 +44,43 @@ class Listing(Base):
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     owner: Mapped["User"] = relationship("User", back_populates="listings")
     messages: Mapped[list["Message"]] = relationship("Message", back_populates="listing", cascade="all, delete-orphan")
+    attachments: Mapped[list["Attachment"]] = relationship("Attachment", back_populates="listing", cascade="all, delete-orphan")
+
+    # Cover the /market feed filters plus its (created_at, id) keyset order.
+    __table_args__ = (
+        Index("ix_listings_feed", "status", "created_at", "id"),
+        Index("ix_listings_feed_category", "status", "category", "created_at", "id"),
+        Index("ix_listings_feed_type_category", "status", "type", "category", "created_at", "id"),
+        Index("ix_listings_quantity", "status", "quantity_unit", "quantity_value"),
+    )
+
+class ListingAttribute(Base):
+    """A number parsed from a listing's ``details``, kept by ``app.attributes``."""
+    __tablename__ = "listing_attributes"
+    listing_id: Mapped[int] = mapped_column(ForeignKey("listings.id"), primary_key=True)
+    name: Mapped[str] = mapped_column(String(30), primary_key=True)
+    value: Mapped[float] = mapped_column(Float, nullable=False)
+
+    __table_args__ = (Index("ix_listing_attributes_value", "name", "value", "listing_id"),)
+
+class ListingFacet(Base):
+    """Published listings per combination of /market facet values, kept by ``app.facets``."""
+    __tablename__ = "listing_facets"
+    type: Mapped[str] = mapped_column(String(10), primary_key=True)
+    category: Mapped[str] = mapped_column(String(50), primary_key=True)
+    country: Mapped[str] = mapped_column(String(80), primary_key=True)
+    incoterm: Mapped[str] = mapped_column(String(20), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+class ModerationEvent(Base):
+    """A listing published or rejected by an admin, written by ``app.moderation``."""
+    __tablename__ = "moderation_events"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    listing_id: Mapped[int] = mapped_column(ForeignKey("listings.id"), index=True)
+    admin_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    action: Mapped[str] = mapped_column(String(10), nullable=False)
+    reason: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
 class Message(Base):
     __tablename__ = "messages"
@@ -46,15 +88,52 @@ class Message(Base):
     body: Mapped[str] = mapped_column(Text, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
-    listing_id: Mapped[int] = mapped_column(ForeignKey("listings.id"), index=True)
+    listing_id: Mapped[int] = mapped_column(ForeignKey("listings.id"))
     sender_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
 
     listing: Mapped["Listing"] = relationship("Listing", back_populates="messages")
     sender: Mapped["User"] = relationship("User", back_populates="messages")
 
+    # A thread in order; also serves lookups by listing_id alone.
+    __table_args__ = (Index("ix_messages_thread", "listing_id", "created_at", "id"),)
+
+class UnreadCount(Base):
+    """Messages from others on a user's listing that the user has not read yet."""
+    __tablename__ = "unread_counts"
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    listing_id: Mapped[int] = mapped_column(ForeignKey("listings.id"), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+class Attachment(Base):
+    __tablename__ = "attachments"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    listing_id: Mapped[int] = mapped_column(ForeignKey("listings.id"), index=True)
+    uploader_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    sha256: Mapped[str] = mapped_column(String(64), index=True, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    content_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    filename: Mapped[str] = mapped_column(String(255), default="")
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    listing: Mapped["Listing"] = relationship("Listing", back_populates="attachments")
+
 
 class RevokedToken(Base):
+    """A logged-out token, kept until it would have expired anyway."""
     __tablename__ = "revoked_tokens"
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    token: Mapped[str] = mapped_column(String(500), unique=True, nullable=False)
-    revoked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    token_hash: Mapped[bytes] = mapped_column(LargeBinary(32), primary_key=True)  # sha256 of the JWT
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True, nullable=False)
+    revoked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True, default=lambda: datetime.now(timezone.utc))
+
+class Price(Base):
+    """Local copy of the Stripe price catalog, kept current by webhooks."""
+    __tablename__ = "prices"
+    id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    product_id: Mapped[str] = mapped_column(String(100), index=True, default="")
+    name: Mapped[str] = mapped_column(String(200), default="")
+    currency: Mapped[str] = mapped_column(String(10), default="")
+    unit_amount: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    active: Mapped[bool] = mapped_column(Boolean, default=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,91 @@
+"""Publishing and rejecting listings in batches.
+
+``apply`` moves every matching listing in one ``UPDATE ... RETURNING``,
+writes one ``moderation_events`` row per listing for the audit trail and
+updates the facet rollup and search index for the whole batch, all in the
+caller's transaction. ``notify`` then clears the response cache and
+announces the published listings to the match index once, after commit.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import facets, httpcache, matching, search
+from .models import Listing, ListingType, ModerationEvent, User
+
+PENDING = "draft"
+# action -> (statuses it applies to, status it sets)
+ACTIONS = {
+    "publish": ((PENDING, "rejected"), "published"),
+    "reject": ((PENDING,), "rejected"),
+}
+# Most listings one filter moves per request, oldest first.
+MODERATION_BATCH_MAX = int(os.getenv("MODERATION_BATCH_MAX", "10000"))
+
+# What the hooks read from each moderated listing.
+RETURNED = (*matching.COLUMNS, Listing.city)
+
+
+def criteria(filters: dict) -> list:
+    """Conditions on ``Listing`` for the filters a batch or the pending queue accepts."""
+    conds = []
+    if filters.get("type") in ("RFQ", "OFFER"):
+        conds.append(Listing.type == ListingType(filters["type"]))
+    for name in ("category", "country"):
+        if filters.get(name):
+            conds.append(getattr(Listing, name) == filters[name])
+    if filters.get("owner_email"):
+        conds.append(Listing.owner_id == select(User.id).where(User.email == filters["owner_email"]).scalar_subquery())
+    if filters.get("created_after"):
+        conds.append(Listing.created_at >= filters["created_after"])
+    if filters.get("created_before"):
+        conds.append(Listing.created_at < filters["created_before"])
+    return conds
+
+
+async def apply(
+    db: AsyncSession,
+    admin_id: int,
+    action: str,
+    ids: Optional[list[int]] = None,
+    filters: Optional[dict] = None,
+    reason: Optional[str] = None,
+) -> list:
+    """Apply ``action`` to the listings in ``ids``, or to the oldest
+    ``MODERATION_BATCH_MAX`` matching ``filters``, that it applies to.
+    Returns the ``RETURNED`` rows of the listings that changed."""
+    sources, target = ACTIONS[action]
+    stmt = update(Listing).where(Listing.status.in_(sources))
+    if ids is not None:
+        stmt = stmt.where(Listing.id.in_(ids))
+    else:
+        oldest = (
+            select(Listing.id)
+            .where(Listing.status.in_(sources), *criteria(filters or {}))
+            .order_by(Listing.created_at, Listing.id)
+            .limit(MODERATION_BATCH_MAX)
+        )
+        stmt = stmt.where(Listing.id.in_(oldest))
+    stmt = stmt.values(status=target).returning(*RETURNED).execution_options(synchronize_session=False)
+    rows = (await db.execute(stmt)).all()
+    if not rows:
+        return rows
+    now = datetime.now(timezone.utc)
+    await db.execute(insert(ModerationEvent), [
+        {"listing_id": r.id, "admin_id": admin_id, "action": action, "reason": reason, "created_at": now}
+        for r in rows
+    ])
+    if target == "published":
+        await db.run_sync(search.index_listings, rows)
+        await db.run_sync(facets.record, rows)
+    return rows
+
+
+async def notify(action: str, rows: list):
+    """Once the batch is committed: drop cached responses and update the match index."""
+    if rows and ACTIONS[action][1] == "published":
+        httpcache.invalidate()
+        await matching.announce(rows)
@@ -0,0 +1,46 @@
+"""Keyset paging for feeds ordered by ``(created_at, id)``, with opaque cursors."""
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[tuple[datetime, int]]:
+    """``None`` for an empty cursor (first page); 400 if it was tampered with."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def older_than(created_col, id_col, key: tuple[datetime, int]):
+    """Rows strictly after ``key`` in ``created_at DESC, id DESC`` order.
+
+    Written as a row-value comparison: the equivalent ``a < x OR (a = x AND
+    b < y)`` keeps SQLite from seeking the composite index.
+    """
+    return tuple_(created_col, id_col) < tuple_(*key)
+
+
+def newer_than(created_col, id_col, key):
+    """Rows strictly after ``key`` in ``created_at, id`` order."""
+    return tuple_(created_col, id_col) > tuple_(*key)
@@ -0,0 +1,221 @@
+"""Publish/subscribe for pushing new messages to connected clients.
+
+Subscribers get a bounded queue per channel. A subscriber that falls
+``PUBSUB_QUEUE_SIZE`` events behind is disconnected rather than buffered
+without limit; clients reconnect with ``since_id`` and catch up from the
+database.
+
+``PUBSUB_URL`` picks the backend:
+
+* ``memory://``         - fan-out within this process only (default).
+* ``sqlite:///path.db`` - events go through a SQLite file so every worker on
+  the host sees them, within ``PUBSUB_POLL_SECONDS``.
+* ``redis://host:6379`` - events go through Redis channels so every worker
+  sees them (needs the ``redis`` package).
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_URL = os.getenv("PUBSUB_URL", "memory://")
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", "100"))
+PUBSUB_POLL_SECONDS = float(os.getenv("PUBSUB_POLL_SECONDS", "0.1"))
+
+# Put on a subscriber's queue when it overflows.
+LAGGED = object()
+
+
+class Lagged(Exception):
+    """The subscriber missed events and should resync from the database."""
+
+
+class Subscription:
+    def __init__(self, queue_size: int = PUBSUB_QUEUE_SIZE):
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.lagged = False
+
+    def deliver(self, event: dict):
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(LAGGED)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Next event, or ``None`` after ``timeout`` seconds without one."""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is LAGGED:
+            raise Lagged()
+        return event
+
+
+class MemoryBroker:
+    def __init__(self):
+        self._channels: dict[str, set[Subscription]] = {}
+
+    def subscriber_count(self, channel: Optional[str] = None) -> int:
+        if channel is not None:
+            return len(self._channels.get(channel, ()))
+        return sum(len(subs) for subs in self._channels.values())
+
+    def _fan_out(self, channel: str, event: dict):
+        for sub in list(self._channels.get(channel, ())):
+            sub.deliver(event)
+
+    async def publish(self, channel: str, event: dict):
+        self._fan_out(channel, event)
+
+    async def _listen(self, channel: str):
+        pass
+
+    async def _unlisten(self, channel: str):
+        pass
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[Subscription]:
+        sub = Subscription()
+        subs = self._channels.setdefault(channel, set())
+        subs.add(sub)
+        if len(subs) == 1:
+            await self._listen(channel)
+        try:
+            yield sub
+        finally:
+            subs.discard(sub)
+            if not subs:
+                del self._channels[channel]
+                await self._unlisten(channel)
+
+
+class RedisBroker(MemoryBroker):
+    """Relays events through Redis; one Redis subscription per channel per
+    process, fanned out locally like ``MemoryBroker``."""
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis.asyncio
+
+        self.redis = redis.asyncio.Redis.from_url(url)
+        self.pubsub = self.redis.pubsub()
+        self._reader: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, event: dict):
+        await self.redis.publish(channel, json.dumps(event, default=str))
+
+    async def _listen(self, channel: str):
+        await self.pubsub.subscribe(channel)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def _unlisten(self, channel: str):
+        await self.pubsub.unsubscribe(channel)
+
+    async def _read(self):
+        async for message in self.pubsub.listen():
+            if message["type"] == "message":
+                self._fan_out(message["channel"].decode(), json.loads(message["data"]))
+
+
+class SQLiteBroker(MemoryBroker):
+    """Relays events through an append-only table in a SQLite file. While a
+    process has subscribers it polls for rows newer than the last one seen;
+    rows older than ``RETAIN_SECONDS`` are deleted as new ones arrive."""
+
+    RETAIN_SECONDS = 60
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._published = 0
+        self._last_id = 0
+        self._reader: Optional[asyncio.Task] = None
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS pubsub_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT, data TEXT, created REAL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, channel: str, data: str):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT INTO pubsub_events (channel, data, created) VALUES (?, ?, ?)", (channel, data, now))
+        self._published += 1
+        if self._published % self.SWEEP_EVERY == 0:
+            conn.execute("DELETE FROM pubsub_events WHERE created < ?", (now - self.RETAIN_SECONDS,))
+
+    def _since(self, last_id: int) -> list:
+        return self._conn().execute(
+            "SELECT id, channel, data FROM pubsub_events WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+
+    def _max_id(self) -> int:
+        return self._conn().execute("SELECT coalesce(max(id), 0) FROM pubsub_events").fetchone()[0]
+
+    async def publish(self, channel: str, event: dict):
+        await anyio.to_thread.run_sync(self._insert, channel, json.dumps(event, default=str))
+
+    async def _listen(self, channel: str):
+        if self._reader is None or self._reader.done():
+            # Start from now: subscribers replay anything older from the database.
+            self._last_id = await anyio.to_thread.run_sync(self._max_id)
+            self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        while self._channels:
+            try:
+                rows = await anyio.to_thread.run_sync(self._since, self._last_id)
+            except sqlite3.Error:
+                logger.exception("Polling %s failed", self.path)
+                rows = []
+            for id_, channel, data in rows:
+                self._last_id = id_
+                if channel in self._channels:
+                    self._fan_out(channel, json.loads(data))
+            await asyncio.sleep(PUBSUB_POLL_SECONDS)
+
+
+def broker_from_url(url: str):
+    if url.startswith("memory://"):
+        return MemoryBroker()
+    if url.startswith("sqlite:///"):
+        return SQLiteBroker(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url)
+    raise ValueError(f"Unsupported PUBSUB_URL: {url}")
+
+
+broker = broker_from_url(PUBSUB_URL)
+
+
+def listing_channel(lid: int) -> str:
+    return f"listing:{lid}"
+
+
+def inbox_channel(user_id: int) -> str:
+    return f"inbox:{user_id}"
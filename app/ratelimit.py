@@ -0,0 +1,241 @@
+"""Per-client rate limiting applied as ASGI middleware.
+
+Counting uses a sliding-window counter: each key keeps only the hit counts of
+the current and previous fixed windows, and the previous one is weighted by
+how much of it still overlaps the sliding window. That is O(1) memory per key
+and close enough to an exact log of timestamps for abuse protection.
+
+Storage is pluggable through ``RATE_LIMIT_STORAGE``:
+
+* ``memory://``          - per process, LRU-bounded to ``RATE_LIMIT_MAX_KEYS`` keys.
+* ``sqlite:///path.db``  - a small SQLite file shared by all workers on a host.
+* ``redis://host:6379``  - any Redis-protocol server (needs the ``redis`` package).
+* ``fake-redis://``      - in-process stand-in speaking the same command subset.
+"""
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import anyio
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE", "memory://")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+def _estimate(prev: int, curr: int, now: float, window: float) -> float:
+    elapsed = (now % window) / window
+    return prev * (1 - elapsed) + curr
+
+
+def _retry_after(prev: int, curr: int, limit: int, now: float, window: float) -> int:
+    """Seconds until the weighted previous window has decayed enough to let one hit in."""
+    if prev == 0 or curr >= limit:
+        return math.ceil(window - now % window)
+    needed = 1 - (limit - curr) / prev  # fraction of the window that must have passed
+    return max(1, math.ceil(needed * window - now % window))
+
+
+class MemoryBackend:
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._data: OrderedDict[str, list] = OrderedDict()  # key -> [window, curr, prev]
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str, limit: int, window: float) -> tuple[bool, int]:
+        now = time.time()
+        win = int(now // window)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                entry = self._data[key] = [win, 0, 0]
+                if len(self._data) > self.max_keys:
+                    self._data.popitem(last=False)
+            else:
+                self._data.move_to_end(key)
+                if entry[0] != win:
+                    entry[2] = entry[1] if entry[0] == win - 1 else 0
+                    entry[0], entry[1] = win, 0
+            _, curr, prev = entry
+            if _estimate(prev, curr, now, window) >= limit:
+                return False, _retry_after(prev, curr, limit, now, window)
+            entry[1] += 1
+            return True, 0
+
+
+class SQLiteBackend:
+    """Counters in a SQLite file so every worker process shares them."""
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._hits = 0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT PRIMARY KEY, win INTEGER, curr INTEGER, prev INTEGER, expires REAL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # losing a few counts on power loss is fine
+            self._local.conn = conn
+        return conn
+
+    def _hit(self, key: str, limit: int, window: float) -> tuple[bool, int]:
+        now = time.time()
+        win = int(now // window)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT win, curr, prev FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            curr = prev = 0
+            if row:
+                if row[0] == win:
+                    curr, prev = row[1], row[2]
+                elif row[0] == win - 1:
+                    prev = row[1]
+            if _estimate(prev, curr, now, window) >= limit:
+                conn.execute("COMMIT")
+                return False, _retry_after(prev, curr, limit, now, window)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, win, curr, prev, expires) VALUES (?, ?, ?, ?, ?)",
+                (key, win, curr + 1, prev, (win + 2) * window),
+            )
+            self._hits += 1
+            if self._hits % self.SWEEP_EVERY == 0:
+                conn.execute("DELETE FROM rate_limits WHERE expires < ?", (now,))
+            conn.execute("COMMIT")
+            return True, 0
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def hit(self, key: str, limit: int, window: float) -> tuple[bool, int]:
+        return await anyio.to_thread.run_sync(self._hit, key, limit, window)
+
+
+class RedisBackend:
+    """One key per (client, window) holding an INCR counter that expires after
+    two windows. Read-then-increment is not atomic, so concurrent bursts can
+    overshoot the limit by a few requests."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def hit(self, key: str, limit: int, window: float) -> tuple[bool, int]:
+        now = time.time()
+        win = int(now // window)
+        curr_key, prev_key = f"rl:{key}:{win}", f"rl:{key}:{win - 1}"
+        curr, prev = (int(v or 0) for v in await self.client.mget(curr_key, prev_key))
+        if _estimate(prev, curr, now, window) >= limit:
+            return False, _retry_after(prev, curr, limit, now, window)
+        if await self.client.incr(curr_key) == 1:
+            await self.client.expire(curr_key, math.ceil(2 * window))
+        return True, 0
+
+
+class FakeRedis:
+    """The ``mget``/``incr``/``expire`` subset of ``redis.asyncio.Redis``, in memory."""
+
+    def __init__(self):
+        self._data: dict[str, tuple[int, Optional[float]]] = {}
+
+    def _get(self, key: str) -> Optional[int]:
+        value, expires = self._data.get(key, (None, None))
+        if expires is not None and expires <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    async def mget(self, *keys: str) -> list[Optional[bytes]]:
+        return [None if (v := self._get(k)) is None else str(v).encode() for k in keys]
+
+    async def incr(self, key: str) -> int:
+        value = (self._get(key) or 0) + 1
+        self._data[key] = (value, self._data.get(key, (None, None))[1])
+        return value
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        if self._get(key) is None:
+            return False
+        self._data[key] = (self._data[key][0], time.time() + seconds)
+        return True
+
+
+def backend_from_url(url: str):
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith("fake-redis://"):
+        return RedisBackend(FakeRedis())
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis.asyncio
+
+        return RedisBackend(redis.asyncio.Redis.from_url(url))
+    raise ValueError(f"Unsupported RATE_LIMIT_STORAGE: {url}")
+
+
+def parse_rate(spec: str) -> tuple[int, int]:
+    """``"5/60"`` -> 5 requests per 60 seconds."""
+    limit, _, window = spec.partition("/")
+    return int(limit), int(window)
+
+
+@dataclass
+class Policy:
+    name: str
+    method: str
+    path: re.Pattern
+    limit: int
+    window: int
+    detail: str = "Too many requests"
+
+
+def default_policies() -> list[Policy]:
+    def policy(name, method, path, default, **kwargs):
+        limit, window = parse_rate(os.getenv(f"RATE_LIMIT_{name.upper()}", default))
+        return Policy(name, method, re.compile(path), limit, window, **kwargs)
+
+    return [
+        policy("login", "POST", r"^/auth/login$", "5/60", detail="Too many login attempts"),
+        policy("register", "POST", r"^/auth/register$", "10/3600"),
+        policy("messages", "POST", r"^/listings/\d+/messages$", "30/60"),
+        policy("uploads", "POST", r"^/listings/\d+/attachments$", "20/3600"),
+    ]
+
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp, backend=None, policies: Optional[list[Policy]] = None):
+        self.app = app
+        self.backend = backend or backend_from_url(RATE_LIMIT_STORAGE)
+        self.policies = default_policies() if policies is None else policies
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            for p in self.policies:
+                if scope["method"] == p.method and p.path.match(scope["path"]):
+                    client = scope.get("client")
+                    key = f"{p.name}:{client[0] if client else 'unknown'}"
+                    allowed, retry_after = await self.backend.hit(key, p.limit, p.window)
+                    if not allowed:
+                        response = JSONResponse(
+                            {"detail": p.detail}, status_code=429, headers={"Retry-After": str(retry_after)}
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
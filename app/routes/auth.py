@@ -1,66 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from ..db import get_db
 from ..models import User, RevokedToken
 from ..schemas import RegisterRequest, TokenResponse, MeResponse
-from ..auth import hash_password, authenticate, create_access_token, get_current_user, oauth2_scheme
+from ..auth import (
+    Principal, create_access_token, get_current_user, hash_password_async,
+    oauth2_scheme, principals, revocations, token_expiry, token_key, verify_password_async,
+)
 from email_validator import validate_email, EmailNotValidError
-from time import time
-
-login_attempts: dict[str, list[float]] = {}
-ATTEMPT_WINDOW = 60
-MAX_ATTEMPTS = 5
 
 router = APIRouter()
 
+async def _credentials(db: AsyncSession, email: str):
+    """``(email, hashed_password)`` or ``None``, ending the transaction so the
+    pooled connection is not held while bcrypt runs."""
+    row = (await db.execute(select(User.email, User.hashed_password).where(User.email == email))).first()
+    await db.rollback()
+    return row
+
 @router.post("/auth/register")
-def register(data: RegisterRequest, db: Session = Depends(get_db)):
+async def register(data: RegisterRequest, db: AsyncSession = Depends(get_db)):
     try:
-        validate_email(data.email)
+        # May resolve the domain's MX records, so keep it off the event loop.
+        await run_in_threadpool(validate_email, data.email)
     except EmailNotValidError:
         raise HTTPException(status_code=400, detail="Invalid email")
-    exists = db.query(User).filter(User.email == data.email).first()
-    if exists:
+    if await _credentials(db, data.email):
         raise HTTPException(status_code=409, detail="Email already registered")
-    user = User(email=data.email, hashed_password=hash_password(data.password), is_admin=False)
-    db.add(user); db.commit(); db.refresh(user)
+    user = User(email=data.email, hashed_password=await hash_password_async(data.password), is_admin=False)
+    db.add(user)
+    await db.commit()
     return {"ok": True}
 
 @router.post("/auth/login", response_model=TokenResponse)
-def login(
-    request: Request,
+async def login(
     form: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    ip = request.client.host
-    now = time()
-    attempts = [t for t in login_attempts.get(ip, []) if now - t < ATTEMPT_WINDOW]
-    if len(attempts) >= MAX_ATTEMPTS:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Too many login attempts",
-        )
-    attempts.append(now)
-    login_attempts[ip] = attempts
-    user = authenticate(db, form.username, form.password)
-    if not user:
+    # Attempts per client are capped by RateLimitMiddleware (app/ratelimit.py).
+    creds = await _credentials(db, form.username)
+    ok, new_hash = await verify_password_async(form.password, creds.hashed_password) if creds else (False, None)
+    if not ok:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    token = create_access_token(user.email)
+    if new_hash:
+        await db.execute(update(User).where(User.email == creds.email).values(hashed_password=new_hash))
+        await db.commit()
+    token = create_access_token(creds.email)
     return {"access_token": token, "token_type": "bearer"}
 
 
 @router.post("/auth/logout")
-def logout(
-    user: User = Depends(get_current_user),
+async def logout(
+    user: Principal = Depends(get_current_user),
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    if not db.query(RevokedToken).filter(RevokedToken.token == token).first():
-        db.add(RevokedToken(token=token))
-        db.commit()
+    key = token_key(token)
+    expires_at = token_expiry(token)
+    if await db.get(RevokedToken, key) is None:
+        db.add(RevokedToken(token_hash=key, expires_at=expires_at))
+        await db.commit()
+    revocations.add(key, expires_at)
+    principals.pop(key)
     return {"ok": True}
 
 @router.get("/me", response_model=MeResponse)
-def me(user: User = Depends(get_current_user)):
+async def me(user: Principal = Depends(get_current_user)):
     return {"email": user.email, "is_admin": user.is_admin, "subscription_status": user.subscription_status}
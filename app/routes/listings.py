@@ -1,17 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, insert, or_, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
 from typing import List, Optional
-import os, shutil
+import json
+import os
 
-from ..db import get_db
-from ..models import Listing, ListingType, User, Message
-from ..schemas import ListingIn, ListingOut, MessageIn, MessageOut
-from ..auth import admin_required, subscription_required
+from ..db import AsyncSessionLocal, get_db, upsert
+from ..models import Attachment, Listing, ListingType, User, Message, UnreadCount
+from ..schemas import (
+    InboxOut, InboxThread, ListingIn, ListingOut, MatchOut, MessageIn, MessageOut, ModerationIn, ModerationOut,
+)
+from ..auth import Principal, admin_required, subscription_required
+from .. import attributes, bulk, facets, fastjson, matching, moderation, pubsub, search, storage
+from ..pagination import DEFAULT_LIMIT, MAX_LIMIT, clamp_limit, decode_cursor, encode_cursor, newer_than, older_than
 
 router = APIRouter()
 
-def to_out(l: Listing) -> ListingOut:
-    return ListingOut(
+# Read paths select these columns rather than ``Listing`` entities: the owner's
+# email arrives in the same SELECT and nothing is added to the identity map.
+LISTING_COLUMNS = (
+    Listing.id,
+    Listing.type,
+    Listing.category,
+    Listing.title,
+    Listing.details,
+    Listing.quantity,
+    Listing.incoterm,
+    Listing.country,
+    Listing.city,
+    Listing.status,
+    Listing.created_at,
+    User.email.label("owner_email"),
+)
+
+def listing_rows():
+    return select(*LISTING_COLUMNS).outerjoin(User, Listing.owner_id == User.id)
+
+def visible_to(user: Principal):
+    """Listings ``user`` may see: published ones and their own; admins see all."""
+    if user.is_admin:
+        return true()
+    return or_(Listing.status == "published", Listing.owner_id == user.id)
+
+def to_out(l, owner_email: Optional[str] = None) -> ListingOut:
+    """Build a ``ListingOut`` from a ``listing_rows`` row or a ``Listing``.
+
+    A ``Listing`` has no ``owner_email`` column, so callers pass it in.
+    """
+    owner_email = owner_email or getattr(l, "owner_email", None)
+    fields = dict(
         id=l.id,
         type=l.type.value if hasattr(l.type, "value") else l.type,
         category=l.category,
@@ -23,14 +63,18 @@ def to_out(l: Listing) -> ListingOut:
         city=l.city or "",
         status=l.status,
         created_at=l.created_at,
-        owner_email=l.owner.email if l.owner else "unknown",
+        owner_email=owner_email or "unknown",
     )
+    # Rows come from our own tables, so the fast path skips re-validation.
+    if fastjson.FAST_JSON:
+        return ListingOut.model_construct(**fields)
+    return ListingOut(**fields)
 
 @router.post("/listings", response_model=ListingOut)
-def create_listing(
+async def create_listing(
     data: ListingIn,
-    user: User = Depends(subscription_required),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(subscription_required),
+    db: AsyncSession = Depends(get_db),
 ):
     if data.type not in ("RFQ", "OFFER"):
         raise HTTPException(status_code=400, detail="type must be RFQ or OFFER")
@@ -45,143 +89,645 @@ def create_listing(
         city=data.city or "",
         status="draft",
         owner_id=user.id,
+        **attributes.quantity_columns(data.quantity),
     )
     db.add(l)
-    db.commit()
-    db.refresh(l)
-    return to_out(l)
+    await db.flush()
+    await db.run_sync(search.index_listings, [l])
+    await db.run_sync(attributes.record, [l])
+    out = to_out(l, owner_email=user.email)
+    await db.commit()
+    return out
 
-@router.get("/market", response_model=List[ListingOut])
-def market(
+async def market_query(
+    db: AsyncSession,
     type: Optional[str] = None,
     category: Optional[str] = None,
     q: Optional[str] = None,
-    limit: int = 200,
-    offset: int = 0,
-    db: Session = Depends(get_db),
+    ranked: bool = False,
+    country: Optional[str] = None,
+    incoterm: Optional[str] = None,
+    min_qty: Optional[float] = None,
+    max_qty: Optional[float] = None,
+    unit: Optional[str] = None,
+    attrs: tuple = (),
 ):
-    query = db.query(Listing).filter(Listing.status == "published")
+    """``listing_rows`` narrowed to published listings matching the /market
+    filters, or ``None`` when ``q`` cannot match anything. ``attrs`` holds
+    ``attributes.parse_filter`` results."""
+    query = listing_rows().filter(Listing.status == "published")
     if type in ("RFQ", "OFFER"):
         query = query.filter(Listing.type == ListingType(type))
     if category:
         query = query.filter(Listing.category == category)
+    if country:
+        query = query.filter(Listing.country == country)
+    if incoterm:
+        query = query.filter(Listing.incoterm == incoterm)
+    if unit or min_qty is not None or max_qty is not None or attrs:
+        try:
+            query = await attributes.narrow(db, query, unit, min_qty, max_qty, attrs)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     if q:
-        like = f"%{q}%"
-        from sqlalchemy import or_, cast, String
-
-        query = query.filter(
-            or_(
-                Listing.title.ilike(like),
-                cast(Listing.details, String).ilike(like),
-                Listing.category.ilike(like),
-            )
-        )
-    rows = (
-        query.order_by(Listing.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
+        query = await db.run_sync(search.apply, query, q, ranked=ranked)
+    return query
+
+def attribute_filters(attr: List[str] = Query([], description="Repeatable, e.g. attr=gsm>=150")) -> tuple:
+    try:
+        return tuple(attributes.parse_filter(a) for a in attr)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def market_page(
+    db: AsyncSession,
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    limit: int = DEFAULT_LIMIT,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    country: Optional[str] = None,
+    incoterm: Optional[str] = None,
+    min_qty: Optional[float] = None,
+    max_qty: Optional[float] = None,
+    unit: Optional[str] = None,
+    attrs: tuple = (),
+) -> tuple[list, Optional[str]]:
+    """One page of published listings and the cursor for the page after it.
+
+    Passing ``cursor`` (even empty) switches to keyset mode: newest first,
+    ``offset`` ignored and ``q`` used as a filter only. Otherwise ``q``
+    results are ranked by relevance and paged by offset, and no cursor is
+    returned for them.
+    """
+    limit = clamp_limit(limit)
+    keyset = cursor is not None
+    query = await market_query(
+        db, type, category, q, ranked=not keyset, country=country, incoterm=incoterm,
+        min_qty=min_qty, max_qty=max_qty, unit=unit, attrs=attrs,
+    )
+    if query is None:
+        return [], None
+    query = query.order_by(Listing.created_at.desc(), Listing.id.desc())
+    if keyset:
+        key = decode_cursor(cursor)
+        if key:
+            query = query.filter(older_than(Listing.created_at, Listing.id, key))
+    else:
+        query = query.offset(offset)
+    rows = (await db.execute(query.limit(limit))).all()
+    next_cursor = None
+    if len(rows) == limit and (keyset or not q):
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "100000"))
+BULK_MAX_ERRORS = 1000
+
+@router.post(
+    "/listings/bulk",
+    description="Create draft listings from an NDJSON (application/x-ndjson) or CSV (text/csv) body.",
+)
+async def bulk_create_listings(
+    request: Request,
+    user: Principal = Depends(subscription_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """Import listings as drafts, validating each row like ``POST /listings``.
+
+    The body is parsed as it streams in and valid rows are inserted in
+    multi-row batches of ``BULK_BATCH_SIZE``, each committed on its own, so
+    no transaction stays open while the client is still uploading. If the
+    upload breaks off, the batches before it stay imported. Invalid rows are
+    skipped and reported by line number.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in bulk.NDJSON_TYPES:
+        rows = bulk.parse_ndjson(bulk.iter_lines(request.stream()))
+    elif content_type in bulk.CSV_TYPES:
+        rows = bulk.parse_csv(bulk.iter_lines(request.stream()))
+    else:
+        raise HTTPException(status_code=415, detail="Send application/x-ndjson or text/csv")
+
+    inserted, failed, errors, batch = 0, 0, [], []
+
+    async def flush():
+        values = [
+            {
+                **row.model_dump(), **attributes.quantity_columns(row.quantity),
+                "type": ListingType(row.type), "status": "draft", "owner_id": user.id, "created_at": now,
+            }
+            for row in batch
+        ]
+        ids = (await db.execute(insert(Listing).values(values).returning(Listing.id))).scalars().all()
+        listings = [Listing(id=i, **v) for i, v in zip(ids, values)]
+        await db.run_sync(search.index_listings, listings)
+        await db.run_sync(attributes.record, listings)
+        await db.commit()
+        batch.clear()
+        return len(ids)
+
+    # Release the connection used to authenticate before reading the body.
+    await db.commit()
+    now = datetime.now(timezone.utc)
+    async for line, row in rows:
+        if isinstance(row, str):
+            failed += 1
+            if len(errors) < BULK_MAX_ERRORS:
+                errors.append({"line": line, "error": row})
+            continue
+        if inserted + len(batch) >= BULK_MAX_ROWS:
+            failed += 1
+            errors.append({"line": line, "error": f"more than {BULK_MAX_ROWS} rows; the rest were skipped"})
+            break
+        batch.append(row)
+        if len(batch) >= BULK_BATCH_SIZE:
+            inserted += await flush()
+    if batch:
+        inserted += await flush()
+    return {"inserted": inserted, "failed": failed, "errors": errors}
+
+EXPORT_BATCH_SIZE = 1000
+
+async def export_lines(type, category, q, country=None, incoterm=None, **ranges):
+    # Its own session: the request's is closed before the body streams.
+    async with AsyncSessionLocal() as db:
+        query = await market_query(db, type, category, q, country=country, incoterm=incoterm, **ranges)
+        if query is None:
+            return
+        query = query.order_by(Listing.created_at.desc(), Listing.id.desc())
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield "".join(to_out(l).model_dump_json() + "\n" for l in rows)
+
+@router.get("/market/export")
+async def export_market(
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    country: Optional[str] = None,
+    incoterm: Optional[str] = None,
+    min_qty: Optional[float] = None,
+    max_qty: Optional[float] = None,
+    unit: Optional[str] = None,
+    attrs: tuple = Depends(attribute_filters),
+):
+    """Every published listing matching the /market filters as NDJSON, newest first."""
+    try:
+        attributes.parse_unit(unit, min_qty, max_qty)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    lines = export_lines(
+        type, category, q, country, incoterm, min_qty=min_qty, max_qty=max_qty, unit=unit, attrs=attrs
+    )
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+@router.get("/market/facets")
+async def market_facets(
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    country: Optional[str] = None,
+    incoterm: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Published-listing counts by type, category, country and incoterm.
+
+    Each dimension is counted with every other filter applied but not its
+    own, so clients can offer the alternatives to the current choice.
+    """
+    filters = {"type": type, "category": category, "country": country, "incoterm": incoterm}
+    if not q:
+        return await facets.counts(db, filters)
+
+    async def matches(scoped: dict):
+        return await market_query(db, q=q, **scoped)
+
+    return await facets.counts(db, filters, matches)
+
+@router.get("/market", response_model=List[ListingOut])
+async def market(
+    response: Response,
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    limit: int = DEFAULT_LIMIT,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    country: Optional[str] = None,
+    incoterm: Optional[str] = None,
+    min_qty: Optional[float] = None,
+    max_qty: Optional[float] = None,
+    unit: Optional[str] = None,
+    attrs: tuple = Depends(attribute_filters),
+    db: AsyncSession = Depends(get_db),
+):
+    """Published listings, newest first. ``min_qty``/``max_qty`` compare the
+    parsed quantity (in ``unit``, e.g. MT); each ``attr`` is a condition on
+    a parsed spec such as ``gsm>=150``."""
+    rows, next_cursor = await market_page(
+        db, type, category, q, limit, offset, cursor, country, incoterm,
+        min_qty=min_qty, max_qty=max_qty, unit=unit, attrs=attrs,
     )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if fastjson.FAST_JSON:
+        return fastjson.render([to_out(l) for l in rows], List[ListingOut], headers=headers)
+    response.headers.update(headers)
     return [to_out(l) for l in rows]
 
 @router.get("/listings/{lid}", response_model=ListingOut)
-def get_listing(lid: int, db: Session = Depends(get_db)):
-    l = db.get(Listing, lid)
-    if not l or l.status != "published":
+async def get_listing(lid: int, db: AsyncSession = Depends(get_db)):
+    l = (await db.execute(listing_rows().filter(Listing.id == lid, Listing.status == "published"))).first()
+    if not l:
         raise HTTPException(status_code=404, detail="Not found")
+    if fastjson.FAST_JSON:
+        return fastjson.render(to_out(l), ListingOut)
     return to_out(l)
 
+@router.get("/admin/listings/pending", response_model=List[ListingOut])
+async def pending_listings(
+    response: Response,
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    country: Optional[str] = None,
+    owner_email: Optional[str] = None,
+    limit: int = DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    admin: Principal = Depends(admin_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """Draft listings awaiting moderation, oldest first; the next page is at
+    ``cursor=<X-Next-Cursor>``."""
+    limit = clamp_limit(limit)
+    filters = dict(type=type, category=category, country=country, owner_email=owner_email)
+    query = listing_rows().filter(Listing.status == moderation.PENDING, *moderation.criteria(filters))
+    key = decode_cursor(cursor)
+    if key:
+        query = query.filter(newer_than(Listing.created_at, Listing.id, key))
+    rows = (await db.execute(query.order_by(Listing.created_at, Listing.id).limit(limit))).all()
+    headers = {"X-Next-Cursor": encode_cursor(rows[-1].created_at, rows[-1].id)} if len(rows) == limit else {}
+    if fastjson.FAST_JSON:
+        return fastjson.render([to_out(l) for l in rows], List[ListingOut], headers=headers)
+    response.headers.update(headers)
+    return [to_out(l) for l in rows]
+
+@router.post("/admin/listings/publish", response_model=ModerationOut)
+async def moderate_listings(
+    data: ModerationIn,
+    admin: Principal = Depends(admin_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """Publish or reject listings by ``ids`` or by ``filter`` in one batch.
+
+    Publishing applies to drafts and rejected listings, rejecting to drafts;
+    other listings are left alone. A filter moves at most
+    ``MODERATION_BATCH_MAX`` listings, oldest first, so repeat it until
+    ``count`` is 0. Each change is recorded in ``moderation_events``.
+    """
+    if (data.ids is None) == (data.filter is None):
+        raise HTTPException(status_code=400, detail="Pass either ids or filter")
+    filters = data.filter.model_dump() if data.filter else None
+    rows = await moderation.apply(db, admin.id, data.action, data.ids, filters, data.reason)
+    await db.commit()
+    await moderation.notify(data.action, rows)
+    return {"action": data.action, "count": len(rows), "ids": [r.id for r in rows]}
+
 @router.post("/admin/listings/{lid}/publish")
-def publish_listing(
+async def publish_listing(
     lid: int,
-    admin: User = Depends(admin_required),
-    db: Session = Depends(get_db),
+    admin: Principal = Depends(admin_required),
+    db: AsyncSession = Depends(get_db),
 ):
-    l = db.get(Listing, lid)
-    if not l:
+    if not await db.scalar(select(Listing.id).where(Listing.id == lid)):
         raise HTTPException(status_code=404, detail="Not found")
-    l.status = "published"
-    db.commit()
+    rows = await moderation.apply(db, admin.id, "publish", [lid])
+    await db.commit()
+    await moderation.notify("publish", rows)
     return {"ok": True}
 
+@router.get("/listings/{lid}/matches", response_model=List[MatchOut])
+async def listing_matches(
+    lid: int,
+    limit: int = matching.MATCH_TOP_K,
+    user: Principal = Depends(subscription_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """Published counterparts of a listing (OFFERs for an RFQ and RFQs for an
+    OFFER) in the same category, best first. Drafts are visible to their
+    owner and admins only."""
+    l = (await db.execute(select(*matching.COLUMNS).filter(Listing.id == lid, visible_to(user)))).first()
+    if not l:
+        raise HTTPException(status_code=404, detail="Not found")
+    ranked = (await matching.matches(l))[:max(0, limit)]
+    rows = {r.id: r for r in await db.execute(listing_rows().filter(Listing.id.in_([i for _, i in ranked])))}
+    # ``to_out`` has already validated each listing.
+    out = [MatchOut.model_construct(**to_out(rows[i]).__dict__, score=round(s, 3)) for s, i in ranked if i in rows]
+    if fastjson.FAST_JSON:
+        return fastjson.render(out, List[MatchOut])
+    return out
+
 @router.post("/listings/{lid}/messages", response_model=MessageOut)
-def add_message(
+async def add_message(
     lid: int,
     data: MessageIn,
-    user: User = Depends(subscription_required),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(subscription_required),
+    db: AsyncSession = Depends(get_db),
 ):
-    l = db.get(Listing, lid)
+    l = await db.get(Listing, lid)
     if not l:
         raise HTTPException(status_code=404, detail="Not found")
     m = Message(body=data.body, listing_id=lid, sender_id=user.id)
     db.add(m)
-    db.commit()
-    db.refresh(m)
-    return MessageOut(
+    await db.flush()
+    if l.owner_id and l.owner_id != user.id:
+        stmt = upsert(UnreadCount).values(
+            user_id=l.owner_id, listing_id=lid, count=1, last_message_id=m.id, updated_at=m.created_at
+        )
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "listing_id"],
+            set_={
+                "count": UnreadCount.count + 1,
+                "last_message_id": stmt.excluded.last_message_id,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ))
+    out = MessageOut(
         id=m.id,
         body=m.body,
         created_at=m.created_at,
-        sender_email=m.sender.email,
+        sender_email=user.email,
+    )
+    await db.commit()
+    event = {**out.model_dump(mode="json"), "listing_id": lid}
+    await pubsub.broker.publish(pubsub.listing_channel(lid), event)
+    if l.owner_id and l.owner_id != user.id:
+        await pubsub.broker.publish(pubsub.inbox_channel(l.owner_id), event)
+    return out
+
+def message_rows(*criteria, since_id: Optional[int] = None):
+    query = (
+        select(Message.id, Message.listing_id, Message.body, Message.created_at, User.email.label("sender_email"))
+        .join(User, Message.sender_id == User.id)
+        .filter(*criteria)
     )
+    if since_id is not None:
+        query = query.filter(Message.id > since_id)
+    return query.order_by(Message.created_at.asc(), Message.id.asc())
+
+def _position(message_id: int):
+    """``(created_at, id)`` of a message, for keyset comparisons."""
+    created_at = select(Message.created_at).where(Message.id == message_id).scalar_subquery()
+    return created_at, message_id
 
 @router.get("/listings/{lid}/messages", response_model=List[MessageOut])
-def list_messages(
+async def list_messages(
     lid: int,
-    user: User = Depends(subscription_required),
-    db: Session = Depends(get_db),
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    since_id: Optional[int] = None,
+    limit: int = DEFAULT_LIMIT,
+    user: Principal = Depends(subscription_required),
+    db: AsyncSession = Depends(get_db),
 ):
-    l = db.get(Listing, lid)
-    if not l:
+    """A page of a listing's messages, oldest first.
+
+    By default the latest ``limit`` messages. ``before_id`` pages back to
+    the ``limit`` messages before that one, ``after_id`` forward to the ones
+    after it. ``since_id`` keeps its old meaning for polling clients: the
+    first ``limit`` messages with an id above it, which need not exist.
+    """
+    if not await db.scalar(select(Listing.id).where(Listing.id == lid, visible_to(user))):
         raise HTTPException(status_code=404, detail="Not found")
-    rows = (
-        db.query(Message)
-        .filter(Message.listing_id == lid)
-        .order_by(Message.created_at.asc())
-        .all()
-    )
+    limit = clamp_limit(limit)
+    thread = message_rows(Message.listing_id == lid).order_by(None)
+    position = (Message.created_at, Message.id)
+    if since_id is not None and after_id is None:
+        query = message_rows(Message.listing_id == lid, since_id=since_id)
+        rows = (await db.execute(query.limit(limit))).all()
+    elif after_id is not None:
+        query = thread.filter(newer_than(*position, _position(after_id))).order_by(*position)
+        rows = (await db.execute(query.limit(limit))).all()
+    else:
+        if before_id is not None:
+            thread = thread.filter(older_than(*position, _position(before_id)))
+        query = thread.order_by(Message.created_at.desc(), Message.id.desc())
+        rows = (await db.execute(query.limit(limit))).all()[::-1]
     return [
         MessageOut(
             id=m.id,
             body=m.body,
             created_at=m.created_at,
-            sender_email=m.sender.email,
+            sender_email=m.sender_email,
         )
         for m in rows
     ]
 
+@router.post("/listings/{lid}/messages/read")
+async def mark_read(
+    lid: int,
+    user: Principal = Depends(subscription_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """Clear the caller's unread count for a listing."""
+    await db.execute(
+        update(UnreadCount).where(UnreadCount.user_id == user.id, UnreadCount.listing_id == lid).values(count=0)
+    )
+    await db.commit()
+    return {"ok": True}
+
+@router.get("/inbox", response_model=InboxOut)
+async def inbox(
+    limit: int = DEFAULT_LIMIT,
+    user: Principal = Depends(subscription_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """Unread counts on the caller's listings, most recently active first."""
+    total = await db.scalar(select(func.coalesce(func.sum(UnreadCount.count), 0)).where(UnreadCount.user_id == user.id))
+    rows = await db.execute(
+        select(UnreadCount.listing_id, Listing.title, UnreadCount.count, UnreadCount.last_message_id, UnreadCount.updated_at)
+        .join(Listing, Listing.id == UnreadCount.listing_id)
+        .where(UnreadCount.user_id == user.id)
+        .order_by(UnreadCount.updated_at.desc())
+        .limit(clamp_limit(limit))
+    )
+    threads = [
+        InboxThread(listing_id=r.listing_id, title=r.title, unread=r.count, last_message_id=r.last_message_id, updated_at=r.updated_at)
+        for r in rows
+    ]
+    return InboxOut(unread=total, threads=threads)
+
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+def sse_message(event: dict) -> str:
+    return f"id: {event['id']}\nevent: message\ndata: {json.dumps(event)}\n\n"
+
+async def message_stream(channel: str, criteria, since_id: Optional[int]):
+    """Server-Sent Events for ``channel``, first replaying rows after ``since_id``.
+
+    Subscribes before the replay query so nothing published in between is
+    lost; live events the replay already covered are skipped by id. The
+    replay uses its own short session so no connection is held while idle.
+    It stops after ``MAX_LIMIT`` rows with a ``more`` event; the client pages
+    the rest through ``GET /listings/{id}/messages?after_id=``.
+    """
+    async with pubsub.broker.subscribe(channel) as sub:
+        last_id = since_id or 0
+        if since_id is not None:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(message_rows(*criteria, since_id=since_id).limit(MAX_LIMIT + 1))).all()
+            for m in rows[:MAX_LIMIT]:
+                out = MessageOut(id=m.id, body=m.body, created_at=m.created_at, sender_email=m.sender_email)
+                yield sse_message({**out.model_dump(mode="json"), "listing_id": m.listing_id})
+                last_id = max(last_id, m.id)
+            if len(rows) > MAX_LIMIT:
+                yield f"event: more\ndata: {json.dumps({'after_id': rows[MAX_LIMIT - 1].id})}\n\n"
+        while True:
+            try:
+                event = await sub.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except pubsub.Lagged:
+                # Closing makes the client reconnect with Last-Event-ID and resync.
+                return
+            if event is None:
+                yield ": keepalive\n\n"
+            elif event["id"] > last_id:
+                yield sse_message(event)
+
+def sse_response(channel: str, criteria, since_id: Optional[int], request: Request) -> StreamingResponse:
+    if since_id is None and request.headers.get("last-event-id", "").isdigit():
+        since_id = int(request.headers["last-event-id"])
+    return StreamingResponse(
+        message_stream(channel, criteria, since_id),
+        media_type="text/event-stream",
+        headers={"cache-control": "no-cache", "x-accel-buffering": "no"},
+    )
+
+@router.get("/listings/{lid}/messages/stream")
+async def stream_listing_messages(
+    lid: int,
+    request: Request,
+    since_id: Optional[int] = None,
+    user: Principal = Depends(subscription_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """New messages on a listing as Server-Sent Events."""
+    if not await db.scalar(select(Listing.id).where(Listing.id == lid, visible_to(user))):
+        raise HTTPException(status_code=404, detail="Not found")
+    await db.close()
+    return sse_response(pubsub.listing_channel(lid), (Message.listing_id == lid,), since_id, request)
+
+@router.get("/inbox/stream")
+async def stream_inbox(
+    request: Request,
+    since_id: Optional[int] = None,
+    user: Principal = Depends(subscription_required),
+):
+    """Messages from other users on the caller's listings, as Server-Sent Events."""
+    criteria = (
+        Message.listing_id.in_(select(Listing.id).filter(Listing.owner_id == user.id)),
+        Message.sender_id != user.id,
+    )
+    return sse_response(pubsub.inbox_channel(user.id), criteria, since_id, request)
+
+MAX_ATTACHMENT_BYTES = 5 * 1024 * 1024
+
+UPLOAD_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "properties": {"file": {"type": "string", "format": "binary"}},
+        "required": ["file"],
+    }}},
+}
+
 @router.post(
     "/listings/{lid}/attachments",
     description="Upload an attachment. Allowed types: PDF, JPEG, PNG. Max size: 5MB.",
+    openapi_extra={"requestBody": UPLOAD_BODY},
 )
-def upload_attachment(
+async def upload_attachment(
     lid: int,
-    file: UploadFile = File(...),
-    user: User = Depends(subscription_required),
-    db: Session = Depends(get_db),
+    request: Request,
+    user: Principal = Depends(subscription_required),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Upload a file attachment to a listing.
+    """Upload a file attachment to a listing as the ``file`` form field.
 
-    Allowed content types: ``application/pdf``, ``image/jpeg``, ``image/png``.
-    Maximum file size: 5 MB.
+    Allowed types: PDF, JPEG, PNG, recognised by their leading bytes rather
+    than the declared ``content_type``. Maximum file size: 5 MB. The part is
+    hashed into the store as it arrives, without spooling the body first.
     """
 
-    l = db.get(Listing, lid)
-    if not l:
+    if not await db.get(Listing, lid):
         raise HTTPException(status_code=404, detail="Not found")
+    # Release the connection before reading the body.
+    await db.commit()
 
-    allowed_types = {"application/pdf", "image/jpeg", "image/png"}
-    if file.content_type not in allowed_types:
+    upload = storage.MultipartFile(request)
+    try:
+        blob = await storage.store.put(upload.chunks(), MAX_ATTACHMENT_BYTES)
+    except storage.BadUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except storage.UnsupportedType:
         raise HTTPException(status_code=400, detail="Unsupported file type")
-
-    file.file.seek(0, os.SEEK_END)
-    size = file.file.tell()
-    file.file.seek(0)
-    if size > 5 * 1024 * 1024:
+    except storage.TooLarge:
         raise HTTPException(status_code=400, detail="File too large")
 
-    os.makedirs("uploads", exist_ok=True)
-    dest = os.path.join("uploads", f"{lid}_{file.filename}")
-    with open(dest, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-    return {"ok": True, "path": dest}
+    a = Attachment(
+        listing_id=lid,
+        uploader_id=user.id,
+        sha256=blob.sha256,
+        size=blob.size,
+        content_type=blob.content_type,
+        filename=os.path.basename(upload.filename or "")[:255],
+    )
+    db.add(a)
+    await db.flush()
+    out = {
+        "ok": True,
+        "id": a.id,
+        "sha256": blob.sha256,
+        "size": blob.size,
+        "content_type": blob.content_type,
+        "path": f"/listings/{lid}/attachments/{a.id}",
+    }
+    await db.commit()
+    return out
+
+@router.get("/listings/{lid}/attachments/{aid}")
+async def download_attachment(
+    lid: int,
+    aid: int,
+    request: Request,
+    user: Principal = Depends(subscription_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """Download an attachment of a published listing, or of the caller's own;
+    supports single ``Range`` requests and ``If-None-Match``."""
+    a = await db.scalar(
+        select(Attachment)
+        .join(Listing, Listing.id == Attachment.listing_id)
+        .filter(Attachment.id == aid, Attachment.listing_id == lid, visible_to(user))
+    )
+    if not a:
+        raise HTTPException(status_code=404, detail="Not found")
+    # Content-addressed, so the hash is a strong validator.
+    headers = {"etag": f'"{a.sha256}"', "accept-ranges": "bytes", "cache-control": "private, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") in (headers["etag"], "*"):
+        return Response(status_code=304, headers=headers)
+    path = storage.store.path_for(a.sha256)
+    try:
+        stat = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Not found")
+    kwargs = dict(media_type=a.content_type, filename=a.filename or None, headers=headers, stat_result=stat)
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", headers["etag"]) == headers["etag"]:
+        try:
+            byte_range = storage.parse_range(range_header, a.size)
+        except ValueError:
+            raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"content-range": f"bytes */{a.size}"})
+        if byte_range:
+            return storage.FileRangeResponse(path, *byte_range, a.size, **kwargs)
+    return FileResponse(path, **kwargs)
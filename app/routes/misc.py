@@ -1,16 +1,31 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
 
+from .. import facets, httpcache, metrics
+from ..auth import Principal, admin_required, principals
+from ..db import get_db
+
 router = APIRouter()
 
 @router.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 @router.get("/version")
-def version():
+async def version():
     return {"name": "FalconTrade API", "version": "v1.0", "deployed_at": datetime.now(timezone.utc).isoformat()}
 
 @router.get("/categories")
-def categories():
-    return ["fertilizer","grain","oils","textiles","panels","poultry","fruits","metals"]
+async def categories(db: AsyncSession = Depends(get_db)):
+    """Categories in use on the market, most listed first; a default set until there are any."""
+    return await facets.categories(db) or facets.DEFAULT_CATEGORIES
+
+@router.get("/admin/cache")
+async def cache_stats(admin: Principal = Depends(admin_required)):
+    return {"responses": httpcache.responses.stats(), "principals": principals.stats()}
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
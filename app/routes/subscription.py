@@ -1,65 +1,76 @@
 import os
-import stripe
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from ..auth import get_current_user
+from .. import billing
+from ..auth import Principal, get_current_user, invalidate_user
 from ..db import get_db
 from ..models import User
 
-stripe.api_key = os.getenv("STRIPE_API_KEY", "")
-
 router = APIRouter()
 
+def stripe_client():
+    try:
+        return billing.client()
+    except billing.NotConfigured:
+        raise HTTPException(status_code=500, detail="Stripe not configured")
+
 class SubscribeRequest(BaseModel):
     price_id: str
 
 @router.get("/pricing")
-def pricing():
-    if not stripe.api_key:
+async def pricing(db: AsyncSession = Depends(get_db)):
+    plans = await billing.plans(db)
+    if not plans and not billing.STRIPE_API_KEY:
         raise HTTPException(status_code=500, detail="Stripe not configured")
-    prices = stripe.Price.list(active=True, expand=["data.product"])
-    plans = []
-    for p in prices.data:
-        name = p.product["name"] if isinstance(p.product, dict) else p.get("nickname")
-        plans.append({
-            "id": p.id,
-            "name": name,
-            "currency": p.currency,
-            "amount": p.unit_amount,
-        })
     return {"plans": plans}
 
 @router.post("/subscribe")
-def subscribe(data: SubscribeRequest, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if not stripe.api_key:
-        raise HTTPException(status_code=500, detail="Stripe not configured")
+async def subscribe(data: SubscribeRequest, principal: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Start a Stripe Checkout session. The subscription becomes active when
+    Stripe confirms it through the webhook, not here."""
+    stripe = stripe_client()
+    user = await db.get(User, principal.id)
     if not user.stripe_customer_id:
-        customer = stripe.Customer.create(email=user.email)
+        customer = await billing.call("customer.create", stripe.customers.create_async, {"email": user.email})
         user.stripe_customer_id = customer.id
-    session = stripe.checkout.Session.create(
-        customer=user.stripe_customer_id,
-        line_items=[{"price": data.price_id, "quantity": 1}],
-        mode="subscription",
-        success_url=os.getenv("STRIPE_SUCCESS_URL", "http://localhost:3000/dashboard"),
-        cancel_url=os.getenv("STRIPE_CANCEL_URL", "http://localhost:3000/pricing"),
-    )
-    user.subscription_status = "active"
-    db.add(user)
-    db.commit()
+        await db.commit()
+        invalidate_user(user.email)
+    session = await billing.call("checkout.session.create", stripe.checkout.sessions.create_async, {
+        "customer": user.stripe_customer_id,
+        "client_reference_id": str(user.id),
+        "line_items": [{"price": data.price_id, "quantity": 1}],
+        "mode": "subscription",
+        "success_url": os.getenv("STRIPE_SUCCESS_URL", "http://localhost:3000/dashboard"),
+        "cancel_url": os.getenv("STRIPE_CANCEL_URL", "http://localhost:3000/pricing"),
+    })
     return {"checkout_url": session.url}
 
 @router.post("/cancel")
-def cancel(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if not stripe.api_key:
-        raise HTTPException(status_code=500, detail="Stripe not configured")
-    if not user.stripe_customer_id:
+async def cancel(principal: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Open the Stripe billing portal; cancellations arrive through the webhook."""
+    stripe = stripe_client()
+    if not principal.stripe_customer_id:
         raise HTTPException(status_code=400, detail="No Stripe customer")
-    session = stripe.billing_portal.Session.create(
-        customer=user.stripe_customer_id,
-        return_url=os.getenv("STRIPE_RETURN_URL", "http://localhost:3000/dashboard"),
-    )
-    user.subscription_status = "inactive"
-    db.add(user)
-    db.commit()
+    session = await billing.call("billing_portal.session.create", stripe.billing_portal.sessions.create_async, {
+        "customer": principal.stripe_customer_id,
+        "return_url": os.getenv("STRIPE_RETURN_URL", "http://localhost:3000/dashboard"),
+    })
     return {"url": session.url}
+
+@router.post("/stripe/webhook", include_in_schema=False)
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_db)):
+    payload = await request.body()
+    try:
+        event = billing.verify_event(payload, request.headers.get("stripe-signature", ""))
+    except billing.NotConfigured:
+        raise HTTPException(status_code=500, detail="Stripe webhook not configured")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid signature")
+    email = await billing.handle_event(db, event)
+    await db.commit()
+    if email:
+        invalidate_user(email)
+    if event["type"].startswith(("price.", "product.")):
+        billing.pricing_cache.clear()
+    return {"received": True}
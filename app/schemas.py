@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field, field_validator
-from typing import Dict, Any
+from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime
 import re
 
@@ -47,6 +47,9 @@ class ListingOut(ListingBase):
     class Config:
         from_attributes = True
 
+class MatchOut(ListingOut):
+    score: float
+
 class MessageIn(BaseModel):
     body: str
 
@@ -57,3 +60,33 @@ class MessageOut(BaseModel):
     sender_email: EmailStr
     class Config:
         from_attributes = True
+
+class InboxThread(BaseModel):
+    listing_id: int
+    title: str
+    unread: int
+    last_message_id: Optional[int] = None
+    updated_at: datetime
+
+class InboxOut(BaseModel):
+    unread: int
+    threads: List[InboxThread]
+
+class ModerationFilter(BaseModel):
+    type: Optional[str] = None
+    category: Optional[str] = None
+    country: Optional[str] = None
+    owner_email: Optional[str] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+class ModerationIn(BaseModel):
+    action: Literal["publish", "reject"]
+    ids: Optional[List[int]] = Field(default=None, max_length=10000)
+    filter: Optional[ModerationFilter] = None
+    reason: Optional[str] = Field(default=None, max_length=1000)
+
+class ModerationOut(BaseModel):
+    action: str
+    count: int
+    ids: List[int]
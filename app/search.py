@@ -0,0 +1,294 @@
+"""Full-text search over listings.
+
+Three interchangeable backends sit behind the same two calls:
+
+* ``fts5``     - SQLite FTS5 virtual table ``listings_fts`` ranked with bm25.
+* ``postgres`` - ``listing_search`` table with a weighted tsvector and GIN index.
+* ``python``   - in-process inverted index, used when neither is available.
+  It lives in one process, so it suits a single ``uvicorn`` worker only.
+
+``index_listings`` keeps the index in sync and ``apply`` narrows a listing
+query to the matches, ranked best first. Every query token is matched as a
+prefix and all tokens must match.
+"""
+import json
+import math
+import os
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from sqlalchemy import Float, Integer, event, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .models import Listing
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+MAX_QUERY_TOKENS = 8
+
+# Relative weight of each indexed field: title, category, location, details.
+FIELDS = ("title", "category", "location", "details")
+WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+backend: Optional[str] = None
+_dialect: Optional[str] = None
+
+
+def tokenize(value: str) -> list[str]:
+    return _TOKEN_RE.findall(value.lower())
+
+
+def _flatten(value) -> Iterable[str]:
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield str(k)
+            yield from _flatten(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _flatten(v)
+    elif value is not None:
+        yield str(value)
+
+
+def document(l: Listing) -> tuple[str, str, str, str]:
+    """The text indexed for a listing, one string per entry in ``FIELDS``."""
+    return (
+        l.title or "",
+        l.category or "",
+        " ".join(p for p in (l.country, l.city) if p),
+        " ".join(_flatten(l.details or {})),
+    )
+
+
+class InvertedIndex:
+    """Per-process postings lists with a sorted vocabulary for prefix lookups."""
+
+    def __init__(self):
+        self.postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self.docs: dict[int, set[str]] = {}
+        self._vocab: Optional[list[str]] = None
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc_id: int, fields: tuple[str, ...]):
+        self.remove(doc_id)
+        terms: dict[str, float] = defaultdict(float)
+        for field, weight in zip(fields, WEIGHTS):
+            for tok in tokenize(field):
+                terms[tok] += weight
+        for tok, score in terms.items():
+            if tok not in self.postings:
+                self._vocab = None
+            self.postings[tok][doc_id] = score
+        self.docs[doc_id] = set(terms)
+
+    def remove(self, doc_id: int):
+        for tok in self.docs.pop(doc_id, ()):
+            postings = self.postings[tok]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[tok]
+                self._vocab = None
+
+    def _expand(self, prefix: str) -> list[str]:
+        if self._vocab is None:
+            self._vocab = sorted(self.postings)
+        i = bisect_left(self._vocab, prefix)
+        out = []
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            out.append(self._vocab[i])
+            i += 1
+        return out
+
+    def search(self, tokens: list[str]) -> dict[int, float]:
+        """Score of every document matching all ``tokens``."""
+        total = max(len(self.docs), 1)
+        scores: Optional[dict[int, float]] = None
+        for tok in tokens:
+            hits: dict[int, float] = defaultdict(float)
+            for term in self._expand(tok):
+                postings = self.postings[term]
+                idf = math.log(1 + total / len(postings))
+                for doc_id, tf in postings.items():
+                    hits[doc_id] += tf * idf
+            if scores is None:
+                scores = hits
+            else:
+                scores = {d: s + hits[d] for d, s in scores.items() if d in hits}
+            if not scores:
+                return {}
+        return scores or {}
+
+
+_memory_index: Optional[InvertedIndex] = None
+
+
+def _detect(engine: Engine) -> str:
+    if SEARCH_BACKEND != "auto":
+        return SEARCH_BACKEND
+    if engine.dialect.name == "postgresql":
+        return "postgres"
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            opts = {r[0] for r in conn.exec_driver_sql("PRAGMA compile_options")}
+        if "ENABLE_FTS5" in opts:
+            return "fts5"
+    return "python"
+
+
+def init(engine: Engine):
+    """Pick a backend, create its storage and backfill it if it is empty."""
+    global backend, _dialect, _memory_index
+    backend = _detect(engine)
+    _dialect = engine.dialect.name
+    if backend == "python":
+        if _dialect not in _MEMORY_HITS:
+            raise RuntimeError(f"SEARCH_BACKEND=python is not supported on {_dialect}")
+        _memory_index = None
+        return
+    with engine.begin() as conn:
+        if backend == "fts5":
+            conn.exec_driver_sql(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts "
+                f"USING fts5({', '.join(FIELDS)}, tokenize='unicode61')"
+            )
+            empty = conn.exec_driver_sql("SELECT 1 FROM listings_fts LIMIT 1").first() is None
+        else:
+            conn.exec_driver_sql(
+                "CREATE TABLE IF NOT EXISTS listing_search ("
+                "listing_id INTEGER PRIMARY KEY REFERENCES listings(id) ON DELETE CASCADE, "
+                "document TSVECTOR NOT NULL)"
+            )
+            conn.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS ix_listing_search_document "
+                "ON listing_search USING gin(document)"
+            )
+            empty = conn.exec_driver_sql("SELECT 1 FROM listing_search LIMIT 1").first() is None
+    if empty:
+        with Session(engine) as db:
+            reindex_all(db)
+            db.commit()
+
+
+def _ensure_memory_index(db: Session) -> InvertedIndex:
+    global _memory_index
+    if _memory_index is None:
+        _memory_index = InvertedIndex()
+        for l in db.execute(select(Listing).execution_options(yield_per=1000)).scalars():
+            _memory_index.add(l.id, document(l))
+    return _memory_index
+
+
+_FTS5_UPSERT = text(
+    "INSERT INTO listings_fts(rowid, title, category, location, details) "
+    "VALUES (:id, :title, :category, :location, :details)"
+)
+_PG_UPSERT = text(
+    "INSERT INTO listing_search(listing_id, document) VALUES (:id, "
+    "setweight(to_tsvector('simple', :title), 'A') || "
+    "setweight(to_tsvector('simple', :category), 'B') || "
+    "setweight(to_tsvector('simple', :location), 'C') || "
+    "setweight(to_tsvector('simple', :details), 'D')) "
+    "ON CONFLICT (listing_id) DO UPDATE SET document = EXCLUDED.document"
+)
+
+
+def index_listings(db: Session, listings: Iterable[Listing]):
+    """Add or refresh listings in the index as part of the caller's transaction.
+
+    The in-process index cannot roll back, so its changes wait for the commit.
+    """
+    rows = [dict(zip(("id",) + FIELDS, (l.id,) + document(l))) for l in listings]
+    if not rows:
+        return
+    if backend == "fts5":
+        db.execute(text("DELETE FROM listings_fts WHERE rowid = :id"), [{"id": r["id"]} for r in rows])
+        db.execute(_FTS5_UPSERT, rows)
+    elif backend == "postgres":
+        db.execute(_PG_UPSERT, rows)
+    elif _memory_index is not None:
+        db.info.setdefault("search_pending", []).extend(rows)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(db: Session):
+    rows = db.info.pop("search_pending", ())
+    if _memory_index is not None:
+        for r in rows:
+            _memory_index.add(r["id"], tuple(r[f] for f in FIELDS))
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(db: Session):
+    db.info.pop("search_pending", None)
+
+
+def reindex_all(db: Session, batch_size: int = 1000):
+    batch = []
+    for l in db.execute(select(Listing).execution_options(yield_per=batch_size)).scalars():
+        batch.append(l)
+        if len(batch) >= batch_size:
+            index_listings(db, batch)
+            batch = []
+    index_listings(db, batch)
+
+
+# Python backend: every hit and its score arrive as one JSON parameter, so the
+# statement stays the same size however many listings match.
+_MEMORY_HITS = {
+    "sqlite": "SELECT CAST(key AS INTEGER) AS listing_id, value AS rank FROM json_each(:hits)",
+    "postgresql": "SELECT key::integer AS listing_id, value::float AS rank FROM json_each_text(CAST(:hits AS json))",
+}
+
+
+def apply(db: Session, query, q: str, ranked: bool = True):
+    """Restrict ``query`` to listings matching every token of ``q``.
+
+    ``query`` is any ``Select``/``Query`` over ``Listing``; with ``ranked``
+    the best matches are ordered first. Returns ``None`` when ``q`` holds no
+    searchable tokens or nothing can match.
+    """
+    tokens = tokenize(q)[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return None
+    if backend == "fts5":
+        weights = ", ".join(str(w) for w in WEIGHTS)
+        hits = (
+            text(
+                f"SELECT rowid AS listing_id, bm25(listings_fts, {weights}) AS rank "
+                "FROM listings_fts WHERE listings_fts MATCH :q"
+            )
+            .bindparams(q=" ".join(f'"{t}"*' for t in tokens))
+            .columns(listing_id=Integer, rank=Float)
+            .subquery("search_hits")
+        )
+    elif backend == "postgres":
+        hits = (
+            text(
+                "SELECT listing_id, -ts_rank(document, to_tsquery('simple', :q)) AS rank "
+                "FROM listing_search WHERE document @@ to_tsquery('simple', :q)"
+            )
+            .bindparams(q=" & ".join(f"{t}:*" for t in tokens))
+            .columns(listing_id=Integer, rank=Float)
+            .subquery("search_hits")
+        )
+    else:
+        scores = _ensure_memory_index(db).search(tokens)
+        if not scores:
+            return None
+        hits = (
+            text(_MEMORY_HITS[_dialect])
+            .bindparams(hits=json.dumps({doc_id: -score for doc_id, score in scores.items()}))
+            .columns(listing_id=Integer, rank=Float)
+            .subquery("search_hits")
+        )
+        if not ranked:
+            # A JSON table has no index to probe, so look hits up from a set.
+            return query.filter(Listing.id.in_(select(hits.c.listing_id)))
+    query = query.join(hits, hits.c.listing_id == Listing.id)
+    return query.order_by(hits.c.rank) if ranked else query
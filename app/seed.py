@@ -1,8 +1,10 @@
 import os
 from sqlalchemy.orm import Session
 from .db import SessionLocal
+from sqlalchemy import select
 from .models import User, Listing, ListingType
 from .auth import hash_password
+from . import attributes, facets, search
 
 def run():
     db: Session = SessionLocal()
@@ -20,10 +22,16 @@ def run():
             user = User(email=user_email, hashed_password=hash_password("Demo123!"), is_admin=False)
             db.add(user); db.commit(); db.refresh(user)
 
+        if db.scalar(select(Listing.id).filter(Listing.owner_id == user.id).limit(1)) is not None:
+            print("Sample data already present.")
+            return
+
         def add_listing(type_, category, title, country, details, qty="100 MT", incoterm="CIF", city=""):
             l = Listing(type=ListingType(type_), category=category, title=title, details=details,
-                        quantity=qty, incoterm=incoterm, country=country, city=city, status="published", owner_id=user.id)
+                        quantity=qty, incoterm=incoterm, country=country, city=city, status="published", owner_id=user.id,
+                        **attributes.quantity_columns(qty))
             db.add(l)
+            return l
 
         items = [
             ("RFQ","grain","Wheat grade A, 12.5% protein","Azerbaijan", {"protein":"12.5%","moisture":"12%","pack":"bulk"}),
@@ -37,9 +45,11 @@ def run():
             ("RFQ","panels","Sandwich panels, 50mm PIR","Georgia", {"thickness":"50mm","rating":"PIR","color":"ral9002"}),
             ("OFFER","poultry","Fresh eggs, size M, halal","Turkey", {"grade":"M","pack":"30-tray carton","halal":True}),
         ]
-        for it in items:
-            add_listing(*it)
-
+        listings = [add_listing(*it) for it in items]
+        db.flush()
+        search.index_listings(db, listings)
+        attributes.record(db, listings)
+        facets.record(db, listings)
         db.commit()
         print("Seeded admin, demo user, and 10 listings.")
     finally:
@@ -0,0 +1,258 @@
+"""Content-addressed file storage for listing attachments.
+
+Blobs live at ``<root>/<sha[:2]>/<sha[2:4]>/<sha>``. Uploads are read off the
+connection (``MultipartFile``), hashed while they stream into a temp file
+under ``<root>/tmp`` and then renamed into place,
+so a path either holds a complete blob or nothing; identical uploads share
+one blob.
+"""
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+import anyio
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+UPLOAD_ROOT = os.getenv("UPLOAD_ROOT", "uploads")
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of each accepted format; the client's content_type is ignored.
+MAGIC = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+)
+SNIFF_BYTES = max(len(m) for m, _ in MAGIC)
+
+
+class UnsupportedType(Exception):
+    pass
+
+
+class TooLarge(Exception):
+    pass
+
+
+class BadUpload(Exception):
+    pass
+
+
+def sniff(head: bytes) -> Optional[str]:
+    for magic, mime in MAGIC:
+        if head.startswith(magic):
+            return mime
+    return None
+
+
+@dataclass
+class Blob:
+    sha256: str
+    size: int
+    content_type: str
+    path: str
+
+
+class ContentStore:
+    def __init__(self, root: str = UPLOAD_ROOT):
+        self.root = root
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    async def put(self, chunks: AsyncIterator[bytes], max_size: int) -> Blob:
+        """Stream ``chunks`` into the store, rejecting the upload as soon as it
+        exceeds ``max_size`` or its first bytes are not an accepted format."""
+        tmp_dir = os.path.join(self.root, "tmp")
+        await run_in_threadpool(os.makedirs, tmp_dir, exist_ok=True)
+        tmp = os.path.join(tmp_dir, uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size, head, content_type = 0, b"", None
+        try:
+            async with await anyio.open_file(tmp, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_size:
+                        raise TooLarge()
+                    if content_type is None:
+                        head += chunk
+                        if len(head) >= SNIFF_BYTES:
+                            content_type = sniff(head)
+                            if content_type is None:
+                                raise UnsupportedType()
+                    digest.update(chunk)
+                    await f.write(chunk)
+                if content_type is None:
+                    content_type = sniff(head)
+                    if content_type is None:
+                        raise UnsupportedType()
+                await f.flush()
+                await run_in_threadpool(os.fsync, f.wrapped.fileno())
+            sha256 = digest.hexdigest()
+            dest = self.path_for(sha256)
+            await run_in_threadpool(_move_into_place, tmp, dest)
+            return Blob(sha256, size, content_type, dest)
+        except BaseException:
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(_discard, tmp)
+            raise
+
+
+def _move_into_place(tmp: str, dest: str):
+    if os.path.exists(dest):
+        os.unlink(tmp)
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(tmp, dest)
+
+
+def _discard(path: str):
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+store = ContentStore()
+
+
+class MultipartFile:
+    """The ``field`` part of a ``multipart/form-data`` request, read straight
+    off the connection: Starlette's form parsing would first spool the whole
+    body to a temp file, and ``put`` would then copy it again."""
+
+    def __init__(self, request: Request, field: str = "file"):
+        self.request = request
+        self.field = field.encode()
+        self.filename: Optional[str] = None
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """The part's bytes as they arrive; ``BadUpload`` if the body is not
+        multipart or has no such part."""
+        mime, options = parse_options_header(self.request.headers.get("content-type", ""))
+        if mime != b"multipart/form-data" or not options.get(b"boundary"):
+            raise BadUpload("Expected a multipart/form-data body")
+        found, ours, complete = False, False, False
+        header, value, headers, out = b"", b"", {}, []
+
+        def on_part_begin():
+            nonlocal ours
+            ours = False
+            headers.clear()
+
+        def on_header_field(data, start, end):
+            nonlocal header
+            header += data[start:end]
+
+        def on_header_value(data, start, end):
+            nonlocal value
+            value += data[start:end]
+
+        def on_header_end():
+            nonlocal header, value
+            headers[header.lower()] = value
+            header, value = b"", b""
+
+        def on_headers_finished():
+            nonlocal found, ours
+            _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+            if disposition.get(b"name") == self.field and not found:
+                found = ours = True
+                self.filename = disposition.get(b"filename", b"").decode("utf-8", "replace")
+
+        def on_part_data(data, start, end):
+            if ours:
+                out.append(data[start:end])
+
+        def on_part_end():
+            nonlocal complete
+            complete = complete or ours
+
+        parser = MultipartParser(options[b"boundary"], {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        })
+        async for chunk in self.request.stream():
+            try:
+                parser.write(chunk)
+            except MultipartParseError:
+                raise BadUpload("Malformed multipart body")
+            for piece in out:
+                yield piece
+            out.clear()
+        parser.finalize()
+        if not found:
+            raise BadUpload(f"Missing {self.field.decode()!r} part")
+        if not complete:
+            raise BadUpload("Truncated multipart body")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """``(start, end)`` inclusive for a single ``bytes=`` range.
+
+    ``None`` means serve the whole file: no header, a multi-range request or
+    one that does not parse, which RFC 9110 says to ignore. ``ValueError``
+    means a valid range the file cannot satisfy (416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    if not (first or last) or not all(p.isdigit() for p in (first, last) if p):
+        return None
+    if not first:
+        if int(last) == 0:
+            raise ValueError(header)
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+class FileRangeResponse(FileResponse):
+    """``206`` response for one byte range of a file.
+
+    Uses the ASGI ``http.response.zerocopy`` extension (sendfile) when the
+    server offers it and falls back to chunked reads otherwise. Whole-file
+    responses should use ``FileResponse``, which already hands the path to
+    servers supporting ``http.response.pathsend``.
+    """
+
+    def __init__(self, path: str, start: int, end: int, size: int, **kwargs):
+        if kwargs.get("stat_result") is None:
+            kwargs["stat_result"] = os.stat(path)
+        super().__init__(path, status_code=206, **kwargs)
+        self.start, self.end = start, end
+        self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({"type": "http.response.zerocopy", "file": f, "offset": self.start, "count": count})
+        else:
+            async with await anyio.open_file(self.path, "rb") as f:
+                await f.seek(self.start)
+                while count > 0:
+                    chunk = await f.read(min(self.chunk_size, count))
+                    count -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": count > 0 and bool(chunk)})
+                    if not chunk:
+                        break
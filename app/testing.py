@@ -0,0 +1,48 @@
+"""Helpers for tests that guard against query-count regressions (N+1)."""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(*engines: Engine):
+    """Record every statement the engines send to the database inside the block.
+
+    Accepts sync or async engines; with ``SQLITE_TUNING`` pass both
+    ``async_engine`` and ``async_read_engine``.
+
+        with count_queries(async_engine) as queries:
+            client.get("/market")
+        assert queries.count == 1, queries.statements
+    """
+    engines = {getattr(e, "sync_engine", e) for e in engines}
+    counter = QueryCounter()
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", counter)
+
+
+@contextmanager
+def assert_max_queries(*engines: Engine, limit: int):
+    with count_queries(*engines) as counter:
+        yield counter
+    assert counter.count <= limit, (
+        f"expected at most {limit} queries, got {counter.count}:\n" + "\n".join(counter.statements)
+    )
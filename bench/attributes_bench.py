@@ -0,0 +1,104 @@
+"""Quantity and spec range filters: indexed attributes vs. scanning JSON.
+
+    python -m bench.attributes_bench --listings 1000000
+
+Loads ``--listings`` published listings, then for each filter times the
+first /market page and a count of all matches, answered from the parsed
+columns and ``listing_attributes`` vs. the same condition over
+``json_extract(details)`` and the ``quantity`` text. Also reports backfill
+throughput.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from . import common
+
+from sqlalchemy import Float, cast, func, select
+
+from app import attributes
+from app.db import AsyncSessionLocal, async_engine, engine
+from app.models import Listing
+from app.routes.listings import market_query
+
+FILTERS = [
+    # Selective: a few hundred to a couple of thousand matches per million.
+    {"attrs": ["gsm>=300"]},
+    {"attrs": ["thickness=150", "protein>=100"]},
+    {"unit": "MT", "min_qty": 4995},
+    # Broad: tens of thousands and more.
+    {"attrs": ["protein>=150"]},
+    {"attrs": ["gsm>=150", "thickness<=20"]},
+    {"unit": "MT", "min_qty": 1000, "max_qty": 2000, "attrs": ["moisture<50"]},
+]
+
+
+def json_conditions(f: dict) -> list:
+    """The same filter without the parsed columns: what /market would have to run."""
+    conds = []
+    for name, op, value in (attributes.parse_filter(a) for a in f.get("attrs", ())):
+        conds.append(attributes.OPS[op](cast(func.json_extract(Listing.details, f"$.{name}"), Float), value))
+    qty = cast(Listing.quantity, Float)
+    if f.get("unit"):
+        conds.append(Listing.quantity.like(f"% {f['unit']}"))
+    if f.get("min_qty") is not None:
+        conds.append(qty >= f["min_qty"])
+    if f.get("max_qty") is not None:
+        conds.append(qty <= f["max_qty"])
+    return conds
+
+
+async def indexed(db, f: dict):
+    attrs = tuple(attributes.parse_filter(a) for a in f.get("attrs", ()))
+    kwargs = {k: v for k, v in f.items() if k != "attrs"}
+    return await market_query(db, attrs=attrs, **kwargs)
+
+
+async def scanned(db, f: dict):
+    return (await market_query(db)).filter(*json_conditions(f))
+
+
+async def timed(fn, repeat: int):
+    samples, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return common.summarize(samples), result
+
+
+async def run(args):
+    async with AsyncSessionLocal() as db:
+        for f in FILTERS:
+            row = {"filter": f}
+            for name, build in (("indexed", indexed), ("json_scan", scanned)):
+
+                async def page():
+                    query = await build(db, f)
+                    return await db.execute(query.order_by(Listing.created_at.desc(), Listing.id.desc()).limit(50))
+
+                async def count():
+                    return await db.scalar(select(func.count()).select_from((await build(db, f)).subquery()))
+
+                row[f"{name}_page"], _ = await timed(page, args.repeat)
+                row[f"{name}_count"], row[f"{name}_matches"] = await timed(count, max(1, args.repeat // 5))
+            print(json.dumps(row), flush=True)
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    common.populate(args.listings)
+    asyncio.run(run(args))
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        n = attributes.backfill(conn)
+    print(json.dumps({"backfill_rows": n, "rows_per_s": round(n / (time.perf_counter() - t0))}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
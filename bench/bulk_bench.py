@@ -0,0 +1,76 @@
+"""Bulk import and NDJSON export throughput.
+
+    python -m bench.bulk_bench --rows 50000 --single 500
+
+Imports ``--rows`` listings through ``POST /listings/bulk`` as one streamed
+NDJSON body. The baseline is ``--single`` one-at-a-time ``POST /listings``
+calls. Everything is then published and read back through
+``GET /market/export``, reporting rows/sec and server RSS before and after
+the export.
+"""
+import argparse
+import json
+import time
+
+from . import common
+
+import httpx
+
+
+def ndjson(n: int, seed: int):
+    for row in common.listing_rows(n, owner_id=0, seed=seed):
+        data = {k: row[k] for k in ("category", "title", "details", "quantity", "incoterm", "country", "city")}
+        yield (json.dumps({"type": row["type"].value, **data}) + "\n").encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--single", type=int, default=500)
+    args = parser.parse_args()
+
+    from sqlalchemy import update
+
+    from app.auth import create_access_token
+    from app.db import engine
+    from app.models import Listing, User
+
+    owner_id = common.populate(0)
+    with engine.begin() as conn:
+        conn.execute(update(User).where(User.id == owner_id).values(subscription_status="active"))
+    headers = {"Authorization": f"Bearer {create_access_token('bench0@falcontrade.org')}"}
+
+    with common.serve() as url, httpx.Client(base_url=url, headers=headers, timeout=600) as client:
+        t0 = time.perf_counter()
+        for line in ndjson(args.single, seed=1):
+            client.post("/listings", content=line, headers={"Content-Type": "application/json"}).raise_for_status()
+        single = time.perf_counter() - t0
+        print(json.dumps({"import": "single", "rows": args.single, "rows_per_s": round(args.single / single, 1)}), flush=True)
+
+        t0 = time.perf_counter()
+        r = client.post("/listings/bulk", content=ndjson(args.rows, seed=2), headers={"Content-Type": "application/x-ndjson"})
+        r.raise_for_status()
+        elapsed = time.perf_counter() - t0
+        report = r.json()
+        print(json.dumps({
+            "import": "bulk", "rows": report["inserted"], "failed": report["failed"],
+            "rows_per_s": round(report["inserted"] / elapsed, 1),
+        }), flush=True)
+
+        with engine.begin() as conn:
+            conn.execute(update(Listing).values(status="published"))
+        rss_before = common.rss_kb(url.pid)
+        t0 = time.perf_counter()
+        n = 0
+        with client.stream("GET", "/market/export") as r:
+            for _ in r.iter_lines():
+                n += 1
+        elapsed = time.perf_counter() - t0
+        print(json.dumps({
+            "export": n, "rows_per_s": round(n / elapsed, 1),
+            "rss_kb_before": rss_before, "rss_kb_after": common.rss_kb(url.pid),
+        }), flush=True)
+
+
+if __name__ == "__main__":
+    main()
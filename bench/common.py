@@ -0,0 +1,168 @@
+"""Shared helpers for the scripts in ``bench/``.
+
+Import this module before anything from ``app``: it points ``DATABASE_URL``
+at a throwaway SQLite file (unless one is already set) and turns off the
+sample seed so the benchmarks control exactly what is in the database.
+"""
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+if "DATABASE_URL" not in os.environ:
+    _tmp = tempfile.mkdtemp(prefix="falcontrade-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/bench.db"
+os.environ.setdefault("SEED_SAMPLE", "0")
+
+CATEGORIES = ["fertilizer", "grain", "oils", "textiles", "panels", "poultry", "fruits", "metals"]
+COUNTRIES = ["Azerbaijan", "Kazakhstan", "UAE", "Turkey", "China", "Georgia", "India", "Brazil"]
+INCOTERMS = ["CIF", "FOB", "EXW", "DAP", "CFR"]
+WORDS = [
+    "wheat", "corn", "urea", "granular", "refined", "sunflower", "palm", "olein", "cotton",
+    "silk", "fabric", "sandwich", "panel", "eggs", "halal", "steel", "copper", "apples",
+    "grade", "bulk", "bags", "drums", "premium", "organic", "monthly", "spot", "contract",
+]
+DETAIL_KEYS = ["protein", "moisture", "pack", "gsm", "thickness", "npk", "grade", "color"]
+
+
+def listing_rows(n: int, owner_id: int, seed: int = 0, status: str = "published"):
+    """Yield ``n`` plausible listing rows as dicts ready for ``insert(Listing)``."""
+    from app.models import ListingType
+
+    rnd = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(n):
+        details = {k: f"{rnd.randint(1, 300)}{rnd.choice(['%', 'mm', '', ' bags'])}"
+                   for k in rnd.sample(DETAIL_KEYS, 3)}
+        yield {
+            "type": rnd.choice([ListingType.RFQ, ListingType.OFFER]),
+            "category": rnd.choice(CATEGORIES),
+            "title": " ".join(rnd.sample(WORDS, 4)),
+            "details": details,
+            "quantity": f"{rnd.randint(1, 500) * 10} MT",
+            "incoterm": rnd.choice(INCOTERMS),
+            "country": rnd.choice(COUNTRIES),
+            "city": "",
+            "status": status,
+            "created_at": start + timedelta(seconds=i * 7),
+            "owner_id": owner_id,
+        }
+
+
+def populate(n: int, batch_size: int = 10_000, seed: int = 0) -> int:
+    """Create the schema plus one owner and ``n`` listings; returns the owner id."""
+    from sqlalchemy import insert
+
+    from app import attributes, facets, migrations
+    from app.db import engine
+    from app.models import Listing, User
+
+    def flush(batch):
+        ids = conn.execute(insert(Listing).returning(Listing.id, sort_by_parameter_order=True), batch).scalars()
+        attributes.record(conn, [SimpleNamespace(id=i, details=row["details"]) for i, row in zip(ids, batch)])
+
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        owner_id = conn.execute(
+            insert(User).values(email=f"bench{seed}@falcontrade.org", hashed_password="x")
+        ).inserted_primary_key[0]
+        batch = []
+        for row in listing_rows(n, owner_id, seed=seed):
+            batch.append({**row, **attributes.quantity_columns(row["quantity"])})
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        facets.rebuild(conn)
+    return owner_id
+
+
+def summarize(samples_ms: list[float]) -> dict:
+    if not samples_ms:
+        return {"n": 0}
+    samples = sorted(samples_ms)
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))], 3)
+
+    return {
+        "n": len(samples),
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def measure(fn, repeat: int = 20) -> dict:
+    """Run ``fn`` ``repeat`` times and summarize wall time in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return summarize(samples)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Server(str):
+    """The base URL of a served API; ``pid`` is set when ``serve`` started it."""
+
+    pid = None
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+@contextmanager
+def serve(base_url: str = None, env: dict = None, args: tuple = (), app: str = "app.main:app", workers: int = None):
+    """Yield the URL of a running API, starting uvicorn unless ``base_url`` is given.
+
+    With ``workers``, starts that many workers under gunicorn with ``gunicorn.conf.py``.
+    """
+    if base_url:
+        yield Server(base_url)
+        return
+    import httpx
+
+    port = _free_port()
+    env = {**os.environ, **(env or {})}
+    if workers:
+        env.update(PORT=str(port), WEB_CONCURRENCY=str(workers))
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning", *args, app]
+    else:
+        command = [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning", *args]
+    proc = subprocess.Popen(command, env=env)
+    url = Server(f"http://127.0.0.1:{port}")
+    url.pid = proc.pid
+    try:
+        for _ in range(300):
+            try:
+                if httpx.get(f"{url}/health").status_code == 200:
+                    break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("API did not start")
+        yield url
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
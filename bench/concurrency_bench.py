@@ -0,0 +1,70 @@
+"""Requests/sec on the read hot paths at increasing client concurrency.
+
+    python -m bench.concurrency_bench --clients 50,200,1000
+    git worktree add /tmp/falcontrade-sync <commit-before-async>
+    python -m bench.concurrency_bench --app-dir /tmp/falcontrade-sync
+
+Run once against this tree and once with ``--app-dir`` pointing at a
+checkout from before the async database layer to compare sync and async
+handlers on the same data. Requires ``httpx``.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+from . import common
+
+import httpx
+
+
+async def load(url, paths, clients, duration):
+    latencies, statuses = [], Counter()
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+
+        async def worker(i):
+            n = i
+            while time.perf_counter() < deadline:
+                path = paths[n % len(paths)]
+                n += 1
+                t0 = time.perf_counter()
+                try:
+                    r = await client.get(path)
+                    statuses[r.status_code] += 1
+                except httpx.TransportError:
+                    statuses["error"] += 1
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+        elapsed = time.perf_counter() - t0
+    return {
+        "clients": clients,
+        "requests_per_s": round(sum(statuses.values()) / elapsed, 1),
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "latency": common.summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url")
+    parser.add_argument("--app-dir", default=".")
+    parser.add_argument("--listings", type=int, default=10_000)
+    parser.add_argument("--clients", default="50,200,1000")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--paths", default="/market?limit=50,/listings/1,/listings/2")
+    args = parser.parse_args()
+    if not args.base_url:
+        common.populate(args.listings)
+    with common.serve(args.base_url, args=("--app-dir", args.app_dir)) as url:
+        for clients in (int(c) for c in args.clients.split(",")):
+            result = asyncio.run(load(url, args.paths.split(","), clients, args.duration))
+            print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Synthetic marketplace at production scale.
+
+    python -m bench.dataset --listings 2000000 --users 50000 --messages 1000000 \\
+        --revoked 100000 --seed 1 --manifest /tmp/dataset.json
+
+Fills ``DATABASE_URL`` (a throwaway SQLite file by default, see
+``common``) with:
+
+* ``--users`` users sharing the password ``PASSWORD``, ``--active-share`` of
+  them with an active subscription and a Stripe customer, a few admins;
+* ``--listings`` listings across the ``/categories`` values, owned by users
+  drawn Zipf-style (a few sellers own most listings), ``--published-share``
+  of them published and the rest drafts, with quantity columns, attributes,
+  facets and the search index filled in as the app would;
+* ``--messages`` messages in threads on published listings whose lengths
+  follow a Pareto distribution, so a handful of listings carry most of the
+  traffic, plus the owners' ``unread_counts``;
+* ``--revoked`` revoked token hashes, half of them already expired.
+
+The same ``--seed`` gives the same rows. The manifest (printed, and written
+to ``--manifest``) lists the database, users and hottest threads that
+``bench.suite`` drives requests against.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from types import SimpleNamespace
+
+from . import common
+
+from sqlalchemy import func, insert, select
+
+from app import attributes, bootstrap, facets, search
+from app.auth import hash_password
+from app.db import engine
+from app.models import Listing, Message, RevokedToken, UnreadCount, User
+
+PASSWORD = "bench-password"
+ADMINS = 2
+BATCH = 10_000
+# Pareto shape of thread lengths; lower is heavier-tailed.
+THREAD_ALPHA = 1.1
+SAMPLE_EMAILS = 1000
+BODIES = [
+    "Can you do {n} MT at {p} USD/MT CIF?",
+    "Counter-offer: {p} USD/MT FOB, {n} MT monthly, LC at sight.",
+    "Please share the spec sheet and SGS report for lot {n}.",
+    "Confirmed {n} MT, proforma to follow. Price {p} USD/MT.",
+]
+
+
+def _email(i: int) -> str:
+    return f"user{i}@bench.falcontrade.org"
+
+
+def _batches(rows, size: int = BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def users(conn, rnd: random.Random, n: int, active_share: float) -> list[bool]:
+    """Insert ``n`` users; returns whether each is active, by ``id - 1``."""
+    hashed = hash_password(PASSWORD)
+    now = datetime.now(timezone.utc)
+    active = [i < ADMINS or rnd.random() < active_share for i in range(n)]
+    rows = (
+        {
+            "id": i + 1,
+            "email": _email(i + 1),
+            "hashed_password": hashed,
+            "is_admin": i < ADMINS,
+            "created_at": now - timedelta(days=rnd.randint(0, 700)),
+            "stripe_customer_id": f"cus_bench{i + 1}" if active[i] else None,
+            "subscription_status": "active" if active[i] else "inactive",
+        }
+        for i in range(n)
+    )
+    for batch in _batches(rows):
+        conn.execute(insert(User), batch)
+    return active
+
+
+def listings(conn, rnd: random.Random, n: int, n_users: int, published_share: float, seed: int) -> list[tuple[int, int]]:
+    """Insert ``n`` listings; returns ``(id, owner_id)`` of the published ones."""
+    cum_weights = list(accumulate(1 / rank for rank in range(1, n_users + 1)))
+    owners = list(range(1, n_users + 1))
+    rnd.shuffle(owners)
+    published = []
+    rows = common.listing_rows(n, 0, seed=seed)
+    for batch in _batches(rows):
+        for row, owner in zip(batch, rnd.choices(owners, cum_weights=cum_weights, k=len(batch))):
+            row.update(owner_id=owner, **attributes.quantity_columns(row["quantity"]))
+            if rnd.random() >= published_share:
+                row["status"] = "draft"
+        ids = conn.execute(insert(Listing).returning(Listing.id, sort_by_parameter_order=True), batch).scalars().all()
+        attributes.record(conn, [SimpleNamespace(id=i, details=row["details"]) for i, row in zip(ids, batch)])
+        published.extend((i, row["owner_id"]) for i, row in zip(ids, batch) if row["status"] == "published")
+    return published
+
+
+def thread_sizes(rnd: random.Random, total: int, threads: int) -> list[int]:
+    """Pareto-distributed thread lengths summing to ``total``, longest first."""
+    if not total or not threads:
+        return []
+    sizes = [rnd.paretovariate(THREAD_ALPHA) for _ in range(threads)]
+    scale = total / sum(sizes)
+    sizes = [max(1, int(s * scale)) for s in sizes]
+    sizes.sort(reverse=True)
+    sizes[0] += total - sum(sizes)
+    return [s for s in sizes if s > 0]
+
+
+def messages(conn, rnd: random.Random, n: int, published: list[tuple[int, int]], n_users: int) -> list[int]:
+    """Insert ``n`` messages and the owners' unread counts; returns the listings
+    with the longest threads, longest first."""
+    if not n or not published:
+        return []
+    sizes = thread_sizes(rnd, n, min(len(published), max(1, n // 20)))
+    threads = rnd.sample(published, len(sizes))
+    start = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+    def rows():
+        for (lid, owner), size in zip(threads, sizes):
+            buyers = [rnd.randint(1, n_users) for _ in range(rnd.randint(1, 3))]
+            at = start + timedelta(minutes=rnd.randint(0, 200_000))
+            for _ in range(size):
+                at += timedelta(seconds=rnd.randint(1, 3600))
+                yield {
+                    "body": rnd.choice(BODIES).format(n=rnd.randint(1, 500) * 10, p=rnd.randint(80, 900)),
+                    "listing_id": lid,
+                    "sender_id": owner if rnd.random() < 0.4 else rnd.choice(buyers),
+                    "created_at": at,
+                }
+
+    for batch in _batches(rows()):
+        conn.execute(insert(Message), batch)
+    conn.execute(
+        insert(UnreadCount).from_select(
+            ["user_id", "listing_id", "count", "last_message_id", "updated_at"],
+            select(Listing.owner_id, Message.listing_id, func.count(), func.max(Message.id), func.max(Message.created_at))
+            .join(Listing, Listing.id == Message.listing_id)
+            .where(Message.sender_id != Listing.owner_id)
+            .group_by(Listing.owner_id, Message.listing_id),
+        )
+    )
+    return [lid for lid, _ in threads[:10]]
+
+
+def revoked(conn, rnd: random.Random, n: int):
+    now = datetime.now(timezone.utc)
+    rows = (
+        {
+            "token_hash": rnd.randbytes(32),
+            # Half expired (the sweeper's work), half still live (held in memory).
+            "expires_at": now + timedelta(minutes=rnd.randint(-120, -1) if i % 2 else rnd.randint(1, 60)),
+            "revoked_at": now - timedelta(minutes=rnd.randint(0, 120)),
+        }
+        for i in range(n)
+    )
+    for batch in _batches(rows):
+        conn.execute(insert(RevokedToken), batch)
+
+
+def generate(n_listings: int, n_users: int, n_messages: int, n_revoked: int, seed: int = 0,
+             active_share: float = 0.6, published_share: float = 0.9) -> dict:
+    """Create the schema and fill it; returns the manifest."""
+    if n_users <= ADMINS:
+        raise ValueError(f"Need more than {ADMINS} users")
+    rnd = random.Random(seed)
+    timings = {}
+    t0 = time.perf_counter()
+    bootstrap.migrate()
+    with engine.begin() as conn:
+        active = users(conn, rnd, n_users, active_share)
+        timings["users_s"] = round(time.perf_counter() - t0, 1)
+        published = listings(conn, rnd, n_listings, n_users, published_share, seed)
+        timings["listings_s"] = round(time.perf_counter() - t0, 1)
+        hot = messages(conn, rnd, n_messages, published, n_users)
+        timings["messages_s"] = round(time.perf_counter() - t0, 1)
+        revoked(conn, rnd, n_revoked)
+        facets.rebuild(conn)
+    # Fills the (empty) search index from the listings just written.
+    search.init(engine)
+    timings["total_s"] = round(time.perf_counter() - t0, 1)
+    emails = {True: [], False: []}
+    for i, is_active in enumerate(active[ADMINS:], ADMINS + 1):
+        if len(emails[is_active]) < SAMPLE_EMAILS:
+            emails[is_active].append(_email(i))
+    return {
+        "database_url": os.environ["DATABASE_URL"],
+        "seed": seed,
+        "listings": n_listings,
+        "published": len(published),
+        "users": n_users,
+        "messages": n_messages,
+        "revoked": n_revoked,
+        "password": PASSWORD,
+        "admin_email": _email(1),
+        "active_emails": emails[True],
+        "inactive_emails": emails[False],
+        "listing_ids": [lid for lid, _ in rnd.sample(published, min(len(published), SAMPLE_EMAILS))],
+        "hot_listings": hot,
+        "timings": timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--revoked", type=int, default=10_000)
+    parser.add_argument("--active-share", type=float, default=0.6)
+    parser.add_argument("--published-share", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--manifest")
+    args = parser.parse_args()
+    manifest = generate(args.listings, args.users, args.messages, args.revoked, args.seed,
+                        args.active_share, args.published_share)
+    if args.manifest:
+        with open(args.manifest, "w") as f:
+            json.dump(manifest, f, indent=2)
+    print(json.dumps({k: v for k, v in manifest.items() if not isinstance(v, list) or k == "hot_listings"}))
+
+
+if __name__ == "__main__":
+    main()
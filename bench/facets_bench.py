@@ -0,0 +1,88 @@
+"""/market/facets latency from the rollup vs. a GROUP BY over listings.
+
+    python -m bench.facets_bench --listings 1000000 --target-ms 10
+
+Loads ``--listings`` published listings, then times ``facets.counts`` for
+a few filter sets against the same counts computed with GROUP BY over
+``listings`` (what the endpoint would cost without the rollup), and the
+added cost of ``facets.record`` per publish. Exits non-zero when the
+rollup's p95 for any filter set is over ``--target-ms``.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from . import common
+
+from sqlalchemy import func, select
+
+from app import facets
+from app.db import AsyncSessionLocal, SessionLocal, async_engine
+from app.models import Listing
+from app.routes.listings import market_query
+
+FILTERS = [
+    {},
+    {"type": "RFQ"},
+    {"category": "grain"},
+    {"type": "OFFER", "category": "metals", "country": "UAE"},
+    {"country": "Turkey", "incoterm": "FOB"},
+]
+
+
+async def group_by(db, filters: dict) -> dict:
+    async def matches(scoped):
+        return await market_query(db, **scoped)
+
+    return await facets.counts(db, filters, matches)
+
+
+async def timed(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return common.summarize(samples)
+
+
+async def run(args) -> list[str]:
+    over = []
+    async with AsyncSessionLocal() as db:
+        for filters in FILTERS:
+            rollup = await timed(lambda: facets.counts(db, filters), args.repeat)
+            scan = await timed(lambda: group_by(db, filters), max(1, args.repeat // 10))
+            same = await facets.counts(db, filters) == await group_by(db, filters)
+            print(json.dumps({"filters": filters, "rollup": rollup, "group_by": scan, "same_counts": same}), flush=True)
+            if rollup["p95_ms"] > args.target_ms or not same:
+                over.append(json.dumps(filters))
+    await async_engine.dispose()
+
+    with SessionLocal() as db:
+        rows = db.execute(select(Listing).limit(args.repeat)).scalars().all()
+        t0 = time.perf_counter()
+        for l in rows:
+            facets.record(db, [l])
+        per_publish = (time.perf_counter() - t0) / len(rows) * 1000
+        db.rollback()
+        size = db.scalar(select(func.count()).select_from(facets.ListingFacet))
+    print(json.dumps({"rollup_rows": size, "record_ms_per_publish": round(per_publish, 3)}), flush=True)
+    return over
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--target-ms", type=float, default=10)
+    args = parser.parse_args()
+    common.populate(args.listings)
+    over = asyncio.run(run(args))
+    if over:
+        sys.exit(f"facet counts over {args.target_ms}ms p95 or wrong for: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
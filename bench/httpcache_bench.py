@@ -0,0 +1,34 @@
+"""/market throughput with and without the response cache.
+
+    python -m bench.httpcache_bench --clients 50 --duration 10
+
+Starts the API twice on the same data, once with ``HTTP_CACHE_TTL=0``, and
+drives the same mix of ``/market`` pages against each.
+"""
+import argparse
+import asyncio
+import json
+
+from . import common
+from .concurrency_bench import load
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument(
+        "--paths",
+        default="/market?limit=50,/market?limit=50&category=grain,/market?limit=50&type=RFQ,/market?q=steel",
+    )
+    args = parser.parse_args()
+    common.populate(args.listings)
+    for name, ttl in (("uncached", "0"), ("cached", "30")):
+        with common.serve(env={"HTTP_CACHE_TTL": ttl}) as url:
+            result = asyncio.run(load(url, args.paths.split(","), args.clients, args.duration))
+            print(json.dumps({"mode": name, **result}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
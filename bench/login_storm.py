@@ -0,0 +1,84 @@
+"""Login storm: bcrypt throughput and what it does to /market latency.
+
+    python -m bench.login_storm --logins 400 --concurrency 100
+
+Fires ``--logins`` logins from ``--concurrency`` clients while a prober
+calls ``/market`` in a loop, and reports login throughput, the status mix
+(503 = hashing queue full) and /market latency before and during the storm.
+Starts its own server with the demo user unless ``--base-url`` is given.
+Requires ``httpx``.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+from . import common
+
+import httpx
+
+
+async def probe_market(client, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await client.get("/market")
+        samples.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def storm(url, logins, concurrency, username, password):
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        idle = []
+        for _ in range(50):
+            t0 = time.perf_counter()
+            await client.get("/market")
+            idle.append((time.perf_counter() - t0) * 1000)
+
+        remaining = iter(range(logins))
+        statuses, latencies, during = Counter(), [], []
+
+        async def worker():
+            for _ in remaining:
+                t0 = time.perf_counter()
+                r = await client.post("/auth/login", data={"username": username, "password": password})
+                latencies.append((time.perf_counter() - t0) * 1000)
+                statuses[r.status_code] += 1
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe_market(client, stop, during))
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        await prober
+
+    return {
+        "logins": logins,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "successful_logins_per_s": round(statuses[200] / elapsed, 1),
+        "statuses": dict(statuses),
+        "login_latency": common.summarize(latencies),
+        "market_idle": common.summarize(idle),
+        "market_during_storm": common.summarize(during),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url")
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--username", default="demo@falcontrade.org")
+    parser.add_argument("--password", default="Demo123!")
+    args = parser.parse_args()
+    env = {"SEED_SAMPLE": "1", "RATE_LIMIT_LOGIN": f"{10**9}/60"}
+    with common.serve(args.base_url, env=env) as url:
+        result = asyncio.run(storm(url, args.logins, args.concurrency, args.username, args.password))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
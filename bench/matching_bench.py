@@ -0,0 +1,128 @@
+"""RFQ/OFFER match latency and index memory.
+
+    python -m bench.matching_bench --sizes 100000,1000000
+
+For each size: the time to load the match index and its size, the cost of
+scoring one listing against the index (a cache miss) and of reading its
+cached list, ``GET /listings/{id}/matches`` cold and warm, the cost of
+publishing a listing into a warm index and cache, and for comparison the
+same top-K found by rescanning the listing's category in the database.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from . import common
+
+from sqlalchemy import func, select
+
+from app import matching
+from app.db import AsyncSessionLocal, SessionLocal, async_engine
+from app.models import Listing
+from app.routes.listings import listing_matches
+
+
+def index_bytes(idx: matching.MatchIndex) -> int:
+    total = sys.getsizeof(idx.buckets) + sys.getsizeof(idx._seen)
+    for bucket in idx.buckets.values():
+        total += sys.getsizeof(bucket)
+        total += sum(sys.getsizeof(f) + sys.getsizeof(p) for f, p in bucket.items())
+    return total
+
+
+def rescan(db, l) -> list:
+    """Top-K by walking every counterpart in the category, without the index."""
+    kind, category, feats = matching.features(l)
+    rows = db.execute(
+        select(*matching.COLUMNS).where(
+            Listing.status == "published",
+            Listing.type == matching.COUNTERPART[kind],
+            func.lower(Listing.category) == category,
+        )
+    )
+    scores = {}
+    for r in rows:
+        shared = feats & matching.features(r)[2]
+        if shared:
+            scores[r.id] = sum(matching.WEIGHTS[f[0]] for f in shared)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[: matching.MATCH_TOP_K]
+
+
+def timed(fn, items) -> dict:
+    samples = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return common.summarize(samples)
+
+
+async def atimed(fn, items) -> dict:
+    samples = []
+    for item in items:
+        t0 = time.perf_counter()
+        await fn(item)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return common.summarize(samples)
+
+
+async def endpoint(sample) -> dict:
+    user = SimpleNamespace(id=0, is_admin=True)
+    out = {}
+    async with AsyncSessionLocal() as db:
+        matching.lists.clear()
+        out["api_cold"] = await atimed(lambda l: listing_matches(l.id, matching.MATCH_TOP_K, user, db), sample)
+        out["api_warm"] = await atimed(lambda l: listing_matches(l.id, matching.MATCH_TOP_K, user, db), sample)
+    return out
+
+
+def run_size(size: int, args) -> dict:
+    row = {"listings": size}
+    matching.reset()
+    gc.collect()
+    t0 = time.perf_counter()
+    matching.index = idx = matching.load()
+    row["load_s"] = round(time.perf_counter() - t0, 2)
+    row["index_mb"] = round(index_bytes(idx) / 2**20, 1)
+
+    rnd = random.Random(size)
+    with SessionLocal() as db:
+        ids = rnd.sample(range(1, size + 1), args.samples)
+        sample = list(db.execute(select(*matching.COLUMNS).where(Listing.id.in_(ids))))
+        row["score"] = timed(lambda l: matching.lists.set(l.id, idx.score(*matching.features(l))), sample)
+        row["cached"] = timed(lambda l: matching.lists.get(l.id), sample)
+        row["rescan"] = timed(lambda l: rescan(db, l), sample[: args.rescans])
+    row.update(asyncio.run(endpoint(sample)))
+
+    # Publishing into a warm cache: every sampled list is cached.
+    new = [
+        SimpleNamespace(id=size + 1_000_000 + i, **{c.key: r[c.key] for c in matching.COLUMNS if c.key != "id"})
+        for i, r in enumerate(common.listing_rows(args.samples, 0, seed=-size))
+    ]
+    row["publish"] = timed(lambda l: matching.published([l]), new)
+    row["cached_lists"] = len(matching.lists)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="100000,1000000")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--rescans", type=int, default=10)
+    args = parser.parse_args()
+
+    total = 0
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        common.populate(size - total, seed=size)
+        total = size
+        print(json.dumps(run_size(size, args)), flush=True)
+    asyncio.run(async_engine.dispose())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Message thread reads on one very busy listing.
+
+    python -m bench.messages_bench --messages 100000 --limit 50
+
+Puts ``--messages`` messages on one listing, then times the old
+whole-thread read against paged reads (the latest page, a page from the
+middle via ``before_id``, one via ``after_id``) and reports response
+sizes. It also compares the ``/inbox`` unread lookup with counting the
+owner's unread messages by scanning.
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from . import common
+
+from sqlalchemy import func, insert, select
+
+from app.db import AsyncSessionLocal, async_engine, engine
+from app.models import Listing, Message, UnreadCount, User
+from app.routes.listings import inbox, list_messages, message_rows
+from app.schemas import MessageOut
+
+BATCH = 10_000
+
+
+def fill(n: int) -> tuple[int, int, list[int]]:
+    owner_id = common.populate(1)
+    with engine.begin() as conn:
+        buyer_id = conn.execute(insert(User).values(email="buyer@falcontrade.org", hashed_password="x")).inserted_primary_key[0]
+        lid = conn.execute(select(Listing.id)).scalar()
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for first in range(0, n, BATCH):
+            conn.execute(insert(Message), [
+                {"body": f"Counter-offer {i}: 500 MT at {100 + i % 50} USD/MT CIF, LC at sight.",
+                 "listing_id": lid, "sender_id": buyer_id if i % 2 else owner_id,
+                 "created_at": start + timedelta(seconds=i)}
+                for i in range(first, min(first + BATCH, n))
+            ])
+        conn.execute(insert(UnreadCount).values(user_id=owner_id, listing_id=lid, count=n // 2, last_message_id=n))
+        ids = list(conn.execute(select(Message.id).order_by(Message.id)).scalars())
+    return owner_id, lid, ids
+
+
+async def timed(fn, repeat: int):
+    samples, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return common.summarize(samples), result
+
+
+def size(messages) -> int:
+    return sum(len(m.model_dump_json()) for m in messages) + len(messages) + 1
+
+
+async def run(args, owner_id, lid, ids):
+    middle = ids[len(ids) // 2]
+
+    class Owner:
+        id = owner_id
+
+    async with AsyncSessionLocal() as db:
+
+        async def whole_thread():
+            rows = (await db.execute(message_rows(Message.listing_id == lid))).all()
+            return [MessageOut(id=m.id, body=m.body, created_at=m.created_at, sender_email=m.sender_email) for m in rows]
+
+        cases = {
+            "whole_thread": whole_thread,
+            "latest_page": lambda: list_messages(lid, None, None, None, args.limit, None, db),
+            "before_id_middle": lambda: list_messages(lid, middle, None, None, args.limit, None, db),
+            "after_id_middle": lambda: list_messages(lid, None, middle, None, args.limit, None, db),
+        }
+        for name, fn in cases.items():
+            stats, result = await timed(fn, 3 if name == "whole_thread" else args.repeat)
+            print(json.dumps({"read": name, "messages": len(result), "bytes": size(result), **stats}), flush=True)
+
+        async def scan():
+            return await db.scalar(
+                select(func.count()).select_from(Message)
+                .where(Message.listing_id.in_(select(Listing.id).where(Listing.owner_id == owner_id)),
+                       Message.sender_id != owner_id)
+            )
+
+        stats, _ = await timed(lambda: inbox(args.limit, Owner, db), args.repeat)
+        print(json.dumps({"unread": "inbox_counter", **stats}), flush=True)
+        stats, _ = await timed(scan, 3)
+        print(json.dumps({"unread": "scan_messages", **stats}), flush=True)
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    owner_id, lid, ids = fill(args.messages)
+    asyncio.run(run(args, owner_id, lid, ids))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Per-request cost of the metrics middleware and query hooks.
+
+    python -m bench.metrics_bench --requests 3000 --budget-us 100
+
+Sends requests straight through the app's ASGI stack, with no sockets, and
+switches instrumentation on and off between requests. That means the
+middleware flag and the SQLAlchemy listeners. Machine drift then hits both
+modes alike, and the difference between the medians is the instrumentation
+itself. Exits non-zero when any path's overhead is over ``--budget-us``
+microseconds per request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+from . import common
+
+# Measure the routes, not the response cache in front of them.
+os.environ.setdefault("HTTP_CACHE_TTL", "0")
+
+PATHS = ("/health", "/market?limit=20", "/listings/1")
+
+
+async def call(app, path: str) -> int:
+    raw_path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": raw_path, "raw_path": raw_path.encode(), "root_path": "", "query_string": query.encode(),
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run(args) -> list:
+    from app import metrics
+    from app.db import async_engine
+    from app.main import app, engines
+
+    def switch(enabled: bool):
+        metrics.METRICS_ENABLED = enabled
+        for name, e in engines.items():
+            if enabled:
+                metrics.instrument_engine(e, name)
+            else:
+                metrics.uninstrument_engine(e)
+
+    results = []
+    for path in PATHS:
+        for _ in range(50):
+            assert await call(app, path) == 200, path
+        samples = {False: [], True: []}
+        for i in range(2 * args.requests):
+            enabled = bool(i % 2)
+            switch(enabled)
+            t0 = time.perf_counter()
+            await call(app, path)
+            samples[enabled].append((time.perf_counter() - t0) * 1e6)
+        off, on = (statistics.median(samples[e]) for e in (False, True))
+        results.append({"path": path, "p50_us_off": round(off, 1), "p50_us_on": round(on, 1), "overhead_us": round(on - off, 1)})
+    switch(True)
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--budget-us", type=float, default=100)
+    args = parser.parse_args()
+    common.populate(1000)
+    over_budget = []
+    for row in asyncio.run(run(args)):
+        print(json.dumps(row), flush=True)
+        if row["overhead_us"] > args.budget_us:
+            over_budget.append(row["path"])
+    if over_budget:
+        sys.exit(f"metrics overhead over the {args.budget_us}us budget on: {', '.join(over_budget)}")
+
+
+if __name__ == "__main__":
+    main()
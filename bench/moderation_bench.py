@@ -0,0 +1,98 @@
+"""Publishing a bulk import: one listing per request vs. one batch.
+
+    python -m bench.moderation_bench --listings 1000000 --drafts 10000 --sample 200
+
+On top of ``--listings`` published listings, adds ``--drafts`` drafts
+plus ``--sample`` more, then times ``POST /admin/listings/{id}/publish``
+over the sample and extrapolates it to ``--drafts`` listings. It then pages
+through ``GET /admin/listings/pending`` and publishes the ``--drafts``
+drafts with a single ``POST /admin/listings/publish``. It also times
+``/listings/{id}/matches`` afterwards, when the cached match lists have
+been dropped. Starts its own server. Requires ``httpx``.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+
+from . import common
+
+import httpx
+from sqlalchemy import insert, select
+
+from app import search
+from app.auth import create_access_token
+from app.db import engine
+from app.models import Listing, User
+
+
+def add_drafts(n: int, owner_id: int) -> list[int]:
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(
+            email="admin@falcontrade.org", hashed_password="x", is_admin=True, subscription_status="active"
+        ))
+        start = datetime.now(timezone.utc)
+        rows = [{**row, "created_at": start} for row in common.listing_rows(n, owner_id, seed=1, status="draft")]
+        conn.execute(insert(Listing), rows)
+        return list(conn.execute(select(Listing.id).where(Listing.status == "draft").order_by(Listing.id)).scalars())
+
+
+def timed(fn) -> tuple[float, object]:
+    t0 = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - t0) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--drafts", type=int, default=10_000)
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--page", type=int, default=200)
+    args = parser.parse_args()
+
+    owner_id = common.populate(args.listings)
+    drafts = add_drafts(args.drafts + args.sample, owner_id)
+    sample, batch = drafts[:args.sample], drafts[args.sample:]
+    # Fill the search index now rather than while the server starts.
+    search.init(engine)
+    headers = {"Authorization": f"Bearer {create_access_token('admin@falcontrade.org')}"}
+
+    # Production SQLite settings: in WAL mode publishing does not wait for the match index to load.
+    with common.serve(env={"SQLITE_TUNING": "1"}) as url, httpx.Client(base_url=url, headers=headers, timeout=600) as client:
+        # Waits for the match index, so that publishing pays for it as in production.
+        ms, _ = timed(lambda: client.get("/listings/1/matches"))
+        print(json.dumps({"case": "match_index_load", "ms": round(ms, 1)}), flush=True)
+
+        samples = []
+        for lid in sample:
+            ms, r = timed(lambda: client.post(f"/admin/listings/{lid}/publish"))
+            r.raise_for_status()
+            samples.append(ms)
+        stats = common.summarize(samples)
+        print(json.dumps({
+            "case": "one_per_request", "listings": len(sample), **stats,
+            "estimated_total_s": round(sum(samples) / len(samples) * len(batch) / 1000, 1),
+        }), flush=True)
+
+        pages, cursor = [], ""
+        while True:
+            ms, r = timed(lambda: client.get("/admin/listings/pending", params={"limit": args.page, "cursor": cursor}))
+            pages.append(ms)
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        print(json.dumps({"case": "pending_pages", "pages": len(pages), "page_size": args.page,
+                          **common.summarize(pages)}), flush=True)
+
+        ms, r = timed(lambda: client.post("/admin/listings/publish", json={"action": "publish", "ids": batch}))
+        r.raise_for_status()
+        print(json.dumps({"case": "one_batch", "listings": r.json()["count"], "total_s": round(ms / 1000, 2),
+                          "per_listing_ms": round(ms / len(batch), 3)}), flush=True)
+
+        after = [timed(lambda: client.get(f"/listings/{lid}/matches"))[0] for lid in sample[:20]]
+        print(json.dumps({"case": "matches_after_batch", **common.summarize(after)}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
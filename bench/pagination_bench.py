@@ -0,0 +1,66 @@
+"""/market paging: OFFSET vs. keyset cursor at increasing depth.
+
+    python -m bench.pagination_bench --limit 20 --pages 1,100,10000
+
+Loads ``limit * max(pages)`` published listings, then times fetching each
+page both ways through ``market_page``.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from . import common
+
+from sqlalchemy import select
+
+from app.db import AsyncSessionLocal, async_engine
+from app.models import Listing
+from app.pagination import encode_cursor
+from app.routes.listings import market_page
+
+
+async def run(args, pages):
+    async with AsyncSessionLocal() as db:
+
+        async def timed(**kwargs):
+            samples = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                await market_page(db, limit=args.limit, **kwargs)
+                samples.append((time.perf_counter() - t0) * 1000)
+            return common.summarize(samples)
+
+        for page in pages:
+            skip = (page - 1) * args.limit
+            cursor = ""
+            if skip:
+                # Seed the keyset with the last row of the previous page.
+                last = (
+                    await db.execute(
+                        select(Listing.created_at, Listing.id)
+                        .where(Listing.status == "published")
+                        .order_by(Listing.created_at.desc(), Listing.id.desc())
+                        .offset(skip - 1)
+                        .limit(1)
+                    )
+                ).one()
+                cursor = encode_cursor(last.created_at, last.id)
+            row = {"page": page, "offset": await timed(offset=skip), "cursor": await timed(cursor=cursor)}
+            print(json.dumps(row), flush=True)
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--pages", default="1,100,10000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    pages = sorted(int(p) for p in args.pages.split(","))
+    common.populate(args.limit * pages[-1] + args.limit)
+    asyncio.run(run(args, pages))
+
+
+if __name__ == "__main__":
+    main()
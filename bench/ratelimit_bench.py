@@ -0,0 +1,94 @@
+"""Rate limiter cost per request, per storage backend.
+
+    python -m bench.ratelimit_bench --hits 20000 --clients 5000
+
+Times ``backend.hit`` for each backend with hits spread over ``--clients``
+keys, then the full ``RateLimitMiddleware`` in front of an empty ASGI app
+against the bare app, and reports how many keys the memory backend holds
+after a flood of distinct clients with ``--max-keys``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import time
+
+from . import common
+
+from app.ratelimit import FakeRedis, MemoryBackend, Policy, RateLimitMiddleware, RedisBackend, SQLiteBackend
+
+
+async def empty_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def call(app, ip: str) -> None:
+    scope = {"type": "http", "method": "POST", "path": "/auth/login", "headers": [], "client": (ip, 1234)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def time_backend(backend, keys: list[str]) -> dict:
+    samples = []
+    for key in keys:
+        t0 = time.perf_counter()
+        await backend.hit(key, 5, 60)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return common.summarize(samples)
+
+
+async def time_app(app, ips: list[str]) -> dict:
+    samples = []
+    for ip in ips:
+        t0 = time.perf_counter()
+        await call(app, ip)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return common.summarize(samples)
+
+
+async def run(args):
+    rng = random.Random(0)
+    keys = [f"login:10.0.{i // 256}.{i % 256}" for i in (rng.randrange(args.clients) for _ in range(args.hits))]
+    tmp = tempfile.mkdtemp(prefix="ratelimit-bench-")
+    backends = {
+        "memory": MemoryBackend(),
+        "sqlite": SQLiteBackend(os.path.join(tmp, "ratelimit.db")),
+        "fake-redis": RedisBackend(FakeRedis()),
+    }
+    for name, backend in backends.items():
+        print(json.dumps({"backend": name, "hit_ms": await time_backend(backend, keys)}), flush=True)
+
+    policy = Policy("login", "POST", re.compile(r"^/auth/login$"), 5, 60)
+    ips = [k.split(":", 1)[1] for k in keys]
+    limited = RateLimitMiddleware(empty_app, backend=MemoryBackend(), policies=[policy])
+    print(json.dumps({"app": "bare", "request_ms": await time_app(empty_app, ips)}), flush=True)
+    print(json.dumps({"app": "rate-limited", "request_ms": await time_app(limited, ips)}), flush=True)
+
+    bounded = MemoryBackend(max_keys=args.max_keys)
+    for i in range(args.flood):
+        await bounded.hit(f"login:flood-{i}", 5, 60)
+    print(json.dumps({"flood": args.flood, "max_keys": args.max_keys, "keys_held": len(bounded._data)}), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hits", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--flood", type=int, default=200000)
+    parser.add_argument("--max-keys", type=int, default=10000)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
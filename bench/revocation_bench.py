@@ -0,0 +1,168 @@
+"""Cost of token revocation checks with a large ``revoked_tokens`` table.
+
+    python -m bench.revocation_bench --rows 10000000 --live 0.01
+
+Fills the old layout (full JWT per row, kept forever) and the current one
+(sha256 plus ``expires_at``; ``--live`` of the rows still unexpired) with
+``--rows`` revocations each, then reports for both: database size, worker
+startup load time and memory of the in-process set, the per-request
+membership check, and the logout existence query. For the current layout
+it also times the sweeper deleting the expired rows.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, insert, select
+
+BATCH = 20_000
+
+_old_meta = MetaData()
+old_table = Table(
+    "revoked_tokens",
+    _old_meta,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("token", String(500), unique=True, nullable=False),
+    Column("revoked_at", DateTime(timezone=True)),
+)
+
+
+def fake_token(rnd: random.Random) -> str:
+    """Same length and alphabet as the JWTs the API issues."""
+    parts = (36, 96, 43)
+    return ".".join(base64.urlsafe_b64encode(rnd.randbytes(n * 3 // 4)).decode().rstrip("=")[:n] for n in parts)
+
+
+def file_mb(url: str) -> float:
+    path = url.split("///", 1)[1]
+    return round(sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)) / 2**20, 1)
+
+
+def set_mb(keys) -> float:
+    size = sys.getsizeof(keys) + sum(sys.getsizeof(k) for k in keys)
+    if isinstance(keys, dict):
+        size += sum(sys.getsizeof(v) for v in keys.values())
+    return round(size / 2**20, 1)
+
+
+def time_lookups(fn, keys, repeat: int) -> float:
+    """Mean microseconds per call."""
+    t0 = time.perf_counter()
+    for i in range(repeat):
+        fn(keys[i % len(keys)])
+    return round((time.perf_counter() - t0) / repeat * 1e6, 3)
+
+
+def before(url: str, rows: int, probes: int) -> dict:
+    engine = create_engine(url)
+    _old_meta.create_all(engine)
+    rnd = random.Random(0)
+    sample = []
+    with engine.begin() as conn:
+        for start in range(0, rows, BATCH):
+            batch = [{"token": fake_token(rnd), "revoked_at": datetime.now(timezone.utc)} for _ in range(min(BATCH, rows - start))]
+            conn.execute(insert(old_table), batch)
+            sample.append(batch[0]["token"])
+    t0 = time.perf_counter()
+    with engine.connect() as conn:
+        keys = {hashlib.sha256(t.encode()).digest() for (t,) in conn.execute(select(old_table.c.token))}
+    load_s = time.perf_counter() - t0
+    tokens = [fake_token(rnd) for _ in range(1000)] + sample
+    with engine.connect() as conn:
+        query = select(old_table.c.id)
+        db_us = time_lookups(lambda t: conn.execute(query.where(old_table.c.token == t)).first(), tokens, min(probes, 5000))
+    hashes = [hashlib.sha256(t.encode()).digest() for t in tokens]
+    result = {
+        "layout": "before",
+        "rows": rows,
+        "db_mb": file_mb(url),
+        "load_s": round(load_s, 2),
+        "set_entries": len(keys),
+        "set_mb": set_mb(keys),
+        "contains_us": time_lookups(lambda h: h in keys, hashes, probes),
+        "logout_query_us": db_us,
+    }
+    engine.dispose()
+    return result
+
+
+def after(rows: int, live: float, probes: int) -> dict:
+    from app import migrations
+    from app.auth import RevocationSet, sweep_revocations
+    from app.db import AsyncSessionLocal, SessionLocal, async_engine, engine
+    from app.models import RevokedToken
+
+    migrations.upgrade(engine)
+    rnd = random.Random(1)
+    now = datetime.now(timezone.utc)
+    live_every = max(1, round(1 / live)) if live > 0 else rows + 1
+    sample = []
+    with engine.begin() as conn:
+        for start in range(0, rows, BATCH):
+            batch = []
+            for i in range(start, min(start + BATCH, rows)):
+                expires = now + timedelta(minutes=30) if i % live_every == 0 else now - timedelta(days=1 + i % 90)
+                batch.append({"token_hash": rnd.randbytes(32), "expires_at": expires, "revoked_at": expires - timedelta(hours=1)})
+            conn.execute(insert(RevokedToken), batch)
+            sample.append(batch[0]["token_hash"])
+    url = os.environ["DATABASE_URL"]
+    size_mb = file_mb(url)
+    revs = RevocationSet(3600)
+    t0 = time.perf_counter()
+    with SessionLocal() as db:
+        revs.load(db)
+    load_s = time.perf_counter() - t0
+    hashes = [rnd.randbytes(32) for _ in range(1000)] + sample
+    with engine.connect() as conn:
+        query = select(RevokedToken.token_hash)
+        db_us = time_lookups(lambda h: conn.execute(query.where(RevokedToken.token_hash == h)).first(), hashes, min(probes, 5000))
+
+    async def sweep():
+        try:
+            async with AsyncSessionLocal() as db:
+                return await sweep_revocations(db)
+        finally:
+            await async_engine.dispose()
+
+    t0 = time.perf_counter()
+    swept = asyncio.run(sweep())
+    sweep_s = time.perf_counter() - t0
+    return {
+        "layout": "after",
+        "rows": rows,
+        "db_mb": size_mb,
+        "load_s": round(load_s, 2),
+        "set_entries": len(revs),
+        "set_mb": set_mb(revs._keys),
+        "contains_us": time_lookups(lambda h: h in revs._keys, hashes, probes),
+        "logout_query_us": db_us,
+        "swept": swept,
+        "sweep_s": round(sweep_s, 2),
+        "swept_per_s": round(swept / sweep_s) if sweep_s else None,
+        "db_mb_after_sweep": file_mb(url),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--live", type=float, default=0.01, help="fraction of revocations not yet expired")
+    parser.add_argument("--probes", type=int, default=100_000)
+    args = parser.parse_args()
+    # A throwaway database for both layouts; ``app`` is only imported after this.
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='falcontrade-bench-')}/bench.db")
+    old_url = "sqlite:///" + os.path.join(os.path.dirname(os.environ["DATABASE_URL"].split("///", 1)[1]), "before.db")
+    print(json.dumps(before(old_url, args.rows, args.probes)), flush=True)
+    print(json.dumps(after(args.rows, args.live, args.probes)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
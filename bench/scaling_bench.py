@@ -0,0 +1,52 @@
+"""Requests/sec on the read hot paths as gunicorn workers are added.
+
+    python -m bench.scaling_bench --workers 1,2,4,8 --drivers 4
+
+Starts the API under ``gunicorn.conf.py`` with each worker count on the
+same data and drives ``/market`` and ``/listings/{lid}`` from ``--drivers``
+client processes, so the load generator is not the bottleneck. The
+response cache is off so every request reaches the handlers. Throughput
+can only scale up to the number of cores (reported as ``cpus``).
+"""
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from . import common
+from .concurrency_bench import load
+
+
+def drive(url, paths, clients, duration):
+    return asyncio.run(load(url, paths, clients, duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=10_000)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--drivers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=100, help="concurrent requests across all drivers")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--paths", default="/market?limit=50,/listings/1,/listings/2,/listings/500")
+    args = parser.parse_args()
+    common.populate(args.listings)
+    paths = args.paths.split(",")
+    for n in (int(w) for w in args.workers.split(",")):
+        with common.serve(workers=n, env={"HTTP_CACHE_TTL": "0"}) as url, ProcessPoolExecutor(args.drivers) as pool:
+            per_driver = max(1, args.clients // args.drivers)
+            results = list(pool.map(drive, *zip(*[(url, paths, per_driver, args.duration)] * args.drivers)))
+            latencies = [r["latency"] for r in results]
+            print(json.dumps({
+                "workers": n,
+                "cpus": os.cpu_count(),
+                "requests_per_s": round(sum(r["requests_per_s"] for r in results), 1),
+                "errors": sum(v for r in results for k, v in r["statuses"].items() if k != "200"),
+                "p50_ms": max(l["p50_ms"] for l in latencies),
+                "p99_ms": max(l["p99_ms"] for l in latencies),
+            }), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""/market search: ILIKE scan vs. the search backends.
+
+    python -m bench.search_bench --sizes 10000,100000,1000000
+
+For each catalog size the same queries run through the old
+``ILIKE '%q%'`` filter (title, ``cast(details)``, category), through SQLite
+FTS5 and through the in-process inverted index.
+"""
+import argparse
+import json
+import time
+
+from . import common
+
+from sqlalchemy import String, cast, or_, select
+
+from app import search
+from app.db import SessionLocal, engine
+from app.models import Listing
+
+QUERIES = ["wheat", "gran", "cotton fabric", "protein", "azerb"]
+
+
+def market_query():
+    return (
+        select(Listing)
+        .filter(Listing.status == "published")
+        .order_by(Listing.created_at.desc())
+        .limit(50)
+    )
+
+
+def ilike(db, q):
+    like = f"%{q}%"
+    stmt = market_query().filter(
+        or_(
+            Listing.title.ilike(like),
+            cast(Listing.details, String).ilike(like),
+            Listing.category.ilike(like),
+        )
+    )
+    return db.execute(stmt).scalars().all()
+
+
+def indexed(db, q):
+    stmt = search.apply(db, market_query(), q)
+    return [] if stmt is None else db.execute(stmt).scalars().all()
+
+
+def use_backend(name):
+    search.SEARCH_BACKEND = name
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE IF EXISTS listings_fts")
+    t0 = time.perf_counter()
+    search.init(engine)
+    if name == "python":
+        with SessionLocal() as db:
+            search._ensure_memory_index(db)
+    return round(time.perf_counter() - t0, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    results, total = [], 0
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        common.populate(size - total, seed=size)
+        total = size
+        row = {"listings": size}
+        for name, fn in (("ilike", ilike), ("fts5", indexed), ("python", indexed)):
+            if name != "ilike":
+                row[f"{name}_build_s"] = use_backend(name)
+            with SessionLocal() as db:
+                row[name] = {q: common.measure(lambda: fn(db, q), args.repeat) for q in QUERIES}
+        results.append(row)
+        print(json.dumps(row), flush=True)
+
+
+if __name__ == "__main__":
+    main()
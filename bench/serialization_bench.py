@@ -0,0 +1,70 @@
+"""/market serialization cost per row, default vs. ``FAST_JSON``.
+
+    python -m bench.serialization_bench --limit 200
+
+Fetches one ``/market`` page once, then times only what happens after the
+query. The default path does what FastAPI does for the route:
+
+1. build ``ListingOut`` models with validation;
+2. validate them against ``response_model``;
+3. encode the result.
+
+The fast path builds with ``model_construct`` and dumps through a
+``TypeAdapter``.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from . import common
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from app import fastjson
+from app.db import AsyncSessionLocal, async_engine
+from app.main import app
+from app.routes.listings import market_page, to_out
+from app.schemas import ListingOut
+
+
+async def run(args):
+    route = next(r for r in app.routes if getattr(r, "path", None) == "/market")
+    async with AsyncSessionLocal() as db:
+        rows, _ = await market_page(db, limit=args.limit)
+    await async_engine.dispose()
+
+    async def default():
+        fastjson.FAST_JSON = False
+        content = await serialize_response(field=route.response_field, response_content=[to_out(l) for l in rows])
+        return JSONResponse(content).body
+
+    async def fast():
+        fastjson.FAST_JSON = True
+        return fastjson.render([to_out(l) for l in rows], List[ListingOut]).body
+
+    assert json.loads(await default()) == json.loads(await fast())
+    for name, fn in (("default", default), ("fast", fast)):
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            await fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        stats = common.summarize(samples)
+        per_row_us = round(stats["p50_ms"] * 1000 / len(rows), 2)
+        print(json.dumps({"path": name, "rows": len(rows), "per_row_us": per_row_us, "page_ms": stats}), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    common.populate(args.limit)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
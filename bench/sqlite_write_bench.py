@@ -0,0 +1,98 @@
+"""Concurrent SQLite writes with and without ``SQLITE_TUNING``.
+
+    python -m bench.sqlite_write_bench --processes 4 --tasks 25 --ops 40
+
+Each of ``--processes`` worker processes (think uvicorn workers) runs
+``--tasks`` coroutines that repeat the ``add_message`` pattern: look up the
+listing, insert a message, commit. Reports commits/sec and how many
+transactions failed with "database is locked", for the default settings
+and for the tuned profile.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def child(args):
+    from . import common
+
+    from sqlalchemy.exc import OperationalError
+
+    from app.db import AsyncSessionLocal, async_engine, async_read_engine
+    from app.models import Listing, Message
+
+    if args.setup:
+        owner_id = common.populate(10)
+        print(json.dumps({"owner_id": owner_id}))
+        return
+
+    stats = {"ok": 0, "locked": 0}
+
+    async def task(i):
+        for n in range(args.ops):
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.get(Listing, 1 + n % 10)
+                    db.add(Message(body=f"bench {i}/{n}", listing_id=1 + n % 10, sender_id=args.owner_id))
+                    await db.commit()
+                stats["ok"] += 1
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                stats["locked"] += 1
+
+    async def run():
+        await asyncio.gather(*(task(i) for i in range(args.tasks)))
+        await async_engine.dispose()
+        await async_read_engine.dispose()
+
+    asyncio.run(run())
+    print(json.dumps(stats))
+
+
+def run_mode(args, tuned: bool) -> dict:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp(prefix='falcontrade-bench-')}/writes.db",
+        "SQLITE_TUNING": "1" if tuned else "0",
+    }
+    cmd = [sys.executable, "-m", "bench.sqlite_write_bench", "--child"]
+    setup = json.loads(subprocess.run(cmd + ["--setup"], env=env, capture_output=True, check=True, text=True).stdout)
+    cmd += ["--tasks", str(args.tasks), "--ops", str(args.ops), "--owner-id", str(setup["owner_id"])]
+    t0 = time.perf_counter()
+    procs = [subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, text=True) for _ in range(args.processes)]
+    results = [json.loads(p.communicate()[0]) for p in procs]
+    elapsed = time.perf_counter() - t0
+    ok = sum(r["ok"] for r in results)
+    return {
+        "sqlite_tuning": tuned,
+        "commits": ok,
+        "locked_errors": sum(r["locked"] for r in results),
+        "elapsed_s": round(elapsed, 2),
+        "commits_per_s": round(ok / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--tasks", type=int, default=25)
+    parser.add_argument("--ops", type=int, default=40)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--setup", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--owner-id", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+    for tuned in (False, True):
+        print(json.dumps(run_mode(args, tuned)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Idle SSE subscribers: server memory per connection and delivery latency.
+
+    python -m bench.sse_bench --subscribers 1000,5000 --messages 20
+
+Opens ``--subscribers`` streams on one listing's
+``/listings/{id}/messages/stream``. It records the server's RSS growth per
+connection, then posts ``--messages`` messages. It measures the time from
+sending each POST until every subscriber has seen the event. The server
+runs on this machine, so memory needs ``/proc``.
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+from urllib.parse import urlparse
+
+from . import common
+
+import httpx
+
+EVENT_ID = re.compile(rb"id: (\d+)\n")
+
+
+async def subscribe(host, port, path, token, ready: asyncio.Event, received: dict, stop: asyncio.Event):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAuthorization: Bearer {token}\r\n"
+        "Accept: text/event-stream\r\n\r\n".encode()
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    if b" 200 " not in head.split(b"\r\n", 1)[0]:
+        raise RuntimeError(head.decode(errors="replace"))
+    ready.set()
+    buf = b""
+    try:
+        while not stop.is_set():
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            buf += chunk
+            now = time.perf_counter()
+            for match in EVENT_ID.finditer(buf):
+                received.setdefault(int(match.group(1)), []).append(now)
+            buf = buf[buf.rfind(b"\n") + 1:]
+    finally:
+        writer.close()
+
+
+async def run(url, lid, token, subscribers, messages):
+    parsed = urlparse(url)
+    rss_before = common.rss_kb(url.pid)
+    received, stop = {}, asyncio.Event()
+    tasks = []
+    for i in range(subscribers):
+        ready = asyncio.Event()
+        tasks.append(asyncio.create_task(subscribe(
+            parsed.hostname, parsed.port, f"/listings/{lid}/messages/stream", token, ready, received, stop
+        )))
+        await ready.wait()
+    await asyncio.sleep(1)
+    rss_after = common.rss_kb(url.pid)
+
+    latencies, missing = [], 0
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=url, headers=headers, timeout=60) as client:
+        for n in range(messages):
+            t0 = time.perf_counter()
+            r = await client.post(f"/listings/{lid}/messages", json={"body": f"bench {n}"})
+            r.raise_for_status()
+            mid = r.json()["id"]
+            deadline = time.perf_counter() + 30
+            while len(received.get(mid, ())) < subscribers and time.perf_counter() < deadline:
+                await asyncio.sleep(0.005)
+            seen = received.get(mid, [])
+            missing += subscribers - len(seen)
+            latencies.extend((t - t0) * 1000 for t in seen)
+    stop.set()
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "subscribers": subscribers,
+        "rss_kb_per_connection": round((rss_after - rss_before) / subscribers, 1),
+        "messages": messages,
+        "missing_deliveries": missing,
+        "delivery_ms": common.summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscribers", default="1000,5000")
+    parser.add_argument("--messages", type=int, default=20)
+    args = parser.parse_args()
+
+    from sqlalchemy import update
+
+    from app.auth import create_access_token
+    from app.db import engine
+    from app.models import User
+
+    owner_id = common.populate(1)
+    with engine.begin() as conn:
+        conn.execute(update(User).where(User.id == owner_id).values(subscription_status="active"))
+        email = conn.execute(User.__table__.select().where(User.id == owner_id)).one().email
+    token = create_access_token(email)
+    env = {"RATE_LIMIT_MESSAGES": f"{10**9}/60"}
+    for n in (int(s) for s in args.subscribers.split(",")):
+        with common.serve(env=env) as url:
+            print(json.dumps(asyncio.run(run(url, 1, token, n, args.messages))), flush=True)
+
+
+if __name__ == "__main__":
+    main()
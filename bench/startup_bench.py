@@ -0,0 +1,67 @@
+"""Worker cold start: import time, time to ready and first-request latency.
+
+    python -m bench.startup_bench --runs 5
+    python -m bench.startup_bench --app-dir /tmp/falcontrade-old
+
+Bootstraps the database once, then starts fresh processes ``--runs`` times
+in two configurations:
+
+* ``worker`` (``AUTO_MIGRATE=0 SEED_SAMPLE=0``): what ``start.sh`` runs.
+* ``defaults``: a bare ``uvicorn app.main:app`` with sample seeding on.
+
+For each start it reports the ``import app.main`` time in a new
+interpreter, the seconds until uvicorn answers ``/health``, and the
+latency of the first ``/market`` request. Use ``--app-dir`` to measure an
+older checkout on the same database.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from . import common
+
+import httpx
+
+MODES = {
+    "worker": {"AUTO_MIGRATE": "0", "SEED_SAMPLE": "0"},
+    "defaults": {"AUTO_MIGRATE": "1", "SEED_SAMPLE": "1"},
+}
+IMPORT_TIMER = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=".")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--listings", type=int, default=10_000)
+    args = parser.parse_args()
+    common.populate(args.listings)
+    subprocess.run([sys.executable, "-m", "app.bootstrap", "migrate"], check=True, capture_output=True)
+
+    for mode, env in MODES.items():
+        env = {**os.environ, **env}
+        imports, ready, first = [], [], []
+        for _ in range(args.runs):
+            out = subprocess.run(
+                [sys.executable, "-c", IMPORT_TIMER], cwd=args.app_dir, env=env, check=True, capture_output=True, text=True
+            ).stdout
+            imports.append(float(out.strip().splitlines()[-1]) * 1000)
+            t0 = time.perf_counter()
+            with common.serve(env=env, args=("--app-dir", args.app_dir)) as url:
+                ready.append((time.perf_counter() - t0) * 1000)
+                t1 = time.perf_counter()
+                httpx.get(f"{url}/market").raise_for_status()
+                first.append((time.perf_counter() - t1) * 1000)
+        print(json.dumps({
+            "mode": mode,
+            "import_ms": common.summarize(imports),
+            "ready_ms": common.summarize(ready),
+            "first_market_ms": common.summarize(first),
+        }), flush=True)
+
+
+if __name__ == "__main__":
+    main()
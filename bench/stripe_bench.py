@@ -0,0 +1,89 @@
+"""Billing against the local Stripe stand-in: /pricing and webhooks.
+
+    python -m bench.stripe_bench --latency-ms 300 --requests 200
+
+Starts ``bench.stripe_stub`` with ``--latency-ms`` per call and the API
+pointed at it, then reports the latency of a direct price list (what every
+``/pricing`` request used to pay), the first ``/pricing`` (a catalog sync)
+and the cached ones after it, and how many signed subscription webhooks per
+second the API applies, checking that ``/me`` follows them.
+"""
+import argparse
+import json
+import time
+
+import httpx
+
+from . import common
+from .stripe_stub import sign
+
+SECRET = "whsec_bench"
+EMAIL = "bench0@falcontrade.org"
+# Events are one second apart, in order.
+START = int(time.time())
+
+
+def timed_get(client: httpx.Client, url: str, **kwargs) -> float:
+    t0 = time.perf_counter()
+    client.get(url, **kwargs).raise_for_status()
+    return (time.perf_counter() - t0) * 1000
+
+
+def event(n: int, customer: str, status: str) -> bytes:
+    return json.dumps({
+        "id": f"evt_{n}", "object": "event", "type": "customer.subscription.updated", "created": START + n,
+        "data": {"object": {"id": "sub_1", "object": "subscription", "customer": customer, "status": status}},
+    }).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--events", type=int, default=500)
+    args = parser.parse_args()
+    common.populate(0)
+    from app.auth import create_access_token
+
+    with common.serve(app="bench.stripe_stub:app", env={"STUB_LATENCY_MS": str(args.latency_ms)}) as stub:
+        env = {"STRIPE_API_KEY": "sk_test_bench", "STRIPE_API_BASE": stub, "STRIPE_WEBHOOK_SECRET": SECRET}
+        with common.serve(env=env) as url, httpx.Client(timeout=30) as client:
+            direct = [timed_get(client, f"{stub}/v1/prices", params={"expand[0]": "data.product"}) for _ in range(5)]
+            first = timed_get(client, f"{url}/pricing")
+            cached = [timed_get(client, f"{url}/pricing") for _ in range(args.requests)]
+            plans = client.get(f"{url}/pricing").json()["plans"]
+            print(json.dumps({
+                "plans": len(plans),
+                "stripe_price_list": common.summarize(direct),
+                "pricing_first_ms": round(first, 3),
+                "pricing_cached": common.summarize(cached),
+            }), flush=True)
+
+            auth = {"Authorization": f"Bearer {create_access_token(EMAIL)}"}
+            client.post(f"{url}/subscribe", json={"price_id": "price_1"}, headers=auth).raise_for_status()
+            before = client.get(f"{url}/me", headers=auth).json()["subscription_status"]
+            customer = client.get(f"{stub}/v1/customers", params={"email": EMAIL}).json()["data"][0]["id"]
+            statuses = ["active", "canceled"]
+            t0 = time.perf_counter()
+            for n in range(args.events):
+                body = event(n, customer, statuses[n % 2])
+                r = client.post(f"{url}/stripe/webhook", content=body,
+                                headers={"Stripe-Signature": sign(body, SECRET), "Content-Type": "application/json"})
+                r.raise_for_status()
+            elapsed = time.perf_counter() - t0
+            last = statuses[(args.events - 1) % 2]
+            after = client.get(f"{url}/me", headers=auth).json()["subscription_status"]
+            bad = client.post(f"{url}/stripe/webhook", content=event(0, customer, "active"),
+                              headers={"Stripe-Signature": sign(b"tampered", SECRET)}).status_code
+            print(json.dumps({
+                "webhooks": args.events,
+                "webhooks_per_s": round(args.events / elapsed, 1),
+                "status_before": before,
+                "status_after": after,
+                "status_follows_events": after == ("active" if last == "active" else "inactive"),
+                "bad_signature_status": bad,
+            }), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""A local stand-in for the parts of the Stripe API the app calls.
+
+Point the app at it with ``STRIPE_API_BASE`` to exercise billing without a
+network or a Stripe account::
+
+    uvicorn bench.stripe_stub:app --port 12111
+    STRIPE_API_KEY=sk_test_stub STRIPE_API_BASE=http://127.0.0.1:12111 uvicorn app.main:app
+
+``STUB_PRICES`` sets how many prices it lists and ``STUB_LATENCY_MS`` adds a
+delay to every call, roughly what a round trip to Stripe costs. ``sign``
+builds a ``Stripe-Signature`` header for posting test webhooks.
+"""
+import asyncio
+import hashlib
+import hmac
+import itertools
+import os
+import time
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+STUB_PRICES = int(os.getenv("STUB_PRICES", "3"))
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+
+_ids = itertools.count(1)
+CUSTOMERS: list[dict] = []
+
+
+def price(i: int) -> dict:
+    return {
+        "id": f"price_{i}",
+        "object": "price",
+        "active": True,
+        "currency": "usd",
+        "unit_amount": 1000 * i,
+        "nickname": None,
+        "product": {"id": f"prod_{i}", "object": "product", "name": f"Plan {i}"},
+    }
+
+
+PRICES = [price(i) for i in range(1, STUB_PRICES + 1)]
+
+
+def sign(payload: bytes, secret: str, timestamp: int = None) -> str:
+    timestamp = timestamp or int(time.time())
+    mac = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={mac}"
+
+
+async def _delay():
+    if STUB_LATENCY_MS:
+        await asyncio.sleep(STUB_LATENCY_MS / 1000)
+
+
+async def list_prices(request: Request):
+    await _delay()
+    limit = int(request.query_params.get("limit", "10"))
+    after = request.query_params.get("starting_after")
+    start = next((i + 1 for i, p in enumerate(PRICES) if p["id"] == after), 0)
+    page = PRICES[start:start + limit]
+    expand = "data.product" in request.query_params.getlist("expand[0]")
+    if not expand:
+        page = [{**p, "product": p["product"]["id"]} for p in page]
+    return JSONResponse({
+        "object": "list", "url": "/v1/prices", "data": page,
+        "has_more": start + limit < len(PRICES),
+    })
+
+
+async def customers(request: Request):
+    await _delay()
+    if request.method == "GET":
+        email = request.query_params.get("email")
+        data = [c for c in CUSTOMERS if email is None or c["email"] == email]
+        return JSONResponse({"object": "list", "url": "/v1/customers", "data": data, "has_more": False})
+    form = await request.form()
+    customer = {"id": f"cus_{next(_ids)}", "object": "customer", "email": form.get("email")}
+    CUSTOMERS.append(customer)
+    return JSONResponse(customer)
+
+
+async def create_checkout_session(request: Request):
+    await _delay()
+    n = next(_ids)
+    return JSONResponse({"id": f"cs_{n}", "object": "checkout.session", "url": f"https://checkout.stripe.test/{n}"})
+
+
+async def create_portal_session(request: Request):
+    await _delay()
+    n = next(_ids)
+    return JSONResponse({"id": f"bps_{n}", "object": "billing_portal.session", "url": f"https://billing.stripe.test/{n}"})
+
+
+async def health(request: Request):
+    return JSONResponse({"status": "ok"})
+
+
+app = Starlette(routes=[
+    Route("/health", health),
+    Route("/v1/prices", list_prices),
+    Route("/v1/customers", customers, methods=["GET", "POST"]),
+    Route("/v1/checkout/sessions", create_checkout_session, methods=["POST"]),
+    Route("/v1/billing_portal/sessions", create_portal_session, methods=["POST"]),
+])
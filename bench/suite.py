@@ -0,0 +1,312 @@
+"""Load suite for the API hot paths, with baselines to catch regressions.
+
+    python -m bench.suite --listings 1000000 --users 50000 --messages 1000000 \\
+        --modes inprocess,http --concurrency 1,16,64 --duration 10 --out run.json
+    python -m bench.suite --dataset /tmp/dataset.json --baseline run.json
+
+Builds a dataset with ``bench.dataset`` (or reuses the one described by a
+``--dataset`` manifest), then runs every scenario in ``SCENARIOS`` at each
+``--concurrency`` for ``--duration`` seconds with that many closed-loop
+clients:
+
+* ``inprocess`` calls the ASGI app through ``httpx.ASGITransport`` in this
+  process, so no sockets or server loop are involved (clients share the CPU
+  with the app, which inflates latency at high concurrency);
+* ``http`` starts uvicorn (or uses ``--base-url``) and goes over TCP.
+
+Each result has latency percentiles, throughput, the status mix, database
+queries per request (from the ``/metrics`` query histogram, cache hits
+counting as zero) and the peak RSS of the serving process while the
+scenario ran. The whole run is written as JSON to ``--out``. With
+``--baseline``, results are compared against an earlier run of the same
+mode, scenario and concurrency; any metric worse by more than
+``--tolerance`` is listed under ``regressions`` and the exit status is 1.
+
+The app runs with ``SQLITE_TUNING=1`` unless set otherwise, and without
+the login rate limit. Requires ``httpx``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Optional
+from urllib.parse import quote
+
+from . import common
+
+import httpx
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    route: str
+    # Fixtures -> (path, request kwargs)
+    request: Callable
+
+
+def _token(fx, pool: str):
+    return {"headers": {"Authorization": f"Bearer {fx.rnd.choice(fx.tokens[pool])}"}}
+
+
+SCENARIOS = [
+    Scenario("market", "GET", "/market", lambda fx: ("/market?limit=50", {})),
+    Scenario("market_filtered", "GET", "/market", lambda fx: (
+        f"/market?category={fx.rnd.choice(common.CATEGORIES)}&country={fx.rnd.choice(common.COUNTRIES)}&limit=50", {})),
+    Scenario("market_search", "GET", "/market", lambda fx: (f"/market?q={fx.rnd.choice(common.WORDS)}&limit=50", {})),
+    Scenario("market_ranges", "GET", "/market", lambda fx: (
+        f"/market?unit=MT&min_qty={fx.rnd.randint(1, 400) * 10}&attr={quote('gsm>=' + str(fx.rnd.randint(100, 290)))}&limit=50", {})),
+    Scenario("listing", "GET", "/listings/{lid}", lambda fx: (f"/listings/{fx.rnd.choice(fx.listing_ids)}", {})),
+    Scenario("me", "GET", "/me", lambda fx: ("/me", _token(fx, "any"))),
+    Scenario("messages", "GET", "/listings/{lid}/messages", lambda fx: (
+        f"/listings/{fx.rnd.choice(fx.hot)}/messages?limit=50", _token(fx, "active"))),
+    Scenario("inbox", "GET", "/inbox", lambda fx: ("/inbox", _token(fx, "active"))),
+    Scenario("login", "POST", "/auth/login", lambda fx: (
+        "/auth/login", {"data": {"username": fx.rnd.choice(fx.emails), "password": fx.password}})),
+]
+
+# Sent once before anything is measured (see ``drive``).
+WARM_UP = Scenario("matches", "GET", "/listings/{lid}/matches", lambda fx: (
+    f"/listings/{fx.listing_ids[0]}/matches", _token(fx, "active")))
+
+_QUERIES_RE = re.compile(r"^http_request_db_queries_sum\{.*\} (\S+)$", re.M)
+
+
+class Fixtures:
+    """What scenarios draw their requests from, built from a dataset manifest."""
+
+    def __init__(self, manifest: dict, seed: int):
+        from app.auth import create_access_token
+
+        self.rnd = random.Random(seed)
+        self.listing_ids = manifest["listing_ids"]
+        self.hot = manifest["hot_listings"][:3] or self.listing_ids[:1]
+        self.emails = manifest["active_emails"] + manifest["inactive_emails"]
+        self.password = manifest["password"]
+        active = [create_access_token(e) for e in manifest["active_emails"]]
+        inactive = [create_access_token(e) for e in manifest["inactive_emails"]]
+        self.tokens = {"active": active, "any": active + inactive}
+
+
+class PeakRSS:
+    """Samples the resident set size of ``pid`` in a thread; ``peak`` in kB,
+    ``None`` without a local process to sample."""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.02):
+        self.pid, self.interval, self.peak = pid, interval, 0 if pid else None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while True:
+            self.peak = max(self.peak, common.rss_kb(self.pid))
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        if self.pid:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self.pid:
+            self._thread.join()
+
+
+async def queries_so_far(client) -> float:
+    text = (await client.get("/metrics")).text
+    return sum(float(v) for v in _QUERIES_RE.findall(text))
+
+
+async def send(client, scenario: Scenario, fx: Fixtures):
+    """The status of one request, or ``"error"`` if the connection failed."""
+    path, kwargs = scenario.request(fx)
+    try:
+        return (await client.request(scenario.method, path, **kwargs)).status_code
+    except httpx.TransportError:
+        return "error"
+
+
+async def run_scenario(client, pid: int, scenario: Scenario, fx: Fixtures, concurrency: int, duration: float) -> dict:
+    for _ in range(min(20, 2 * concurrency)):
+        await send(client, scenario, fx)
+    latencies, statuses = [], Counter()
+    before = await queries_so_far(client)
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            statuses[await send(client, scenario, fx)] += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    with PeakRSS(pid) as rss:
+        t0 = time.perf_counter()
+        deadline = t0 + duration
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    queries = await queries_so_far(client) - before
+    return {
+        "scenario": scenario.name,
+        "method": scenario.method,
+        "route": scenario.route,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        "latency": common.summarize(latencies),
+        "queries_per_request": round(queries / len(latencies), 2) if latencies else None,
+        "peak_rss_kb": rss.peak,
+    }
+
+
+async def drive(client, pid: int, mode: str, scenarios, fx: Fixtures, levels, duration: float) -> list[dict]:
+    # So that loading the match index is not part of whichever scenario runs first.
+    await send(client, WARM_UP, fx)
+    results = []
+    for scenario in scenarios:
+        for concurrency in levels:
+            result = {"mode": mode, **await run_scenario(client, pid, scenario, fx, concurrency, duration)}
+            print(json.dumps(result), flush=True)
+            results.append(result)
+    return results
+
+
+async def inprocess(scenarios, fx, levels, duration) -> list[dict]:
+    from app.db import async_engine
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            results = await drive(client, os.getpid(), "inprocess", scenarios, fx, levels, duration)
+    await async_engine.dispose()
+    return results
+
+
+async def over_http(url, scenarios, fx, levels, duration) -> list[dict]:
+    limits = httpx.Limits(max_connections=max(levels) + 1, max_keepalive_connections=max(levels) + 1)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        return await drive(client, url.pid, "http", scenarios, fx, levels, duration)
+
+
+# metric -> (value of a result, whether higher is worse, smallest change that counts)
+METRICS = {
+    "p95_ms": (lambda r: r["latency"].get("p95_ms"), True, 1.0),
+    "throughput_rps": (lambda r: r["throughput_rps"], False, 1.0),
+    "queries_per_request": (lambda r: r["queries_per_request"], True, 0.5),
+    "peak_rss_kb": (lambda r: r["peak_rss_kb"], True, 10_240),
+}
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[dict]:
+    """Metrics of ``results`` worse than in ``baseline`` by more than ``tolerance``."""
+    previous = {(r["mode"], r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = previous.get((r["mode"], r["scenario"], r["concurrency"]))
+        if b is None:
+            continue
+        for metric, (value, higher_is_worse, min_change) in METRICS.items():
+            new, old = value(r), value(b)
+            if new is None or old is None:
+                continue
+            change = new - old if higher_is_worse else old - new
+            if change >= min_change and change > tolerance * old:
+                regressions.append({
+                    "mode": r["mode"], "scenario": r["scenario"], "concurrency": r["concurrency"],
+                    "metric": metric, "baseline": old, "value": new,
+                    "change": round((new - old) / old, 3) if old else None,
+                })
+    return regressions
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", help="manifest from bench.dataset; its database is reused")
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--revoked", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", default="inprocess,http")
+    parser.add_argument("--base-url", help="drive this server instead of starting one (http mode)")
+    parser.add_argument("--concurrency", default="1,16,64")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--scenarios", help="comma-separated subset of: " + ", ".join(s.name for s in SCENARIOS))
+    parser.add_argument("--out")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    manifest = None
+    if args.dataset:
+        with open(args.dataset) as f:
+            manifest = json.load(f)
+        os.environ["DATABASE_URL"] = manifest["database_url"]
+    # Read by the app at import, and by the server started below: production
+    # SQLite settings, and no login limit since every client shares one address.
+    os.environ.setdefault("SQLITE_TUNING", "1")
+    os.environ.setdefault("RATE_LIMIT_LOGIN", "1000000/60")
+    from . import dataset
+
+    if manifest is None:
+        manifest = dataset.generate(args.listings, args.users, args.messages, args.revoked, args.seed)
+    fx = Fixtures(manifest, args.seed)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    wanted = set(args.scenarios.split(",")) if args.scenarios else None
+    scenarios = [s for s in SCENARIOS if wanted is None or s.name in wanted]
+
+    results = []
+    for mode in args.modes.split(","):
+        if mode == "inprocess":
+            results += asyncio.run(inprocess(scenarios, fx, levels, args.duration))
+        elif mode == "http":
+            with common.serve(args.base_url) as url:
+                results += asyncio.run(over_http(url, scenarios, fx, levels, args.duration))
+        else:
+            parser.error(f"unknown mode {mode!r}")
+
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "dataset": {k: v for k, v in manifest.items() if not isinstance(v, list)},
+            "concurrency": levels,
+            "duration_s": args.duration,
+            "sqlite_tuning": os.environ["SQLITE_TUNING"],
+        },
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(results, json.load(f), args.tolerance)
+        for r in report["regressions"]:
+            print("REGRESSION", json.dumps(r), flush=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report.get("regressions") else 0)
+
+
+if __name__ == "__main__":
+    main()
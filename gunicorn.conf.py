@@ -0,0 +1,69 @@
+"""Gunicorn settings for running several uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+The master migrates and seeds once before forking (``on_starting``), so
+workers start with ``AUTO_MIGRATE=0 SEED_SAMPLE=0``. The rate limiter and
+pub/sub default to SQLite files under ``SHARED_STATE_DIR`` so that limits
+and live messages span all workers, even when started with one worker and
+scaled up with ``TTIN`` later. Set
+``RATE_LIMIT_STORAGE``/``PUBSUB_URL`` to ``redis://...`` to share them across
+hosts instead. The in-process ``python`` search backend cannot be shared,
+so startup fails when it is selected.
+
+Send ``TTIN``/``TTOU`` to the master to add or remove a worker, and ``HUP``
+to replace all workers gracefully.
+"""
+import multiprocessing
+import os
+import sys
+
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "8"))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# One event loop per core; the work is I/O bound apart from bcrypt, which
+# has its own thread pool per worker.
+workers = int(os.getenv("WEB_CONCURRENCY", str(max(1, min(multiprocessing.cpu_count(), MAX_WORKERS)))))
+# Long enough for open SSE streams and in-flight uploads to finish on restart.
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = 5
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+# Heartbeat files on tmpfs so a slow disk cannot get workers killed.
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def _shared_state_defaults():
+    state_dir = os.getenv("SHARED_STATE_DIR", "/tmp/falcontrade")
+    os.makedirs(state_dir, exist_ok=True)
+    os.environ.setdefault("RATE_LIMIT_STORAGE", f"sqlite:///{state_dir}/ratelimit.db")
+    os.environ.setdefault("PUBSUB_URL", f"sqlite:///{state_dir}/pubsub.db")
+    # WAL and a busy timeout so workers writing the same SQLite file queue
+    # for the lock instead of failing.
+    os.environ.setdefault("SQLITE_TUNING", "1")
+
+
+def on_starting(server):
+    # Before anything from ``app`` is imported, so workers inherit these.
+    _shared_state_defaults()
+    from app import bootstrap, search
+    from app.db import engine
+
+    bootstrap.main(["all"])
+    engine.dispose()
+    # Workers may be added with TTIN at any time, and each would keep its own index.
+    if search.backend == "python":
+        raise RuntimeError("SEARCH_BACKEND=python is single-process; run one uvicorn worker or use FTS5/Postgres")
+    os.environ["AUTO_MIGRATE"] = "0"
+    os.environ["SEED_SAMPLE"] = "0"
+
+
+def post_fork(server, worker):
+    # Pools inherited from the master must not be shared with it: drop them
+    # without closing the parent's connections.
+    db = sys.modules.get("app.db")
+    if db is not None:
+        db.engine.dispose(close=False)
+        db.async_engine.sync_engine.dispose(close=False)
+        db.async_read_engine.sync_engine.dispose(close=False)
@@ -1,5 +1,7 @@
 #!/usr/bin/env bash
 set -e
 export PORT=${PORT:-8000}
+# Gunicorn's master migrates (and seeds when SEED_SAMPLE=1) once, then forks
+# WEB_CONCURRENCY workers (default: one per CPU); see gunicorn.conf.py.
 # Use bash to avoid needing executable bit when Render runs the command
-exec uvicorn app.main:app --host 0.0.0.0 --port $PORT
+exec gunicorn -c gunicorn.conf.py app.main:app
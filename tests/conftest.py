@@ -0,0 +1,58 @@
+"""Runs the app in process against a throwaway SQLite database."""
+import itertools
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='falcontrade-test-')}/test.db")
+os.environ.setdefault("SEED_SAMPLE", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from app.auth import create_access_token
+from app.db import engine
+from app.main import app
+from app.models import User
+
+_emails = (f"user{i}@test.falcontrade.org" for i in itertools.count())
+
+
+def make_user(**columns) -> tuple[int, dict]:
+    """A new subscribed user; returns ``(id, auth headers)``."""
+    email = next(_emails)
+    with engine.begin() as conn:
+        uid = conn.execute(
+            insert(User)
+            .values(email=email, hashed_password="x", subscription_status="active", **columns)
+            .returning(User.id)
+        ).scalar_one()
+    return uid, {"Authorization": f"Bearer {create_access_token(email)}"}
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def user(client):
+    return make_user
+
+
+@pytest.fixture
+def listing(client):
+    """Creates a listing through the API, published unless ``status="draft"``; returns its id."""
+
+    def make(headers: dict, status: str = "published", **fields) -> int:
+        body = {"type": "OFFER", "category": "grain", "title": "Wheat 12.5% protein", "quantity": "500 MT", **fields}
+        r = client.post("/listings", json=body, headers=headers)
+        r.raise_for_status()
+        lid = r.json()["id"]
+        if status == "published":
+            _, admin = make_user(is_admin=True)
+            client.post(f"/admin/listings/{lid}/publish", headers=admin).raise_for_status()
+        return lid
+
+    return make
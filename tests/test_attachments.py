@@ -0,0 +1,44 @@
+import pytest
+
+from app import storage
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 40
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.store, "root", str(tmp_path))
+
+
+def test_upload_then_ranges(client, user, listing, uploads):
+    _, owner = user()
+    lid = listing(owner)
+    r = client.post(f"/listings/{lid}/attachments", files={"file": ("spec.png", PNG, "image/png")}, headers=owner)
+    assert r.status_code == 200, r.text
+    assert r.json()["size"] == len(PNG) and r.json()["content_type"] == "image/png"
+    path = r.json()["path"]
+
+    assert client.get(path, headers=owner).content == PNG
+    r = client.get(path, headers={**owner, "range": "bytes=10-19"})
+    assert r.status_code == 206 and r.content == PNG[10:20]
+    for malformed in ("bytes=abc-", "bytes=-", "bytes=5-2", "items=0-1"):
+        r = client.get(path, headers={**owner, "range": malformed})
+        assert r.status_code == 200 and r.content == PNG, malformed
+    r = client.get(path, headers={**owner, "range": f"bytes={len(PNG)}-"})
+    assert r.status_code == 416
+
+
+def test_bad_uploads_are_rejected(client, user, listing, uploads, tmp_path, monkeypatch):
+    _, owner = user()
+    lid = listing(owner)
+    url = f"/listings/{lid}/attachments"
+    assert client.post(url, files={"other": ("a.png", PNG, "image/png")}, headers=owner).status_code == 400
+    assert client.post(url, content=PNG, headers={**owner, "content-type": "image/png"}).status_code == 400
+    assert client.post(url, files={"file": ("a.txt", b"plain text", "text/plain")}, headers=owner).status_code == 400
+    truncated = b'--x\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n\r\n' + PNG
+    r = client.post(url, content=truncated, headers={**owner, "content-type": "multipart/form-data; boundary=x"})
+    assert r.status_code == 400 and r.json()["detail"] == "Truncated multipart body"
+    monkeypatch.setattr("app.routes.listings.MAX_ATTACHMENT_BYTES", 1000)
+    r = client.post(url, files={"file": ("big.png", PNG, "image/png")}, headers=owner)
+    assert r.status_code == 400 and r.json()["detail"] == "File too large"
+    assert not any(p.is_file() for p in tmp_path.rglob("*"))
@@ -0,0 +1,51 @@
+import pytest
+
+from app import attributes, httpcache
+from app.cache import TTLCache
+
+
+@pytest.fixture
+def quantities(client, user, listing):
+    _, owner = user()
+    category = f"units-{owner['Authorization'][-8:]}"
+    return [listing(owner, category=category, quantity=q) for q in ("500 MT", "2 MT", "300 kg")], category
+
+
+@pytest.mark.parametrize("unit, min_qty, expected", [
+    ("MT", 1, [0, 1]),
+    ("mt", 1, [0, 1]),
+    ("tons", 100, [0]),
+    ("kg", 250, [0, 1, 2]),
+    ("kg", 400_000, [0]),
+])
+def test_unit_is_normalized_like_stored_quantities(client, quantities, unit, min_qty, expected):
+    ids, category = quantities
+    r = client.get("/market", params={"category": category, "unit": unit, "min_qty": min_qty})
+    assert r.status_code == 200
+    assert sorted(l["id"] for l in r.json()) == [ids[i] for i in expected]
+
+
+@pytest.mark.parametrize("params", [
+    {"unit": "furlongs", "min_qty": 1},
+    {"min_qty": 1},
+    {"attr": "colour>=1"},
+])
+def test_bad_quantity_and_attribute_filters_are_400(client, params):
+    assert client.get("/market", params=params).status_code == 400
+    assert client.get("/market/export", params=params).status_code == 400
+
+
+@pytest.mark.parametrize("seek_rows", [0, 10**9], ids=["walk", "seek"])
+def test_broad_and_selective_plans_agree(client, user, listing, monkeypatch, seek_rows):
+    monkeypatch.setattr(attributes, "SEEK_ROWS", seek_rows)
+    monkeypatch.setattr(attributes, "_estimates", TTLCache(16, 60))
+    httpcache.invalidate()
+    _, owner = user()
+    category = f"plans-{seek_rows}"
+    ids = [
+        listing(owner, category=category, quantity=q, details={"gsm": gsm})
+        for q, gsm in (("1500 MT", 200), ("1200 MT", 100), ("5000 MT", 300), ("1800 kg", 250))
+    ]
+    r = client.get("/market", params={"category": category, "unit": "MT", "min_qty": 1000, "max_qty": 2000, "attr": "gsm>=150"})
+    assert r.status_code == 200
+    assert [l["id"] for l in r.json()] == [ids[0]]
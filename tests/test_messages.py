@@ -0,0 +1,31 @@
+def test_since_id_zero_returns_the_thread_from_the_start(client, user, listing):
+    _, owner = user()
+    lid = listing(owner)
+    ids = [client.post(f"/listings/{lid}/messages", json={"body": f"m{i}"}, headers=owner).json()["id"] for i in range(6)]
+
+    r = client.get(f"/listings/{lid}/messages", params={"since_id": 0}, headers=owner)
+    assert r.status_code == 200
+    assert [m["id"] for m in r.json()] == ids
+
+
+def test_since_id_of_a_missing_message_still_returns_newer_ones(client, user, listing):
+    _, owner = user()
+    lid = listing(owner)
+    ids = [client.post(f"/listings/{lid}/messages", json={"body": f"m{i}"}, headers=owner).json()["id"] for i in range(3)]
+
+    r = client.get(f"/listings/{lid}/messages", params={"since_id": ids[0] - 1, "limit": 2}, headers=owner)
+    assert [m["id"] for m in r.json()] == ids[:2]
+    r = client.get(f"/listings/{lid}/messages", params={"after_id": ids[0]}, headers=owner)
+    assert [m["id"] for m in r.json()] == ids[1:]
+
+
+def test_draft_threads_are_hidden_from_other_users(client, user, listing):
+    _, owner = user()
+    _, other = user()
+    _, admin = user(is_admin=True)
+    lid = listing(owner, status="draft")
+
+    for path in (f"/listings/{lid}/messages", f"/listings/{lid}/messages/stream", f"/listings/{lid}/matches"):
+        assert client.get(path, headers=other).status_code == 404, path
+    assert client.get(f"/listings/{lid}/messages", headers=owner).status_code == 200
+    assert client.get(f"/listings/{lid}/messages", headers=admin).status_code == 200
@@ -0,0 +1,36 @@
+"""Statements per request on the hot read paths, so an N+1 fails the suite."""
+import pytest
+
+from app import httpcache
+from app.db import async_engine, async_read_engine
+from app.testing import count_queries
+
+
+@pytest.fixture(scope="module")
+def thread(client, user):
+    _, owner = user()
+    _, admin = user(is_admin=True)
+    for i in range(5):
+        r = client.post("/listings", json={"type": "OFFER", "category": "grain", "title": f"Counted wheat {i}"}, headers=owner)
+        lid = r.json()["id"]
+        client.post(f"/admin/listings/{lid}/publish", headers=admin).raise_for_status()
+    for i in range(5):
+        client.post(f"/listings/{lid}/messages", json={"body": f"m{i}"}, headers=owner).raise_for_status()
+    return lid, owner
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/market", 1),
+    ("/market?q=counted", 1),
+    ("/listings/{lid}/messages", 2),
+])
+def test_statements_per_request(client, thread, path, expected):
+    lid, headers = thread
+    path = path.format(lid=lid)
+    # The first request also loads the caller into the principal cache.
+    client.get(path, headers=headers)
+    httpcache.invalidate()
+    with count_queries(async_engine, async_read_engine) as queries:
+        r = client.get(path, headers=headers)
+    assert r.status_code == 200 and len(r.json()) >= 5
+    assert queries.count == expected, queries.statements
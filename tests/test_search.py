@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import select
+
+from app import search
+from app.db import SessionLocal
+from app.models import Listing
+
+
+@pytest.fixture
+def python_backend(monkeypatch):
+    monkeypatch.setattr(search, "backend", "python")
+    monkeypatch.setattr(search, "_memory_index", None)
+
+
+def test_python_backend_ranks_every_hit(client, user, python_backend, listing):
+    _, owner = user()
+    weak = listing(owner, title="Sesame seeds", details={"note": "kestrelwort"})
+    strong = listing(owner, title="Kestrelwort sesame seeds")
+    # Built lazily on first search; later listings join it as they commit.
+    assert client.get("/market", params={"q": "sesame"}, headers=owner).status_code == 200
+    newest = listing(owner, title="Kestrelwort hulled")
+
+    r = client.get("/market", params={"q": "kestrelwort"}, headers=owner)
+    assert r.status_code == 200
+    ids = [l["id"] for l in r.json()]
+    assert set(ids[:2]) == {strong, newest} and ids[2] == weak
+
+
+def test_python_backend_skips_rolled_back_listings(client, python_backend):
+    with SessionLocal() as db:
+        search._ensure_memory_index(db)
+        ghost = Listing(id=10**9, title="Ghostly saffron", category="spices")
+        db.execute(select(1))
+        search.index_listings(db, [ghost])
+        db.rollback()
+        assert search._memory_index.search(["ghostly"]) == {}
+
+        db.execute(select(1))
+        search.index_listings(db, [ghost])
+        assert search._memory_index.search(["ghostly"]) == {}
+        db.commit()
+        assert set(search._memory_index.search(["ghostly"])) == {10**9}
+
+
+def test_python_backend_sql_does_not_grow_with_hits(client, python_backend):
+    with SessionLocal() as db:
+        index = search._ensure_memory_index(db)
+        index.add(10**9 + 1, ("Umbral pepper", "spices", "", ""))
+        one = str(search.apply(db, select(Listing.id), "umbral"))
+        for i in range(2, 500):
+            index.add(10**9 + i, ("Umbral pepper", "spices", "", ""))
+        assert str(search.apply(db, select(Listing.id), "umbral")) == one